@@ -4,17 +4,52 @@ from flask import (
     request,
     redirect,
     url_for,
+    send_file,
     send_from_directory,
     flash,
+    jsonify,
 )
 from werkzeug.utils import secure_filename
+import mimetypes
 from pathlib import Path
 
-from config import Config, DATA_DIR, EXPORT_DIR, SCREENSHOT_DIR
-from services.results_service import (
-    consultar_un_estudiante,
-    consultar_y_exportar_desde_excel,
+from config import (
+    Config,
+    EXPORT_DIR,
+    SCREENSHOT_DIR,
+    TRACE_DIR,
+    UPLOAD_DIR,
+    asegurar_directorios,
 )
+from services.async_service import iniciar_consulta, obtener_consulta
+from automation.tracing import ARCHIVO_TRAZA, listar_jobs_trazados, listar_trazas
+from automation.watchdog import obtener_vigilante
+from services.export_service import (
+    FORMATOS,
+    FORMATOS_COMPRIMIBLES,
+    nombre_descarga,
+    obtener_exportacion,
+)
+from services.job_queue import crear_cola
+from services.scheduler import obtener_planificador
+from services.job_store import (
+    ESTADO_COMPLETADO,
+    ESTADO_ERROR,
+    actualizar_job,
+    buscar_job_anterior,
+    buscar_job_por_upload,
+    cargar_delta,
+    cargar_job,
+    cargar_resultados,
+    crear_job,
+    guardar_delta,
+    guardar_resultados,
+)
+from services.uploads_service import guardar_upload, limpiar_uploads, ruta_por_contenido
+
+# results_service y stats_service (pandas, Playwright, BeautifulSoup) se
+# importan dentro de las rutas que los usan: arrancar la app o un proceso nuevo
+# no paga ese costo.
 
 app = Flask(__name__)
 app.config.from_object(Config)
@@ -22,13 +57,34 @@ app.config.from_object(Config)
 # IMPORTANTE: Configurar secret key para flash messages
 app.secret_key = app.config['SECRET_KEY']
 
+asegurar_directorios()
+
 # Carpeta para subir archivos
-UPLOAD_DIR = DATA_DIR / "uploads"
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 app.config["UPLOAD_FOLDER"] = str(UPLOAD_DIR)
 app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # 16 MB
 
 
+def _tenant_actual() -> str:
+    """
+    Quién hace la petición, para repartir los cupos del planificador. Detrás de
+    un proxy que identifique al colegio u orientador se usa X-Tenant; si no,
+    la IP del cliente.
+    """
+    return request.headers.get("X-Tenant", "").strip() or request.remote_addr or ""
+
+
+def _job_del_tenant(job_id: str):
+    """
+    El trabajo si existe y lo creó el tenant actual; si no, None. Las rutas
+    bajo un trabajo (resultados, descargas, actualización, trazas) lo usan
+    para que nadie lea nombres y puntajes de otro tenant conociendo el id.
+    """
+    job = cargar_job(secure_filename(job_id))
+    if job is None or job.get("tenant") != _tenant_actual():
+        return None
+    return job
+
+
 @app.route("/", methods=["GET"])
 def index():
     """Página inicial con formulario de consulta manual"""
@@ -52,24 +108,45 @@ def consulta_manual():
         flash("Debes proporcionar fecha de nacimiento O número de registro.", "danger")
         return redirect(url_for("index"))
 
-    try:
-        resultado = consultar_un_estudiante(
-            tipo_documento=tipo_doc,
-            numero_documento=numero_doc,
-            fecha_nacimiento=fecha_nac,
-            numero_registro=numero_reg,
-            take_screenshot=take_screenshot,
-        )
-        
-        if resultado.get("error"):
-            flash(f"Error en la consulta: {resultado['error']}", "warning")
-        
-        return render_template("resultados.html", resultado=resultado)
-        
-    except Exception as e:
-        flash(f"Error inesperado: {str(e)}", "danger")
+    # La consulta corre en el loop asíncrono de fondo; esta petición termina
+    # de inmediato y la página de espera se completa cuando hay resultado.
+    consulta_id = iniciar_consulta(
+        tipo_documento=tipo_doc,
+        numero_documento=numero_doc,
+        fecha_nacimiento=fecha_nac,
+        numero_registro=numero_reg,
+        take_screenshot=take_screenshot,
+        tenant=_tenant_actual(),
+    )
+    return redirect(url_for("ver_consulta_manual", consulta_id=consulta_id))
+
+
+@app.route("/consulta-manual/<consulta_id>", methods=["GET"])
+def ver_consulta_manual(consulta_id: str):
+    """Muestra el resultado de una consulta manual o la página de espera"""
+    consulta = obtener_consulta(consulta_id)
+    if consulta is None:
+        flash("La consulta no existe o ya expiró.", "warning")
         return redirect(url_for("index"))
 
+    if consulta["estado"] != "completada":
+        return render_template("consulta_pendiente.html", consulta_id=consulta_id)
+
+    resultado = consulta["resultado"]
+    if resultado.get("error"):
+        flash(f"Error en la consulta: {resultado['error']}", "warning")
+
+    return render_template("resultados.html", resultado=resultado)
+
+
+@app.route("/consulta-manual/<consulta_id>/estado", methods=["GET"])
+def estado_consulta_manual(consulta_id: str):
+    """Estado de una consulta manual (usado por la página de espera)"""
+    consulta = obtener_consulta(consulta_id)
+    if consulta is None:
+        return jsonify({"estado": "desconocida"}), 404
+    return jsonify({"estado": consulta["estado"]})
+
 
 @app.route("/consulta-excel", methods=["GET"])
 def consulta_excel_form():
@@ -77,70 +154,201 @@ def consulta_excel_form():
     return render_template("consulta_excel.html")
 
 
+def _es_excel(filename: str) -> bool:
+    return filename.endswith(".xls") or filename.endswith(".xlsx")
+
+
 @app.route("/consulta-excel", methods=["POST"])
 def consulta_excel_procesar():
     """Procesa archivo Excel"""
     file = request.files.get("archivo")
     take_screenshot = bool(request.form.get("take_screenshot"))
+    refrescar = bool(request.form.get("refrescar"))
 
     if not file or file.filename == "":
         flash("Debes seleccionar un archivo Excel.", "danger")
         return redirect(url_for("consulta_excel_form"))
 
     filename = secure_filename(file.filename)
-    if not (filename.endswith(".xls") or filename.endswith(".xlsx")):
+    if not _es_excel(filename):
         flash("El archivo debe ser un Excel (.xls o .xlsx).", "danger")
         return redirect(url_for("consulta_excel_form"))
 
-    # Guardar archivo
-    upload_path = UPLOAD_DIR / filename
-    file.save(str(upload_path))
+    # Guardar archivo por contenido: dos uploads con el mismo nombre no se pisan
+    # y un archivo idéntico ya procesado reutiliza su trabajo.
+    sha256, upload_path = guardar_upload(file.stream, Path(filename).suffix.lower())
+    limpiar_uploads()
+
+    opciones = {"take_screenshot": take_screenshot}
+    # La actualización incremental parte del último trabajo del mismo listado
+    # y del mismo tenant, y vuelve a consultar solo lo pendiente aunque el
+    # archivo sea idéntico.
+    job_anterior = buscar_job_anterior(filename, _tenant_actual()) if refrescar else None
+    if refrescar and job_anterior is None:
+        flash("No hay un trabajo anterior de este archivo; se consultan todas las filas.", "info")
+
+    job_existente = None if refrescar else buscar_job_por_upload(sha256, opciones, _tenant_actual())
+    if job_existente is not None:
+        flash(
+            "Este archivo ya fue procesado; se muestran los resultados existentes.",
+            "info",
+        )
+        return redirect(url_for("ver_job", job_id=job_existente["id"]))
+
+    return _procesar_excel(sha256, upload_path, filename, opciones, job_anterior)
+
+
+def _procesar_excel(sha256: str, upload_path: Path, filename: str, opciones: dict, job_anterior=None):
+    """
+    Crea el trabajo y consulta el Excel. Con `job_anterior` es una
+    actualización incremental: se reutilizan sus filas vigentes y se guarda
+    el delta respecto a ellas.
+    """
+    from services.results_service import calcular_delta, consultar_desde_excel
+
+    previo = cargar_resultados(job_anterior["id"]) if job_anterior is not None else None
+    tenant = _tenant_actual()
+    job = crear_job(sha256, filename, opciones, tenant=tenant)
 
     try:
-        # Procesar Excel
-        df_resultados, rutas = consultar_y_exportar_desde_excel(
+        # Procesar Excel; los archivos de descarga se generan al pedirlos.
+        df_resultados = consultar_desde_excel(
             excel_path=upload_path,
-            take_screenshot=take_screenshot,
-            base_filename="resultados_icfes",
+            take_screenshot=opciones["take_screenshot"],
+            cola=crear_cola() if app.config["JOB_QUEUE_URL"] else None,
+            job_id=job["id"],
+            tenant=tenant,
+            previo=previo,
         )
+        if previo is not None:
+            df_delta = calcular_delta(previo, df_resultados)
+            guardar_delta(job["id"], df_delta)
+            actualizar_job(job["id"], refresco_de=job_anterior["id"], num_cambios=len(df_delta))
+        guardar_resultados(job["id"], df_resultados)
 
-        num_registros = len(df_resultados)
-        num_errores = df_resultados["error"].notna().sum() if "error" in df_resultados.columns else 0
+        flash(f"Proceso completado: {len(df_resultados)} registros procesados", "success")
+        return redirect(url_for("ver_job", job_id=job["id"]))
 
-        flash(f"Proceso completado: {num_registros} registros procesados", "success")
-        
-        return render_template(
-            "resultados_excel.html",
-            num_registros=num_registros,
-            num_errores=num_errores,
-            rutas=rutas,
-        )
-        
     except Exception as e:
+        actualizar_job(job["id"], estado=ESTADO_ERROR, error=str(e))
         flash(f"Error al procesar archivo: {str(e)}", "danger")
         return redirect(url_for("consulta_excel_form"))
 
 
-@app.route("/descargar/<formato>")
-def descargar_resultados(formato: str):
-    """Descarga archivos generados"""
-    formato = formato.lower()
-    if formato not in ("csv", "xlsx", "json"):
-        flash("Formato no soportado.", "danger")
+@app.route("/jobs/<job_id>/refrescar", methods=["POST"])
+def refrescar_job(job_id: str):
+    """
+    Actualización incremental a partir de este trabajo: con una nueva versión
+    del Excel si se sube, o con el mismo archivo del trabajo si no.
+    """
+    job_anterior = _job_del_tenant(job_id)
+    if job_anterior is None:
+        flash("El trabajo solicitado no existe.", "warning")
+        return redirect(url_for("consulta_excel_form"))
+    if job_anterior["estado"] != ESTADO_COMPLETADO:
+        flash(f"El trabajo está en estado '{job_anterior['estado']}' y aún no tiene resultados.", "warning")
         return redirect(url_for("consulta_excel_form"))
 
-    filename = f"resultados_icfes.{formato}"
-    file_path = EXPORT_DIR / filename
+    file = request.files.get("archivo")
+    if file and file.filename:
+        filename = secure_filename(file.filename)
+        if not _es_excel(filename):
+            flash("El archivo debe ser un Excel (.xls o .xlsx).", "danger")
+            return redirect(url_for("ver_job", job_id=job_anterior["id"]))
+        sha256, upload_path = guardar_upload(file.stream, Path(filename).suffix.lower())
+        limpiar_uploads()
+    else:
+        filename = job_anterior["nombre_original"]
+        sha256 = job_anterior["upload_sha256"]
+        upload_path = ruta_por_contenido(sha256, Path(filename).suffix.lower())
+        if not upload_path.exists():
+            flash("El archivo original ya no está disponible; súbelo de nuevo para actualizar.", "warning")
+            return redirect(url_for("ver_job", job_id=job_anterior["id"]))
 
-    if not file_path.exists():
-        flash("Aún no se ha generado el archivo solicitado.", "warning")
+    opciones = {"take_screenshot": bool(job_anterior["opciones"].get("take_screenshot"))}
+    return _procesar_excel(sha256, upload_path, filename, opciones, job_anterior)
+
+
+@app.route("/jobs/<job_id>")
+def ver_job(job_id: str):
+    """Resumen de un trabajo por Excel"""
+    from services.stats_service import calcular_estadisticas
+
+    job = _job_del_tenant(job_id)
+    if job is None:
+        flash("El trabajo solicitado no existe.", "warning")
         return redirect(url_for("consulta_excel_form"))
 
-    return send_from_directory(
-        directory=str(EXPORT_DIR),
-        path=file_path.name,
+    df_resultados = cargar_resultados(job["id"])
+    if df_resultados is None:
+        flash(f"El trabajo está en estado '{job['estado']}' y aún no tiene resultados.", "warning")
+        return redirect(url_for("consulta_excel_form"))
+
+    return render_template(
+        "resultados_excel.html",
+        job=job,
+        num_registros=job["num_registros"],
+        num_errores=job["num_errores"],
+        estadisticas=calcular_estadisticas(df_resultados),
+        cambios=_cambios_para_mostrar(cargar_delta(job["id"])),
+    )
+
+
+def _cambios_para_mostrar(df_delta, limite: int = 200):
+    if df_delta is None:
+        return None
+    return df_delta.head(limite).fillna("").to_dict("records")
+
+
+@app.route("/jobs/<job_id>/download/<fmt>")
+def descargar_job(job_id: str, fmt: str):
+    """Descarga los resultados de un trabajo en el formato pedido"""
+    if _job_del_tenant(job_id) is None:
+        flash("El trabajo solicitado no existe.", "warning")
+        return redirect(url_for("consulta_excel_form"))
+    job_id = secure_filename(job_id)
+    fmt = fmt.lower()
+    if fmt not in FORMATOS:
+        flash("Formato no soportado.", "danger")
+        return redirect(url_for("ver_job", job_id=job_id))
+
+    # CSV y JSON van comprimidos si el cliente lo acepta. Con Range se sirve el
+    # archivo sin comprimir para que los rangos correspondan a sus bytes.
+    comprimido = (
+        fmt in FORMATOS_COMPRIMIBLES
+        and "gzip" in request.accept_encodings
+        and request.range is None
+    )
+    path = obtener_exportacion(job_id, fmt, comprimido=comprimido)
+    if path is None:
+        flash("El trabajo no existe o aún no tiene resultados.", "warning")
+        return redirect(url_for("consulta_excel_form"))
+
+    nombre = nombre_descarga(job_id, fmt)
+    respuesta = send_file(
+        path,
+        mimetype=mimetypes.guess_type(nombre)[0] or "application/octet-stream",
         as_attachment=True,
+        download_name=nombre,
+        conditional=True,
     )
+    if comprimido:
+        respuesta.headers["Content-Encoding"] = "gzip"
+    if fmt in FORMATOS_COMPRIMIBLES:
+        respuesta.vary.add("Accept-Encoding")
+    return respuesta
+
+
+@app.route("/planificador")
+def estado_planificador():
+    """Cupos, colas y p95 de latencia por clase de prioridad"""
+    return jsonify(obtener_planificador().estado())
+
+
+@app.route("/navegadores")
+def estado_navegadores():
+    """Chromium vivos, su memoria y CPU, y los terminados por el vigilante"""
+    return jsonify(obtener_vigilante().estado())
 
 
 @app.route("/screenshots/<path:filename>")
@@ -158,6 +366,43 @@ def ver_screenshot(filename: str):
     )
 
 
+@app.route("/trazas")
+def ver_trazas():
+    """Lista las consultas trazadas más lentas, opcionalmente de un job"""
+    job_id = request.args.get("job", "").strip() or None
+    limite = request.args.get("n", 20, type=int)
+    return render_template(
+        "trazas.html",
+        trazas=listar_trazas(job_id=job_id, limite=limite, visible=_traza_visible),
+        jobs=listar_jobs_trazados(visible=_traza_visible),
+        job_id=job_id,
+        limite=limite,
+        trazas_activas=app.config["TRACE_ENABLED"],
+    )
+
+
+def _traza_visible(job_id: str) -> bool:
+    # Las trazas se agrupan por trabajo; las de consultas manuales ("manual")
+    # no pertenecen a ningún tenant y no se listan.
+    return _job_del_tenant(job_id) is not None
+
+
+@app.route("/trazas/<job_id>/<nombre>/trace.zip")
+def descargar_traza(job_id: str, nombre: str):
+    """Descarga el archivo de traza de Playwright de una consulta"""
+    directorio = TRACE_DIR / secure_filename(job_id) / secure_filename(nombre)
+    if not _traza_visible(job_id) or not (directorio / ARCHIVO_TRAZA).exists():
+        flash("La traza solicitada no existe.", "warning")
+        return redirect(url_for("ver_trazas"))
+
+    return send_from_directory(
+        directory=str(directorio),
+        path=ARCHIVO_TRAZA,
+        as_attachment=True,
+        download_name=f"traza_{job_id}_{nombre}.zip",
+    )
+
+
 if __name__ == "__main__":
     print("Iniciando servidor Flask...")
     print(f"Directorio de exportación: {EXPORT_DIR}")
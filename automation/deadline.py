@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+
+class ConsultaTimeoutError(TimeoutError):
+    """
+    La consulta agotó su presupuesto de tiempo. `etapa` indica dónde ocurrió
+    (formulario, captcha, envio_y_resultados, ...).
+    """
+
+    def __init__(self, etapa: str, presupuesto_s: float):
+        self.etapa = etapa
+        self.presupuesto_s = presupuesto_s
+        super().__init__(
+            f"Tiempo agotado en la etapa '{etapa}' "
+            f"(presupuesto de {presupuesto_s:g} s por consulta)"
+        )
+
+
+class Deadline:
+    """
+    Presupuesto de tiempo de una consulta. Se pasa a cada etapa para que las
+    esperas y los timeouts de Playwright nunca excedan el tiempo restante.
+    """
+
+    def __init__(self, segundos: float):
+        self.presupuesto_s = segundos
+        self._fin = time.monotonic() + segundos
+        self.etapa_actual = "inicio"
+        self._page: Any = None
+        self._maximo_page_ms = 30000.0
+
+    def restante(self) -> float:
+        return max(0.0, self._fin - time.monotonic())
+
+    def vencido(self) -> bool:
+        return time.monotonic() >= self._fin
+
+    def verificar(self, etapa: Optional[str] = None) -> None:
+        if self.vencido():
+            raise ConsultaTimeoutError(etapa or self.etapa_actual, self.presupuesto_s)
+
+    def timeout_ms(self, maximo_ms: float) -> float:
+        """
+        Timeout para una llamada de Playwright: el menor entre `maximo_ms` y lo
+        que queda del presupuesto.
+        """
+        self.verificar()
+        return max(1.0, min(maximo_ms, self.restante() * 1000))
+
+    def vincular(self, page: Any, maximo_ms: float = 30000) -> None:
+        """
+        Asocia la página de Playwright a este presupuesto: su timeout por
+        defecto (el de click/fill/evaluate sin `timeout=`) se recorta al tiempo
+        restante al entrar a cada etapa y después de cada espera.
+        """
+        self._page = page
+        self._maximo_page_ms = maximo_ms
+        self.acotar()
+
+    def acotar(self) -> None:
+        if self._page is not None:
+            timeout = self.timeout_ms(self._maximo_page_ms)
+            self._page.set_default_timeout(timeout)
+            self._page.set_default_navigation_timeout(timeout)
+
+    def sleep(self, segundos: float) -> None:
+        self.verificar()
+        time.sleep(min(segundos, self.restante()))
+        self.verificar()
+        self.acotar()
+
+    async def sleep_async(self, segundos: float) -> None:
+        self.verificar()
+        await asyncio.sleep(min(segundos, self.restante()))
+        self.verificar()
+        self.acotar()
+
+    @contextmanager
+    def etapa(self, nombre: str) -> Iterator[None]:
+        """
+        Marca la etapa en curso. Si una llamada falla porque se agotó el
+        presupuesto (p. ej. un TimeoutError de Playwright recortado), el error
+        se reemplaza por ConsultaTimeoutError con la etapa correspondiente.
+        """
+        anterior = self.etapa_actual
+        self.etapa_actual = nombre
+        try:
+            self.acotar()
+            yield
+        except ConsultaTimeoutError:
+            raise
+        except Exception as e:
+            if self.vencido():
+                raise ConsultaTimeoutError(nombre, self.presupuesto_s) from e
+            raise
+        finally:
+            self.etapa_actual = anterior
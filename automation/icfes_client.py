@@ -3,13 +3,24 @@ from __future__ import annotations
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
-import time
-from anticaptchaofficial.recaptchav2proxyless import recaptchaV2Proxyless
-
-from playwright.sync_api import sync_playwright, Page
-
-from config import ICFES_LOGIN_URL, HEADLESS, SCREENSHOT_DIR, ANTI_CAPTCHA_KEY
+from typing import TYPE_CHECKING, Any, Callable, Generator, Optional
+
+from config import (
+    ICFES_LOGIN_URL,
+    HEADLESS,
+    SCREENSHOT_DIR,
+    ANTI_CAPTCHA_KEY,
+    CONSULTA_TIMEOUT_S,
+    MAX_INTENTOS_DESAFIO,
+)
+from automation.deadline import ConsultaTimeoutError, Deadline
+from automation.tracing import RegistroTraza
+from automation.watchdog import marca_propietario, obtener_vigilante
+
+# Playwright y requests se importan al usarse: importar este módulo
+# (p. ej. por LoginParams) no debe pagar su costo de carga.
+if TYPE_CHECKING:
+    from playwright.sync_api import Browser, Page, Playwright
 
 TIPO_DOC_LABEL_MAP = {
     "CC": "Cédula de ciudadanía",
@@ -19,6 +30,134 @@ TIPO_DOC_LABEL_MAP = {
     "PA": "Pasaporte",
 }
 
+_SELECTOR_BTN_VERIFICAR = "button:has-text('Verificar'), button:has-text('Confirmar'), button:has-text('Next')"
+_SELECTOR_BTN_OMITIR = "button:has-text('Omitir'), button:has-text('Skip')"
+_SELECTOR_FRAME_DESAFIO = "iframe[src*='recaptcha/api2/bframe']"
+
+_URL_API_ANTICAPTCHA = "https://api.anti-captcha.com/"
+_TIMEOUT_PETICION_ANTICAPTCHA_S = 30
+_INTERVALO_SONDEO_ANTICAPTCHA_S = 2
+
+_SELECTORES_ERROR_RESULTADOS = [
+    ".error-message",
+    ".alert-danger",
+    ".text-danger",
+    "[class*='error']",
+    "[class*='alert']",
+]
+
+_JS_CALLBACK_RECAPTCHA = """
+    () => {
+        const widget = document.querySelector('.g-recaptcha');
+        const isInvisible = widget && widget.getAttribute('data-size') === 'invisible';
+        if (isInvisible) {
+            const widgetId = grecaptcha.getResponse ? 0 : null;
+            if (widgetId !== null && typeof grecaptcha.execute === 'function') {
+                grecaptcha.execute(widgetId);
+            }
+        }
+        const callbackName = widget?.getAttribute('data-callback');
+        if (callbackName && typeof window[callbackName] === 'function') {
+            const token = grecaptcha.getResponse();
+            if (token) window[callbackName](token);
+        }
+        window.dispatchEvent(new CustomEvent('recaptcha-success', { detail: { success: true } }));
+    }
+"""
+
+_JS_TOKEN_RECAPTCHA = "() => grecaptcha.getResponse()"
+
+_JS_SITEKEY = """(el) => {
+    const src = el.getAttribute('src');
+    const match = src.match(/[?&]k=([^&]+)/);
+    return match ? match[1] : null;
+}"""
+
+_JS_INYECTAR_TOKEN = """
+    (token) => {
+        const responseField = document.getElementById('g-recaptcha-response') ||
+                              document.querySelector('[name="g-recaptcha-response"]');
+        if (responseField) {
+            responseField.value = token;
+            responseField.innerHTML = token;
+            ['input', 'change'].forEach(evt => {
+                responseField.dispatchEvent(new Event(evt, { bubbles: true }));
+            });
+        }
+    }
+"""
+
+_JS_TOKEN_ACEPTADO = """
+    () => {
+        const tokenField = document.getElementById('g-recaptcha-response');
+        return tokenField && tokenField.value.length > 0;
+    }
+"""
+
+_JS_VERIFICACION_FINAL = """
+    () => {
+        const responseField = document.getElementById('g-recaptcha-response');
+        return {
+            hasValue: responseField && responseField.value.length > 0,
+            buttonEnabled: !document.querySelector('button[type=\"submit\"]').disabled
+        };
+    }
+"""
+
+_JS_DISPARAR_EVENTOS = """
+    (id) => {
+        const input = document.getElementById(id);
+        if (input) {
+            input.dispatchEvent(new Event('input', { bubbles: true }));
+            input.dispatchEvent(new Event('change', { bubbles: true }));
+            input.dispatchEvent(new Event('blur', { bubbles: true }));
+        }
+    }
+"""
+
+_JS_ERRORES_VALIDACION = """
+    () => {
+        const errors = [];
+        const errorSelectors = [
+            '.error-message',
+            '.field-error',
+            '.invalid-feedback',
+            '.text-danger',
+            'icfes-mensajes-formulario'
+        ];
+        errorSelectors.forEach(selector => {
+            document.querySelectorAll(selector).forEach(el => {
+                if (el.offsetParent !== null && el.textContent.trim()) {
+                    errors.push(el.textContent.trim());
+                }
+            });
+        });
+        return errors;
+    }
+"""
+
+_JS_DOCUMENTO_ACTUAL = """
+    () => {
+        const el = document.querySelector('#identificacion');
+        return el && el.value ? el.value.trim() : 'sin_identificacion';
+    }
+"""
+
+_JS_PUNTAJE_CARGADO = """
+    () => {
+        const el = document.querySelector("icfes-puntaje-general span");
+        return el && el.textContent && /\\d+/.test(el.textContent);
+    }
+"""
+
+_JS_NOMBRE_CARGADO = """
+    () => {
+        const el = document.querySelector("icfes-navbar button");
+        return el && el.textContent && el.textContent.trim().length > 0;
+    }
+"""
+
+
 @dataclass
 class LoginParams:
     tipo_documento: str
@@ -53,7 +192,56 @@ def _normalizar_fecha(fecha_str: str) -> str:
 
 
 
-def _seleccionar_tipo_documento(page: Page, tipo_documento: str) -> None:
+# Los pasos de la consulta se escriben una sola vez como generadores y los
+# ejecutan tanto fetch_results_page (playwright.sync_api) como
+# fetch_results_page_async (playwright.async_api). Cada llamada a Playwright se
+# hace con `yield`: con la API síncrona ya trae su valor y el conductor lo
+# devuelve tal cual; con la asíncrona es una corrutina que el conductor espera.
+# Las pausas y las llamadas bloqueantes se piden con _Pausa y _Bloqueante para
+# que cada conductor las resuelva a su manera.
+Pasos = Generator[Any, Any, Any]
+
+
+class _Pausa:
+    def __init__(self, segundos: float):
+        self.segundos = segundos
+
+
+class _Bloqueante:
+    """
+    Llamada que bloquea (p. ej. requests): la versión asíncrona la lleva a un
+    hilo para no detener el event loop.
+    """
+
+    def __init__(self, funcion: Callable, *args):
+        self.funcion = funcion
+        self.args = args
+
+
+def _conducir(pasos: Pasos, deadline: Deadline):
+    """
+    Ejecuta unos pasos con la API síncrona de Playwright y devuelve su valor.
+    """
+    enviar, valor = pasos.send, None
+    while True:
+        try:
+            operacion = enviar(valor)
+        except StopIteration as fin:
+            return fin.value
+        try:
+            if isinstance(operacion, _Pausa):
+                valor = deadline.sleep(operacion.segundos)
+            elif isinstance(operacion, _Bloqueante):
+                valor = operacion.funcion(*operacion.args)
+            else:
+                valor = operacion
+            enviar = pasos.send
+        except Exception as e:
+            # El error vuelve al paso que lo pidió, que puede capturarlo.
+            enviar, valor = pasos.throw, e
+
+
+def _seleccionar_tipo_documento(page: Page, tipo_documento: str, deadline: Deadline) -> Pasos:
     code = (tipo_documento or "").strip()
     label = TIPO_DOC_LABEL_MAP.get(code.upper(), code)
     try:
@@ -62,254 +250,210 @@ def _seleccionar_tipo_documento(page: Page, tipo_documento: str) -> None:
             ".ng-select-container"
         )
         container = page.locator(container_selector)
-        if container.count() == 0:
+        if (yield container.count()) == 0:
             print("No se encontró el combo de tipo de documento.")
             return
-        container.first.click()
-        page.wait_for_selector(".ng-dropdown-panel .ng-option", timeout=5000)
+        yield container.first.click()
+        yield page.wait_for_selector(".ng-dropdown-panel .ng-option", timeout=deadline.timeout_ms(5000))
         option = page.locator(".ng-dropdown-panel .ng-option", has_text=label)
-        if option.count() > 0:
-            option.first.click()
+        if (yield option.count()) > 0:
+            yield option.first.click()
         else:
             print(
                 f"No se encontró una opción que contenga el texto '{label}'. "
                 "Se seleccionará la primera opción disponible."
             )
-            page.locator(".ng-dropdown-panel .ng-option").first.click()
-        time.sleep(0.3)
+            yield page.locator(".ng-dropdown-panel .ng-option").first.click()
+        yield _Pausa(0.3)
+    except ConsultaTimeoutError:
+        raise
     except Exception as e:
         print(f"Advertencia al seleccionar tipo de documento: {e}")
 
 
-def _click_recaptcha_checkbox(page: Page) -> None:
+def _click_recaptcha_checkbox(page: Page) -> Pasos:
     print("Haciendo clic en el checkbox del reCAPTCHA...")
     checkbox_iframe = page.locator("iframe[title='reCAPTCHA']").first
-    if checkbox_iframe.count() > 0:
-        checkbox_iframe.click()
+    if (yield checkbox_iframe.count()) > 0:
+        yield checkbox_iframe.click()
         print("✔ Checkbox clickeado.")
-        time.sleep(1)
+        yield _Pausa(1)
     else:
         print("⚠ No se encontró el iframe del checkbox.")
 
 
-def _handle_recaptcha_challenge(page: Page) -> None:
-    print("Verificando si apareció desafío visual...")
+def _handle_recaptcha_challenge(page: Page, deadline: Deadline) -> Pasos:
+    for intento in range(1, MAX_INTENTOS_DESAFIO + 1):
+        print(f"Verificando si apareció desafío visual (intento {intento})...")
 
-    time.sleep(2)
+        yield _Pausa(2)
 
-    verify_btn = page.locator("button:has-text('Verificar'), button:has-text('Confirmar'), button:has-text('Next')")
-    skip_btn = page.locator("button:has-text('Omitir'), button:has-text('Skip')")
+        verify_btn = page.locator(_SELECTOR_BTN_VERIFICAR)
+        skip_btn = page.locator(_SELECTOR_BTN_OMITIR)
 
-    if verify_btn.count() > 0 and verify_btn.first.is_visible():
-        print("✔ Desafío detectado. Haciendo clic en 'Verificar'...")
-        verify_btn.first.click()
-        time.sleep(3)
-        _handle_recaptcha_challenge(page)
-    elif skip_btn.count() > 0 and skip_btn.first.is_visible():
-        print("✔ Desafío detectado. Haciendo clic en 'Omitir'...")
-        skip_btn.first.click()
-        time.sleep(3)
-    else:
-        print("✔ No apareció desafío visual.")
+        if (yield verify_btn.count()) > 0 and (yield verify_btn.first.is_visible()):
+            print("✔ Desafío detectado. Haciendo clic en 'Verificar'...")
+            yield verify_btn.first.click(timeout=deadline.timeout_ms(10000))
+            yield _Pausa(3)
+            continue
+        elif (yield skip_btn.count()) > 0 and (yield skip_btn.first.is_visible()):
+            print("✔ Desafío detectado. Haciendo clic en 'Omitir'...")
+            yield skip_btn.first.click(timeout=deadline.timeout_ms(10000))
+            yield _Pausa(3)
+        else:
+            print("✔ No apareció desafío visual.")
+
+        challenge_frame = page.locator(_SELECTOR_FRAME_DESAFIO)
+        if (yield challenge_frame.count()) > 0 and (yield challenge_frame.first.is_visible()):
+            print("⚠ El desafío sigue visible. Reintentando...")
+            yield _Pausa(2)
+            continue
 
-    challenge_frame = page.locator("iframe[src*='recaptcha/api2/bframe']")
-    if challenge_frame.count() > 0 and challenge_frame.first.is_visible():
-        print("⚠ El desafío sigue visible. Reintentando...")
-        time.sleep(2)
-        _handle_recaptcha_challenge(page)
-    else:
         print("✔ Desafío cerrado.")
+        return
 
+    raise RuntimeError(
+        f"El desafío del reCAPTCHA sigue abierto tras {MAX_INTENTOS_DESAFIO} intentos."
+    )
 
-def _trigger_recaptcha_callback(page: Page) -> None:
+
+def _trigger_recaptcha_callback(page: Page) -> Pasos:
     print("Ejecutando callback de éxito del CAPTCHA...")
-    page.evaluate("""
-        () => {
-            const widget = document.querySelector('.g-recaptcha');
-            const isInvisible = widget && widget.getAttribute('data-size') === 'invisible';
-            if (isInvisible) {
-                const widgetId = grecaptcha.getResponse ? 0 : null;
-                if (widgetId !== null && typeof grecaptcha.execute === 'function') {
-                    grecaptcha.execute(widgetId);
-                }
-            }
-            const callbackName = widget?.getAttribute('data-callback');
-            if (callbackName && typeof window[callbackName] === 'function') {
-                const token = grecaptcha.getResponse();
-                if (token) window[callbackName](token);
-            }
-            window.dispatchEvent(new CustomEvent('recaptcha-success', { detail: { success: true } }));
-        }
-    """)
+    yield page.evaluate(_JS_CALLBACK_RECAPTCHA)
     print("✔ Callback ejecutado (si aplica).")
-    time.sleep(1)
+    yield _Pausa(1)
+
 
+def _llamar_anticaptcha(metodo: str, datos: dict, deadline: Deadline) -> dict:
+    """
+    Una petición a la API de Anti-Captcha con timeout propio, recortado al
+    tiempo restante de la consulta.
+    """
+    import requests
 
-def _solve_captcha_with_anticaptcha(page: Page) -> None:
-    token = page.evaluate("() => grecaptcha.getResponse()")
+    timeout = min(_TIMEOUT_PETICION_ANTICAPTCHA_S, max(0.1, deadline.restante()))
+    try:
+        respuesta = requests.post(_URL_API_ANTICAPTCHA + metodo, json=datos, timeout=timeout)
+        respuesta.raise_for_status()
+        resultado = respuesta.json()
+    except (requests.RequestException, ValueError) as e:
+        deadline.verificar()
+        raise RuntimeError(f"Error Anti-Captcha: {e}") from e
+
+    if resultado.get("errorId"):
+        raise RuntimeError(
+            f"Error Anti-Captcha: {resultado.get('errorCode')} {resultado.get('errorDescription', '')}".strip()
+        )
+    return resultado
+
+
+def _resolver_token_anticaptcha(url: str, sitekey: str, deadline: Deadline) -> str:
+    """
+    Pide el token a Anti-Captcha (createTask + getTaskResult) sin exceder el
+    presupuesto: cada petición lleva timeout y la espera entre sondeos se mide
+    con el reloj, no contando intentos.
+    """
+    tarea = _llamar_anticaptcha(
+        "createTask",
+        {
+            "clientKey": ANTI_CAPTCHA_KEY,
+            "task": {
+                "type": "RecaptchaV2TaskProxyless",
+                "websiteURL": url,
+                "websiteKey": sitekey,
+            },
+        },
+        deadline,
+    )
+
+    deadline.sleep(3)
+    while True:
+        resultado = _llamar_anticaptcha(
+            "getTaskResult",
+            {"clientKey": ANTI_CAPTCHA_KEY, "taskId": tarea["taskId"]},
+            deadline,
+        )
+        if resultado.get("status") == "ready":
+            return resultado["solution"]["gRecaptchaResponse"]
+        print("Anti-Captcha: tarea en proceso...")
+        deadline.sleep(_INTERVALO_SONDEO_ANTICAPTCHA_S)
+
+
+def _solve_captcha_with_anticaptcha(page: Page, deadline: Deadline) -> Pasos:
+    token = yield page.evaluate(_JS_TOKEN_RECAPTCHA)
     if token:
         print("✔ CAPTCHA ya resuelto anteriormente.")
         return
 
     print("Buscando reCAPTCHA en la página...")
     iframes = page.locator("iframe[src*='recaptcha']")
-    if iframes.count() == 0:
+    if (yield iframes.count()) == 0:
         raise RuntimeError("No se detectó reCAPTCHA.")
 
-    iframe = iframes.first
-    sitekey = iframe.evaluate("""(el) => {
-        const src = el.getAttribute('src');
-        const match = src.match(/[?&]k=([^&]+)/);
-        return match ? match[1] : null;
-    }""")
+    sitekey = yield iframes.first.evaluate(_JS_SITEKEY)
 
     if not sitekey:
         raise RuntimeError("No se pudo extraer el sitekey.")
 
     print(f"✓ Sitekey detectado: {sitekey}")
-    solver = recaptchaV2Proxyless()
-    solver.set_verbose(1)
-    solver.set_key(ANTI_CAPTCHA_KEY)
-    solver.set_website_url(page.url)
-    solver.set_website_key(sitekey)
-
-    g_response = solver.solve_and_return_solution()
-    if g_response == 0:
-        raise RuntimeError(f"Error Anti-Captcha: {solver.error_code}")
+    g_response = yield _Bloqueante(_resolver_token_anticaptcha, page.url, sitekey, deadline)
 
     print("✓ CAPTCHA resuelto por Anti-Captcha.")
     print(f"Token (primeros 50 chars): {g_response[:50]}...")
 
-    page.evaluate("""
-        (token) => {
-            const responseField = document.getElementById('g-recaptcha-response') ||
-                                  document.querySelector('[name="g-recaptcha-response"]');
-            if (responseField) {
-                responseField.value = token;
-                responseField.innerHTML = token;
-                ['input', 'change'].forEach(evt => {
-                    responseField.dispatchEvent(new Event(evt, { bubbles: true }));
-                });
-            }
-        }
-    """, g_response)
+    yield page.evaluate(_JS_INYECTAR_TOKEN, g_response)
 
-    _click_recaptcha_checkbox(page)
-    _trigger_recaptcha_callback(page)
-    _handle_recaptcha_challenge(page)
+    yield from _click_recaptcha_checkbox(page)
+    yield from _trigger_recaptcha_callback(page)
+    yield from _handle_recaptcha_challenge(page, deadline)
 
     print("Verificando si el CAPTCHA fue aceptado por el sitio...")
-    page.wait_for_function("""
-        () => {
-            const tokenField = document.getElementById('g-recaptcha-response');
-            return tokenField && tokenField.value.length > 0;
-        }
-    """, timeout=10000)
+    yield page.wait_for_function(_JS_TOKEN_ACEPTADO, timeout=deadline.timeout_ms(10000))
     print("✔ CAPTCHA aceptado por el sitio.")
 
-    result = page.evaluate("""
-        () => {
-            const responseField = document.getElementById('g-recaptcha-response');
-            return {
-                hasValue: responseField && responseField.value.length > 0,
-                buttonEnabled: !document.querySelector('button[type=\"submit\"]').disabled
-            };
-        }
-    """)
+    result = yield page.evaluate(_JS_VERIFICACION_FINAL)
     print(f"Verificación final: {result}")
     if not result["buttonEnabled"]:
         print("⚠ El botón de ingreso aún está deshabilitado.")
 
 
-def _fill_login_form(page: Page, params: LoginParams) -> None:
+def _llenar_campo(page: Page, selector_id: str, valor: str) -> Pasos:
+    yield page.click(f"#{selector_id}")
+    yield _Pausa(0.2)
+    yield page.fill(f"#{selector_id}", valor)
+    yield _Pausa(0.3)
+    yield page.evaluate(_JS_DISPARAR_EVENTOS, selector_id)
+    yield _Pausa(0.5)
+
+
+def _fill_login_form(page: Page, params: LoginParams, deadline: Deadline) -> Pasos:
     print("Llenando formulario...")
-    page.wait_for_selector("form", timeout=10000)
-    time.sleep(1)
+    yield page.wait_for_selector("form", timeout=deadline.timeout_ms(10000))
+    yield _Pausa(1)
 
     print("  → Seleccionando tipo de documento...")
-    _seleccionar_tipo_documento(page, params.tipo_documento)
-    time.sleep(0.5)
+    yield from _seleccionar_tipo_documento(page, params.tipo_documento, deadline)
+    yield _Pausa(0.5)
 
     print("  → Ingresando número de documento...")
-    page.click("#identificacion")
-    time.sleep(0.2)
-    page.fill("#identificacion", params.numero_documento)
-    time.sleep(0.3)
-    page.evaluate("""
-        () => {
-            const input = document.getElementById('identificacion');
-            if (input) {
-                input.dispatchEvent(new Event('input', { bubbles: true }));
-                input.dispatchEvent(new Event('change', { bubbles: true }));
-                input.dispatchEvent(new Event('blur', { bubbles: true }));
-            }
-        }
-    """)
-    time.sleep(0.5)
+    yield from _llenar_campo(page, "identificacion", params.numero_documento)
 
     if params.fecha_nacimiento:
         print("  → Ingresando fecha de nacimiento...")
         fecha_normalizada = _normalizar_fecha(params.fecha_nacimiento)
         if fecha_normalizada:
-            page.click("#fechaNacimiento")
-            time.sleep(0.2)
-            page.fill("#fechaNacimiento", fecha_normalizada)
-            time.sleep(0.3)
-            page.evaluate("""
-                () => {
-                    const input = document.getElementById('fechaNacimiento');
-                    if (input) {
-                        input.dispatchEvent(new Event('input', { bubbles: true }));
-                        input.dispatchEvent(new Event('change', { bubbles: true }));
-                        input.dispatchEvent(new Event('blur', { bubbles: true }));
-                    }
-                }
-            """)
-            time.sleep(0.5)
+            yield from _llenar_campo(page, "fechaNacimiento", fecha_normalizada)
 
     if params.numero_registro:
         print("  → Ingresando número de registro...")
-        page.click("#numeroRegistro")
-        time.sleep(0.2)
-        page.fill("#numeroRegistro", params.numero_registro.upper())
-        time.sleep(0.3)
-        page.evaluate("""
-            () => {
-                const input = document.getElementById('numeroRegistro');
-                if (input) {
-                    input.dispatchEvent(new Event('input', { bubbles: true }));
-                    input.dispatchEvent(new Event('change', { bubbles: true }));
-                    input.dispatchEvent(new Event('blur', { bubbles: true }));
-                }
-            }
-        """)
-        time.sleep(0.5)
+        yield from _llenar_campo(page, "numeroRegistro", params.numero_registro.upper())
 
     if not params.fecha_nacimiento and not params.numero_registro:
         print("ADVERTENCIA: No se proporcionó fecha de nacimiento ni número de registro")
 
     print("  → Verificando validaciones...")
-    time.sleep(1)
-    validation_errors = page.evaluate("""
-        () => {
-            const errors = [];
-            const errorSelectors = [
-                '.error-message',
-                '.field-error',
-                '.invalid-feedback',
-                '.text-danger',
-                'icfes-mensajes-formulario'
-            ];
-            errorSelectors.forEach(selector => {
-                document.querySelectorAll(selector).forEach(el => {
-                    if (el.offsetParent !== null && el.textContent.trim()) {
-                        errors.push(el.textContent.trim());
-                    }
-                });
-            });
-            return errors;
-        }
-    """)
+    yield _Pausa(1)
+    validation_errors = yield page.evaluate(_JS_ERRORES_VALIDACION)
     if validation_errors:
         print(f"Errores: {validation_errors}")
     else:
@@ -317,70 +461,49 @@ def _fill_login_form(page: Page, params: LoginParams) -> None:
     print("Formulario completado")
 
 
-def _submit_form_and_wait_results(page: Page) -> None:
-    print("Enviando formulario...")
+def _documento_actual(page: Page) -> Pasos:
+    try:
+        return (yield page.evaluate(_JS_DOCUMENTO_ACTUAL))
+    except Exception:
+        return "sin_identificacion"
 
-    def _get_doc_for_filename() -> str:
-        try:
-            return page.evaluate("""
-                () => {
-                    const el = document.querySelector('#identificacion');
-                    return el && el.value ? el.value.trim() : 'sin_identificacion';
-                }
-            """)
-        except Exception:
-            return "sin_identificacion"
 
-    doc_val_before = _get_doc_for_filename()
+def _submit_form_and_wait_results(page: Page, deadline: Deadline) -> Pasos:
+    print("Enviando formulario...")
+
+    doc_val_before = yield from _documento_actual(page)
     pre_send_html_path = SCREENSHOT_DIR / f"pre_send_{doc_val_before}.html"
-    pre_send_html_path.write_text(page.content(), encoding="utf-8")
+    pre_send_html_path.write_text((yield page.content()), encoding="utf-8")
     print(f"HTML antes de enviar guardado en: {pre_send_html_path}")
 
-    page.click("button[type='submit']")
-    page.wait_for_load_state("networkidle")
-    time.sleep(5)
+    yield page.click("button[type='submit']")
+    yield page.wait_for_load_state("networkidle", timeout=deadline.timeout_ms(30000))
+    yield _Pausa(5)
 
-    doc_val_after = _get_doc_for_filename()
+    doc_val_after = yield from _documento_actual(page)
     post_send_html_path = SCREENSHOT_DIR / f"post_send_{doc_val_after}.html"
-    post_send_html_path.write_text(page.content(), encoding="utf-8")
+    post_send_html_path.write_text((yield page.content()), encoding="utf-8")
     print(f"HTML después de enviar guardado en: {post_send_html_path}")
 
-    error_selectors = [
-        ".error-message",
-        ".alert-danger",
-        ".text-danger",
-        "[class*='error']",
-        "[class*='alert']",
-    ]
-    for selector in error_selectors:
+    for selector in _SELECTORES_ERROR_RESULTADOS:
         loc = page.locator(selector)
-        if loc.count() > 0 and loc.first.is_visible():
-            error_text = (loc.first.text_content() or "").strip()
+        if (yield loc.count()) > 0 and (yield loc.first.is_visible()):
+            error_text = ((yield loc.first.text_content()) or "").strip()
             raise RuntimeError(f"El sitio del ICFES muestra error: {error_text}")
 
     try:
         print("Esperando que cargue el puntaje general (máx. 30 s)...")
-        page.wait_for_function("""
-            () => {
-                const el = document.querySelector("icfes-puntaje-general span");
-                return el && el.textContent && /\\d+/.test(el.textContent);
-            }
-        """, timeout=30000)
+        yield page.wait_for_function(_JS_PUNTAJE_CARGADO, timeout=deadline.timeout_ms(30000))
         print("✔ Puntaje general cargado.")
     except Exception as e:
         print(f"⚠ No apareció el puntaje general: {e}")
-        debug_html = SCREENSHOT_DIR / "debug_no_puntaje.html"
-        debug_html.write_text(page.content(), encoding="utf-8")
+        debug_html = SCREENSHOT_DIR / f"debug_no_puntaje_{doc_val_after}.html"
+        debug_html.write_text((yield page.content()), encoding="utf-8")
         print(f"HTML guardado en: {debug_html}")
 
     try:
         print("Esperando que cargue el nombre del estudiante (máx. 10 s)...")
-        page.wait_for_function("""
-            () => {
-                const el = document.querySelector("icfes-navbar button");
-                return el && el.textContent && el.textContent.trim().length > 0;
-            }
-        """, timeout=10000)
+        yield page.wait_for_function(_JS_NOMBRE_CARGADO, timeout=deadline.timeout_ms(10000))
         print("✔ Nombre cargado.")
     except Exception as e:
         print(f"⚠ No apareció el nombre: {e}")
@@ -395,83 +518,179 @@ def _submit_form_and_wait_results(page: Page) -> None:
     print("✔ Página de resultados cargada completamente.")
 
 
-def _take_results_screenshot(page: Page, numero_documento: str) -> Path:
+def _take_results_screenshot(page: Page, numero_documento: str) -> Pasos:
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"{numero_documento}_{timestamp}.png"
     path = SCREENSHOT_DIR / filename
-    page.screenshot(path=str(path), full_page=True)
+    yield page.screenshot(path=str(path), full_page=True)
     return path
 
 
-def fetch_results_page(
+def _screenshot_de_error(page: Page, numero_documento: str) -> Pasos:
+    path = SCREENSHOT_DIR / (
+        f"error_{numero_documento}_"
+        f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
+    )
+    try:
+        yield page.screenshot(path=str(path), full_page=True)
+    except Exception as ss_e:
+        print(f"No se pudo tomar screenshot de error: {ss_e}")
+
+
+def _consulta(
+    page: Page,
     params: LoginParams,
-    take_screenshot: bool = False,
-) -> FetchResult:
-    playwright = None
-    browser = None
-    context = None
-    page: Optional[Page] = None
+    take_screenshot: bool,
+    traza: RegistroTraza,
+    deadline: Deadline,
+) -> Pasos:
+    """
+    La consulta desde el login hasta la página de resultados, con la página ya
+    abierta. Devuelve el FetchResult.
+    """
+    print("Navegando a la página de login...")
+    with traza.etapa("navegacion"), deadline.etapa("navegacion"):
+        yield page.goto(ICFES_LOGIN_URL, wait_until="networkidle", timeout=deadline.timeout_ms(60000))
+        yield _Pausa(2)
+
+    with traza.etapa("formulario"), deadline.etapa("formulario"):
+        yield from _fill_login_form(page, params, deadline)
+
+    print("Resolviendo CAPTCHA...")
+    with traza.etapa("captcha"), deadline.etapa("captcha"):
+        yield from _solve_captcha_with_anticaptcha(page, deadline)
+
+    with traza.etapa("envio_y_resultados"), deadline.etapa("envio_y_resultados"):
+        yield from _submit_form_and_wait_results(page, deadline)
+
+    html = yield page.content()
+    real_html_path = SCREENSHOT_DIR / f"real_{params.numero_documento}_con_datos.html"
+    real_html_path.write_text(html, encoding="utf-8")
+    print(f"HTML con datos guardado en: {real_html_path}")
+
     screenshot_path: Optional[Path] = None
+    if take_screenshot:
+        print("Tomando screenshot...")
+        with traza.etapa("screenshot"):
+            screenshot_path = yield from _take_results_screenshot(page, params.numero_documento)
+
+    print("✔ Proceso completado exitosamente")
+    return FetchResult(html=html, screenshot_path=screenshot_path)
+
+
+OPCIONES_CONTEXTO = {
+    "viewport": {'width': 1280, 'height': 720},
+    "user_agent": (
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
+        'AppleWebKit/537.36 (KHTML, like Gecko) '
+        'Chrome/91.0.4472.124 Safari/537.36'
+    ),
+}
+
+
+def argumentos_chromium() -> list:
+    # La marca identifica al proceso dueño ante el vigilante de navegadores.
+    return ['--no-sandbox', '--disable-dev-shm-usage', marca_propietario()]
+
+
+def _lanzar_chromium(playwright: Playwright) -> Browser:
+    obtener_vigilante().iniciar()
+    return playwright.chromium.launch(headless=HEADLESS, args=argumentos_chromium())
 
+
+def _cerrar_sin_fallar(descripcion: str, cerrar) -> None:
+    # Un fallo al cerrar una parte no debe impedir cerrar las demás (si no,
+    # Chromium queda vivo) ni tapar el error original de la consulta.
     try:
-        playwright = sync_playwright().start()
-        browser = playwright.chromium.launch(
-            headless=HEADLESS,
-            args=['--no-sandbox', '--disable-dev-shm-usage'],
-        )
-        context = browser.new_context(
-            viewport={'width': 1280, 'height': 720},
-            user_agent=(
-                'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
-                'AppleWebKit/537.36 (KHTML, like Gecko) '
-                'Chrome/91.0.4472.124 Safari/537.36'
-            ),
-        )
-        page = context.new_page()
+        cerrar()
+    except Exception as e:
+        print(f"No se pudo cerrar {descripcion}: {e}")
+
 
-        print("Navegando a la página de login...")
-        page.goto(ICFES_LOGIN_URL, wait_until="networkidle")
-        time.sleep(2)
+class NavegadorCompartido:
+    """
+    Playwright y Chromium abiertos una sola vez por proceso (p. ej. un worker)
+    para que cada consulta solo cree y cierre su propio contexto. Si el
+    navegador se cae, se relanza en la siguiente consulta.
+    """
 
-        print("Llenando formulario...")
-        _fill_login_form(page, params)
+    def __init__(self):
+        self._playwright: Optional[Playwright] = None
+        self._browser: Optional[Browser] = None
 
-        print("Resolviendo CAPTCHA...")
-        _solve_captcha_with_anticaptcha(page)
+    def browser(self) -> Browser:
+        if self._browser is None or not self._browser.is_connected():
+            from playwright.sync_api import sync_playwright
 
-        print("Enviando formulario...")
-        _submit_form_and_wait_results(page)
+            if self._playwright is None:
+                self._playwright = sync_playwright().start()
+            self._browser = _lanzar_chromium(self._playwright)
+        return self._browser
 
-        real_html_path = SCREENSHOT_DIR / f"real_{params.numero_documento}_con_datos.html"
-        real_html_path.write_text(page.content(), encoding="utf-8")
-        print(f"HTML con datos guardado en: {real_html_path}")
+    def calentar(self) -> None:
+        self.browser()
 
-        if take_screenshot:
-            print("Tomando screenshot...")
-            screenshot_path = _take_results_screenshot(page, params.numero_documento)
+    def cerrar(self) -> None:
+        if self._browser is not None:
+            _cerrar_sin_fallar("el navegador", self._browser.close)
+            self._browser = None
+        if self._playwright is not None:
+            _cerrar_sin_fallar("Playwright", self._playwright.stop)
+            self._playwright = None
 
-        html = page.content()
-        print("✔ Proceso completado exitosamente")
-        return FetchResult(html=html, screenshot_path=screenshot_path)
+
+def fetch_results_page(
+    params: LoginParams,
+    take_screenshot: bool = False,
+    job_id: str | None = None,
+    timeout_s: float | None = None,
+    navegador: NavegadorCompartido | None = None,
+    deadline: Deadline | None = None,
+) -> FetchResult:
+    """
+    Ejecuta la consulta completa en el navegador. Todas las etapas comparten
+    un presupuesto de `timeout_s` segundos (CONSULTA_TIMEOUT_S por defecto);
+    si se agota, se lanza ConsultaTimeoutError con la etapa en curso. Con
+    `deadline` se usa un presupuesto ya iniciado, que el llamador sigue usando
+    después (p. ej. para el parseo). Con `navegador` se reutiliza un Chromium ya abierto en lugar de lanzar uno.
+    """
+    playwright = None
+    browser = None
+    context = None
+    page: Optional[Page] = None
+    traza = RegistroTraza(params.numero_documento, job_id=job_id)
+    deadline = deadline or Deadline(timeout_s or CONSULTA_TIMEOUT_S)
+    error: Optional[BaseException] = None
+
+    try:
+        with traza.etapa("lanzar_navegador"), deadline.etapa("lanzar_navegador"):
+            SCREENSHOT_DIR.mkdir(parents=True, exist_ok=True)
+            if navegador is not None:
+                browser_consulta = navegador.browser()
+            else:
+                from playwright.sync_api import sync_playwright
+
+                playwright = sync_playwright().start()
+                browser = browser_consulta = _lanzar_chromium(playwright)
+            context = browser_consulta.new_context(**OPCIONES_CONTEXTO)
+            page = context.new_page()
+            deadline.vincular(page)
+        traza.iniciar(context)
+
+        return _conducir(_consulta(page, params, take_screenshot, traza, deadline), deadline)
 
     except Exception as e:
+        error = e
         if take_screenshot and page is not None:
-            error_screenshot_path = SCREENSHOT_DIR / (
-                f"error_{params.numero_documento}_"
-                f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-            )
-            try:
-                page.screenshot(path=str(error_screenshot_path), full_page=True)
-                screenshot_path = error_screenshot_path
-            except Exception as ss_e:
-                print(f"No se pudo tomar screenshot de error: {ss_e}")
+            _conducir(_screenshot_de_error(page, params.numero_documento), deadline)
         print(f"Error durante la automatización: {e}")
         raise
 
     finally:
         if context is not None:
-            context.close()
+            _cerrar_sin_fallar("la traza", lambda: traza.finalizar(context, error))
+            _cerrar_sin_fallar("el contexto", context.close)
         if browser is not None:
-            browser.close()
+            _cerrar_sin_fallar("el navegador", browser.close)
         if playwright is not None:
-            playwright.stop()
\ No newline at end of file
+            _cerrar_sin_fallar("Playwright", playwright.stop)
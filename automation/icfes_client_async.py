@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
+import weakref
+from typing import TYPE_CHECKING, Optional
+
+from config import HEADLESS, SCREENSHOT_DIR, CONSULTA_TIMEOUT_S
+from automation.deadline import ConsultaTimeoutError, Deadline
+from automation.tracing import RegistroTraza
+from automation.watchdog import obtener_vigilante
+from automation.icfes_client import (
+    OPCIONES_CONTEXTO,
+    FetchResult,
+    LoginParams,
+    Pasos,
+    argumentos_chromium,
+    _Bloqueante,
+    _Pausa,
+    _consulta,
+    _screenshot_de_error,
+)
+
+if TYPE_CHECKING:
+    from playwright.async_api import Browser, Page, Playwright
+
+
+async def _conducir_async(pasos: Pasos, deadline: Deadline):
+    """
+    Ejecuta con playwright.async_api los mismos pasos que
+    icfes_client._conducir ejecuta con la API síncrona.
+    """
+    enviar, valor = pasos.send, None
+    while True:
+        try:
+            operacion = enviar(valor)
+        except StopIteration as fin:
+            return fin.value
+        try:
+            if isinstance(operacion, _Pausa):
+                valor = await deadline.sleep_async(operacion.segundos)
+            elif isinstance(operacion, _Bloqueante):
+                # El cliente de Anti-Captcha es bloqueante (requests + sleep):
+                # va a un hilo para no detener el event loop. wait_for corta la
+                # espera al agotarse el presupuesto; el hilo termina solo en su
+                # siguiente petición o sondeo, que también respetan el
+                # presupuesto.
+                try:
+                    valor = await asyncio.wait_for(
+                        asyncio.to_thread(operacion.funcion, *operacion.args),
+                        timeout=deadline.restante(),
+                    )
+                except asyncio.TimeoutError as e:
+                    raise ConsultaTimeoutError(deadline.etapa_actual, deadline.presupuesto_s) from e
+            elif inspect.isawaitable(operacion):
+                valor = await operacion
+            else:
+                valor = operacion
+            enviar = pasos.send
+        except Exception as e:
+            enviar, valor = pasos.throw, e
+
+
+async def _cerrar_sin_fallar_async(descripcion: str, cierre) -> None:
+    try:
+        await cierre
+    except Exception as e:
+        print(f"No se pudo cerrar {descripcion}: {e}")
+
+
+class NavegadorCompartidoAsync:
+    """
+    NavegadorCompartido para playwright.async_api: Playwright y Chromium se
+    abren una sola vez y todas las consultas del event loop crean y cierran
+    solo su contexto. Si el navegador se cae, se relanza en la siguiente
+    consulta.
+    """
+
+    def __init__(self):
+        self._playwright: Optional[Playwright] = None
+        self._browser: Optional[Browser] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def browser(self) -> Browser:
+        # El lock evita que dos consultas que arrancan a la vez lancen dos
+        # navegadores.
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._browser is None or not self._browser.is_connected():
+                from playwright.async_api import async_playwright
+
+                if self._playwright is None:
+                    self._playwright = await async_playwright().start()
+                obtener_vigilante().iniciar()
+                self._browser = await self._playwright.chromium.launch(
+                    headless=HEADLESS, args=argumentos_chromium()
+                )
+        return self._browser
+
+    async def cerrar(self) -> None:
+        if self._browser is not None:
+            await _cerrar_sin_fallar_async("el navegador", self._browser.close())
+            self._browser = None
+        if self._playwright is not None:
+            await _cerrar_sin_fallar_async("Playwright", self._playwright.stop())
+            self._playwright = None
+
+
+_navegadores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, NavegadorCompartidoAsync]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def navegador_del_loop() -> NavegadorCompartidoAsync:
+    """
+    El navegador compartido del event loop en curso (uno por loop: los objetos
+    de playwright.async_api no pueden usarse desde otro loop).
+    """
+    loop = asyncio.get_running_loop()
+    navegador = _navegadores.get(loop)
+    if navegador is None:
+        navegador = _navegadores[loop] = NavegadorCompartidoAsync()
+    return navegador
+
+
+async def fetch_results_page_async(
+    params: LoginParams,
+    take_screenshot: bool = False,
+    job_id: str | None = None,
+    timeout_s: float | None = None,
+    navegador: NavegadorCompartidoAsync | None = None,
+    deadline: Deadline | None = None,
+) -> FetchResult:
+    """
+    Versión asíncrona de fetch_results_page (playwright.async_api): varias
+    consultas pueden compartir un mismo event loop sin ocupar un hilo cada una.
+    Ejecuta los mismos pasos, con el mismo presupuesto (`timeout_s` o
+    `deadline`), sobre `navegador` o el navegador compartido del loop.
+    """
+    context = None
+    page: Optional[Page] = None
+    traza = RegistroTraza(params.numero_documento, job_id=job_id)
+    deadline = deadline or Deadline(timeout_s or CONSULTA_TIMEOUT_S)
+    error: Optional[BaseException] = None
+
+    try:
+        with traza.etapa("lanzar_navegador"), deadline.etapa("lanzar_navegador"):
+            SCREENSHOT_DIR.mkdir(parents=True, exist_ok=True)
+            browser = await (navegador or navegador_del_loop()).browser()
+            context = await browser.new_context(**OPCIONES_CONTEXTO)
+            page = await context.new_page()
+            deadline.vincular(page)
+        await traza.iniciar_async(context)
+
+        return await _conducir_async(_consulta(page, params, take_screenshot, traza, deadline), deadline)
+
+    except Exception as e:
+        error = e
+        if take_screenshot and page is not None:
+            await _conducir_async(_screenshot_de_error(page, params.numero_documento), deadline)
+        print(f"Error durante la automatización: {e}")
+        raise
+
+    finally:
+        if context is not None:
+            await _cerrar_sin_fallar_async("la traza", traza.finalizar_async(context, error))
+            await _cerrar_sin_fallar_async("el contexto", context.close())
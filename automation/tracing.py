@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import json
+import random
+import shutil
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+from config import (
+    TRACE_ENABLED,
+    TRACE_DIR,
+    TRACE_UMBRAL_LENTO_S,
+    TRACE_MUESTREO,
+    TRACE_MAX_ARCHIVOS,
+    TRACE_MAX_DIAS,
+)
+
+ARCHIVO_TRAZA = "trace.zip"
+ARCHIVO_META = "meta.json"
+
+
+class RegistroTraza:
+    """
+    Registra tiempos por etapa de una consulta y, si la consulta resulta lenta
+    o falla, guarda la traza de Playwright (red, DOM, capturas) en
+    TRACE_DIR/<job>/<consulta>/ junto a un meta.json con el resumen.
+    """
+
+    def __init__(self, numero_documento: str, job_id: str | None = None):
+        self.activo = TRACE_ENABLED
+        self.numero_documento = numero_documento
+        self.job_id = job_id or "manual"
+        self.etapas: List[Dict] = []
+        self.etapa_actual: Optional[str] = None
+        self._inicio = time.perf_counter()
+        self._fecha = datetime.now()
+
+    @contextmanager
+    def etapa(self, nombre: str) -> Iterator[None]:
+        inicio = time.perf_counter()
+        self.etapa_actual = nombre
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.etapas.append(
+                {
+                    "etapa": nombre,
+                    "inicio_s": round(inicio - self._inicio, 3),
+                    "duracion_s": round(time.perf_counter() - inicio, 3),
+                    "ok": ok,
+                }
+            )
+
+    def duracion(self) -> float:
+        return time.perf_counter() - self._inicio
+
+    def debe_guardar(self, error: BaseException | None) -> bool:
+        if not self.activo:
+            return False
+        if error is not None or self.duracion() >= TRACE_UMBRAL_LENTO_S:
+            return True
+        return TRACE_MUESTREO > 0 and random.random() < TRACE_MUESTREO
+
+    def directorio(self) -> Path:
+        nombre = f"{self._fecha.strftime('%Y%m%d_%H%M%S')}_{self.numero_documento}"
+        return TRACE_DIR / self.job_id / nombre
+
+    def iniciar(self, context) -> None:
+        if self.activo:
+            context.tracing.start(screenshots=True, snapshots=True)
+
+    def finalizar(self, context, error: BaseException | None) -> Optional[Path]:
+        if not self.activo:
+            return None
+        destino = None
+        try:
+            if self.debe_guardar(error):
+                destino = self.directorio()
+                destino.mkdir(parents=True, exist_ok=True)
+                context.tracing.stop(path=str(destino / ARCHIVO_TRAZA))
+                self._escribir_meta(destino, error)
+            else:
+                context.tracing.stop()
+        except Exception as e:
+            print(f"No se pudo guardar la traza: {e}")
+        return destino
+
+    async def iniciar_async(self, context) -> None:
+        if self.activo:
+            await context.tracing.start(screenshots=True, snapshots=True)
+
+    async def finalizar_async(self, context, error: BaseException | None) -> Optional[Path]:
+        if not self.activo:
+            return None
+        destino = None
+        try:
+            if self.debe_guardar(error):
+                destino = self.directorio()
+                destino.mkdir(parents=True, exist_ok=True)
+                await context.tracing.stop(path=str(destino / ARCHIVO_TRAZA))
+                self._escribir_meta(destino, error)
+            else:
+                await context.tracing.stop()
+        except Exception as e:
+            print(f"No se pudo guardar la traza: {e}")
+        return destino
+
+    def _escribir_meta(self, destino: Path, error: BaseException | None) -> None:
+        meta = {
+            "job_id": self.job_id,
+            "numero_documento": self.numero_documento,
+            "fecha": self._fecha.isoformat(timespec="seconds"),
+            "duracion_s": round(self.duracion(), 3),
+            "etapa_fallida": self.etapa_actual if error is not None else None,
+            "error": str(error) if error is not None else None,
+            "tipo_error": type(error).__name__ if error is not None else None,
+            "etapas": self.etapas,
+        }
+        (destino / ARCHIVO_META).write_text(
+            json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+        print(f"Traza guardada en: {destino}")
+        aplicar_retencion()
+
+
+def _directorios_traza() -> List[Path]:
+    if not TRACE_DIR.exists():
+        return []
+    return [p.parent for p in TRACE_DIR.glob(f"*/*/{ARCHIVO_META}")]
+
+
+def aplicar_retencion(
+    max_archivos: int = TRACE_MAX_ARCHIVOS,
+    max_dias: float = TRACE_MAX_DIAS,
+) -> int:
+    """
+    Borra las trazas más antiguas que `max_dias` y las que excedan `max_archivos`.
+    Devuelve cuántas se eliminaron.
+    """
+    directorios = sorted(_directorios_traza(), key=lambda p: p.stat().st_mtime, reverse=True)
+    limite = time.time() - max_dias * 86400
+    eliminadas = 0
+    for i, directorio in enumerate(directorios):
+        if i >= max_archivos or directorio.stat().st_mtime < limite:
+            shutil.rmtree(directorio, ignore_errors=True)
+            eliminadas += 1
+    for job_dir in TRACE_DIR.glob("*") if TRACE_DIR.exists() else []:
+        if job_dir.is_dir() and not any(job_dir.iterdir()):
+            job_dir.rmdir()
+    return eliminadas
+
+
+def listar_trazas(
+    job_id: str | None = None,
+    limite: int = 20,
+    visible: Callable[[str], bool] | None = None,
+) -> List[Dict]:
+    """
+    Devuelve las `limite` consultas trazadas más lentas (opcionalmente de un job).
+    `visible` filtra los jobs que puede ver quien pregunta.
+    """
+    trazas = []
+    for directorio in _directorios_traza():
+        if job_id and directorio.parent.name != job_id:
+            continue
+        if visible is not None and not visible(directorio.parent.name):
+            continue
+        try:
+            meta = json.loads((directorio / ARCHIVO_META).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        meta["ruta"] = f"{directorio.parent.name}/{directorio.name}"
+        meta["tiene_traza"] = (directorio / ARCHIVO_TRAZA).exists()
+        trazas.append(meta)
+    trazas.sort(key=lambda m: m.get("duracion_s") or 0, reverse=True)
+    return trazas[:limite]
+
+
+def listar_jobs_trazados(visible: Callable[[str], bool] | None = None) -> List[str]:
+    if not TRACE_DIR.exists():
+        return []
+    return sorted(
+        p.name for p in TRACE_DIR.iterdir()
+        if p.is_dir() and (visible is None or visible(p.name))
+    )
@@ -0,0 +1,294 @@
+from __future__ import annotations
+
+import os
+import signal
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from config import NAVEGADOR_MAX_CPU_PCT, NAVEGADOR_MAX_RSS_MB, VIGILANTE_INTERVALO_S
+
+PROC = Path("/proc")
+PREFIJO_MARCA = "--icfes-propietario="
+
+# Revisiones seguidas sobre el presupuesto antes de terminar un navegador: un
+# pico al cargar una página no basta.
+REVISIONES_PARA_TERMINAR = 2
+
+_TICKS_POR_S = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_BYTES_POR_PAGINA = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+@dataclass
+class _Proceso:
+    pid: int
+    ppid: int
+    inicio: int
+    ticks: int
+    rss: int
+    cmdline: List[str]
+
+
+def _leer_proceso(pid: int) -> Optional[_Proceso]:
+    try:
+        stat = (PROC / str(pid) / "stat").read_text()
+        cmdline = (PROC / str(pid) / "cmdline").read_bytes().split(b"\0")
+    except OSError:
+        return None
+    # El nombre (campo 2) va entre paréntesis y puede tener espacios; desde
+    # el campo 3 (estado) todo es numérico.
+    campos = stat[stat.rindex(")") + 2:].split()
+    return _Proceso(
+        pid=pid,
+        ppid=int(campos[1]),
+        inicio=int(campos[19]),
+        ticks=int(campos[11]) + int(campos[12]),
+        rss=int(campos[21]) * _BYTES_POR_PAGINA,
+        cmdline=[arg.decode(errors="replace") for arg in cmdline if arg],
+    )
+
+
+def _leer_procesos() -> Dict[int, _Proceso]:
+    procesos = {}
+    for entrada in PROC.iterdir():
+        if entrada.name.isdigit():
+            proceso = _leer_proceso(int(entrada.name))
+            if proceso is not None:
+                procesos[proceso.pid] = proceso
+    return procesos
+
+
+def marca_propietario() -> str:
+    """
+    Argumento que se agrega al lanzar Chromium para que el vigilante sepa qué
+    proceso lo lanzó (pid y momento de inicio, por si el pid se reutiliza).
+    Chromium ignora las opciones que no conoce.
+    """
+    pid = os.getpid()
+    proceso = _leer_proceso(pid) if PROC.is_dir() else None
+    return f"{PREFIJO_MARCA}{pid}-{proceso.inicio if proceso else 0}"
+
+
+def _leer_marca(cmdline: List[str]) -> Optional[Tuple[int, int]]:
+    for arg in cmdline:
+        if arg.startswith(PREFIJO_MARCA):
+            pid, _, inicio = arg[len(PREFIJO_MARCA):].partition("-")
+            try:
+                return int(pid), int(inicio)
+            except ValueError:
+                return None
+    return None
+
+
+def _arbol(pid: int, hijos: Dict[int, List[int]]) -> List[int]:
+    arbol = [pid]
+    for actual in arbol:
+        arbol.extend(hijos.get(actual, ()))
+    return arbol
+
+
+def _desciende_de(pid: int, ancestro: int, procesos: Dict[int, _Proceso]) -> bool:
+    while pid in procesos and pid > 1:
+        if pid == ancestro:
+            return True
+        pid = procesos[pid].ppid
+    return False
+
+
+def _terminar(arbol: List[int]) -> None:
+    for pid in arbol:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+
+class VigilanteNavegadores:
+    """
+    Revisa cada `intervalo_s` los Chromium lanzados por la app (los que llevan
+    marca_propietario() en su línea de comandos) y termina con SIGKILL, junto
+    con sus procesos hijos:
+    - los huérfanos, cuyo proceso dueño ya no existe (p. ej. un worker que
+      murió sin llegar a playwright.stop());
+    - los de este proceso o sus hijos que pasen REVISIONES_PARA_TERMINAR
+      revisiones seguidas sobre `max_rss_mb` o `max_cpu_pct`.
+    Un NavegadorCompartido terminado se relanza en la siguiente consulta.
+    Lee /proc, así que solo funciona en Linux.
+    """
+
+    def __init__(
+        self,
+        max_rss_mb: float = NAVEGADOR_MAX_RSS_MB,
+        max_cpu_pct: float = NAVEGADOR_MAX_CPU_PCT,
+        intervalo_s: float = VIGILANTE_INTERVALO_S,
+    ):
+        self.max_rss_mb = max_rss_mb
+        self.max_cpu_pct = max_cpu_pct
+        self.intervalo_s = intervalo_s
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        # Por navegador (pid, inicio): ticks de CPU y momento de la revisión
+        # anterior, y revisiones seguidas sobre el presupuesto.
+        self._muestras: Dict[Tuple[int, int], Tuple[int, float]] = {}
+        self._excesos: Dict[Tuple[int, int], int] = {}
+        self._terminados = {"huerfano": 0, "memoria": 0, "cpu": 0}
+        self._ultima: Optional[Dict] = None
+
+    @staticmethod
+    def disponible() -> bool:
+        return PROC.is_dir()
+
+    def _motivo_exceso(self, rss_mb: float, cpu_pct: Optional[float]) -> Optional[str]:
+        if self.max_rss_mb > 0 and rss_mb > self.max_rss_mb:
+            return "memoria"
+        if self.max_cpu_pct > 0 and cpu_pct is not None and cpu_pct > self.max_cpu_pct:
+            return "cpu"
+        return None
+
+    def revisar(self, terminar: bool = True) -> Dict:
+        """
+        Hace una revisión y devuelve lo encontrado. Con `terminar=False` solo
+        inspecciona.
+        """
+        if not self.disponible():
+            return {"disponible": False}
+
+        procesos = _leer_procesos()
+        hijos: Dict[int, List[int]] = defaultdict(list)
+        for proceso in procesos.values():
+            hijos[proceso.ppid].append(proceso.pid)
+        marcas = {pid: marca for pid, p in procesos.items() if (marca := _leer_marca(p.cmdline))}
+        # Solo el proceso principal de Chromium cuenta como navegador; sus
+        # hijos (renderers, GPU) se suman a él.
+        raices = [pid for pid in marcas if procesos[pid].ppid not in marcas]
+
+        ahora = time.monotonic()
+        propio = os.getpid()
+        navegadores = []
+        with self._lock:
+            muestras, excesos = {}, {}
+            for pid in raices:
+                dueno, inicio_dueno = marcas[pid]
+                arbol = [p for p in _arbol(pid, hijos) if p in procesos]
+                rss_mb = sum(procesos[p].rss for p in arbol) / 2**20
+                ticks = sum(procesos[p].ticks for p in arbol)
+                clave = (pid, procesos[pid].inicio)
+
+                cpu_pct = None
+                anterior = self._muestras.get(clave)
+                if anterior is not None and ahora > anterior[1]:
+                    cpu_pct = (ticks - anterior[0]) / _TICKS_POR_S / (ahora - anterior[1]) * 100
+                muestras[clave] = (ticks, ahora)
+
+                huerfano = dueno not in procesos or procesos[dueno].inicio != inicio_dueno
+                es_propio = not huerfano and _desciende_de(dueno, propio, procesos)
+                motivo = "huerfano" if huerfano else None
+                if es_propio:
+                    exceso = self._motivo_exceso(rss_mb, cpu_pct)
+                    excesos[clave] = self._excesos.get(clave, 0) + 1 if exceso else 0
+                    if excesos[clave] >= REVISIONES_PARA_TERMINAR:
+                        motivo = exceso
+
+                terminado = bool(motivo) and terminar
+                if terminado:
+                    _terminar(arbol)
+                    self._terminados[motivo] += 1
+                    muestras.pop(clave)
+                    excesos.pop(clave, None)
+                    print(
+                        f"Vigilante: navegador {pid} terminado ({motivo}, "
+                        f"{rss_mb:.0f} MB, dueño {dueno})"
+                    )
+
+                navegadores.append(
+                    {
+                        "pid": pid,
+                        "propietario": dueno,
+                        "propio": es_propio,
+                        "huerfano": huerfano,
+                        "procesos": len(arbol),
+                        "rss_mb": round(rss_mb, 1),
+                        "cpu_pct": None if cpu_pct is None else round(cpu_pct, 1),
+                        "terminado": motivo if terminado else None,
+                    }
+                )
+            self._muestras, self._excesos = muestras, excesos
+
+            vivos = [n for n in navegadores if not n["terminado"]]
+            self._ultima = {
+                "disponible": True,
+                "revisado": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "navegadores": len(vivos),
+                "propios": sum(n["propio"] for n in vivos),
+                "huerfanos": sum(n["huerfano"] for n in vivos),
+                "rss_total_mb": round(sum(n["rss_mb"] for n in vivos), 1),
+                "detalle": navegadores,
+            }
+            return self._ultima
+
+    def estado(self) -> Dict:
+        """
+        Última revisión (o una inspección nueva si aún no hubo ninguna), los
+        navegadores terminados por motivo y los límites vigentes.
+        """
+        with self._lock:
+            ultima = self._ultima
+        if ultima is None:
+            ultima = self.revisar(terminar=False)
+        with self._lock:
+            return {
+                **ultima,
+                "activo": self._hilo is not None and self._hilo.is_alive(),
+                "terminados": dict(self._terminados),
+                "max_rss_mb": self.max_rss_mb,
+                "max_cpu_pct": self.max_cpu_pct,
+                "intervalo_s": self.intervalo_s,
+            }
+
+    def iniciar(self) -> None:
+        """
+        Arranca la revisión periódica en un hilo de fondo (una sola vez).
+        """
+        with self._lock:
+            if self._hilo is not None and self._hilo.is_alive():
+                return
+            if not self.disponible():
+                print("Vigilante de navegadores desactivado: requiere /proc (Linux).")
+                return
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._bucle, name="vigilante-navegadores", daemon=True)
+            self._hilo.start()
+
+    def detener(self) -> None:
+        self._detener.set()
+
+    def _bucle(self) -> None:
+        # La primera revisión es inmediata: limpia los huérfanos que dejó una
+        # ejecución anterior.
+        while True:
+            try:
+                self.revisar()
+            except Exception as e:
+                print(f"Error en el vigilante de navegadores: {e}")
+            if self._detener.wait(self.intervalo_s):
+                return
+
+
+_vigilante: Optional[VigilanteNavegadores] = None
+_vigilante_lock = threading.Lock()
+
+
+def obtener_vigilante() -> VigilanteNavegadores:
+    """
+    Vigilante compartido por todo el proceso. Se inicia al lanzar el primer
+    navegador.
+    """
+    global _vigilante
+    with _vigilante_lock:
+        if _vigilante is None:
+            _vigilante = VigilanteNavegadores()
+    return _vigilante
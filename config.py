@@ -11,12 +11,70 @@ ICFES_LOGIN_URL = "https://resultadossaber11.icfes.gov.co/login"
 
 HEADLESS = False
 
-DATA_DIR = BASE_DIR / "data"
+# Presupuesto total por consulta (formulario + CAPTCHA + envío + parsing).
+CONSULTA_TIMEOUT_S = float(os.getenv("CONSULTA_TIMEOUT_S", "180"))
+MAX_INTENTOS_DESAFIO = 5
+
+# Cola compartida para el modo multi-worker: ruta SQLite o redis://host:puerto/db.
+JOB_QUEUE_URL = os.getenv("JOB_QUEUE_URL", "")
+# El coordinador deja de esperar un trabajo de la cola si pasa más de
+# COLA_TIMEOUT_TRABAJO_S en total, o COLA_SIN_PROGRESO_S sin filas terminadas
+# ni en curso (p. ej. no hay workers); las filas restantes quedan con error.
+COLA_TIMEOUT_TRABAJO_S = float(os.getenv("COLA_TIMEOUT_TRABAJO_S", str(6 * 3600)))
+COLA_SIN_PROGRESO_S = float(os.getenv("COLA_SIN_PROGRESO_S", "600"))
+# Los trabajos se borran de la cola al entregarse sus resultados; los que
+# queden (p. ej. si la app se reinició mientras esperaba) se purgan pasadas
+# estas horas. Debe ser mayor que COLA_TIMEOUT_TRABAJO_S.
+COLA_RETENCION_HORAS = float(os.getenv("COLA_RETENCION_HORAS", "24"))
+
+# Navegadores simultáneos en el proceso de la app (consultas manuales y lotes).
+MAX_CONSULTAS_CONCURRENTES = int(os.getenv("MAX_CONSULTAS_CONCURRENTES", "4"))
+
+# Planificador de consultas (services.scheduler): cupos que los lotes no pueden
+# ocupar, tamaño máximo de un "lote pequeño" y objetivo de p95 interactivo.
+SLOTS_RESERVADOS_INTERACTIVOS = int(os.getenv("SLOTS_RESERVADOS_INTERACTIVOS", "1"))
+UMBRAL_LOTE_PEQUENO = int(os.getenv("UMBRAL_LOTE_PEQUENO", "25"))
+P95_OBJETIVO_INTERACTIVO_S = float(os.getenv("P95_OBJETIVO_INTERACTIVO_S", "90"))
+
+# Vigilante de navegadores (automation.watchdog): cada cuántos segundos revisa
+# los Chromium lanzados y el presupuesto de cada uno (0 desactiva el límite).
+VIGILANTE_INTERVALO_S = float(os.getenv("VIGILANTE_INTERVALO_S", "30"))
+NAVEGADOR_MAX_RSS_MB = float(os.getenv("NAVEGADOR_MAX_RSS_MB", "1500"))
+NAVEGADOR_MAX_CPU_PCT = float(os.getenv("NAVEGADOR_MAX_CPU_PCT", "200"))
+
+# Datos de la app (uploads, trabajos, trazas, cola SQLite).
+DATA_DIR = Path(os.getenv("ICFES_DATA_DIR", str(BASE_DIR / "data")))
 EXPORT_DIR = BASE_DIR / "exports"
 SCREENSHOT_DIR = BASE_DIR / "screenshots"
 
-for d in (DATA_DIR, EXPORT_DIR, SCREENSHOT_DIR):
-    d.mkdir(parents=True, exist_ok=True)
+# Uploads guardados por contenido (SHA-256) y un directorio por trabajo.
+UPLOAD_DIR = DATA_DIR / "uploads"
+JOBS_DIR = DATA_DIR / "jobs"
+# Estado de las consultas manuales, visible desde cualquier proceso de la app.
+CONSULTAS_DIR = DATA_DIR / "consultas"
+UPLOAD_RETENCION_DIAS = float(os.getenv("UPLOAD_RETENCION_DIAS", "30"))
+
+# Actualización incremental: una fila completa consultada hace más de estas
+# horas se vuelve a consultar.
+REFRESCO_MAX_EDAD_HORAS = float(os.getenv("REFRESCO_MAX_EDAD_HORAS", "24"))
+
+# Trazas de Playwright para consultas lentas o fallidas (desactivado por defecto).
+TRACE_ENABLED = os.getenv("ICFES_TRACE", "0") == "1"
+TRACE_DIR = DATA_DIR / "trazas"
+TRACE_UMBRAL_LENTO_S = float(os.getenv("ICFES_TRACE_UMBRAL_S", "60"))
+TRACE_MUESTREO = float(os.getenv("ICFES_TRACE_MUESTREO", "0"))
+TRACE_MAX_ARCHIVOS = int(os.getenv("ICFES_TRACE_MAX_ARCHIVOS", "200"))
+TRACE_MAX_DIAS = float(os.getenv("ICFES_TRACE_MAX_DIAS", "7"))
+
+
+
+def asegurar_directorios() -> None:
+    """
+    Crea las carpetas de trabajo. Lo llaman los puntos de entrada (app y
+    worker), no la importación de este módulo.
+    """
+    for d in (DATA_DIR, EXPORT_DIR, SCREENSHOT_DIR, UPLOAD_DIR, JOBS_DIR, CONSULTAS_DIR):
+        d.mkdir(parents=True, exist_ok=True)
 
 
 class Config:
@@ -24,8 +82,26 @@ class Config:
     ANTI_CAPTCHA_KEY = ANTI_CAPTCHA_KEY
     ICFES_LOGIN_URL = ICFES_LOGIN_URL
     HEADLESS = HEADLESS
+    CONSULTA_TIMEOUT_S = CONSULTA_TIMEOUT_S
+    JOB_QUEUE_URL = JOB_QUEUE_URL
+    COLA_TIMEOUT_TRABAJO_S = COLA_TIMEOUT_TRABAJO_S
+    COLA_SIN_PROGRESO_S = COLA_SIN_PROGRESO_S
+    COLA_RETENCION_HORAS = COLA_RETENCION_HORAS
+    MAX_CONSULTAS_CONCURRENTES = MAX_CONSULTAS_CONCURRENTES
+    SLOTS_RESERVADOS_INTERACTIVOS = SLOTS_RESERVADOS_INTERACTIVOS
+    UMBRAL_LOTE_PEQUENO = UMBRAL_LOTE_PEQUENO
+    P95_OBJETIVO_INTERACTIVO_S = P95_OBJETIVO_INTERACTIVO_S
+    VIGILANTE_INTERVALO_S = VIGILANTE_INTERVALO_S
+    NAVEGADOR_MAX_RSS_MB = NAVEGADOR_MAX_RSS_MB
+    NAVEGADOR_MAX_CPU_PCT = NAVEGADOR_MAX_CPU_PCT
 
     BASE_DIR = BASE_DIR
     DATA_DIR = DATA_DIR
     EXPORT_DIR = EXPORT_DIR
-    SCREENSHOT_DIR = SCREENSHOT_DIR
\ No newline at end of file
+    SCREENSHOT_DIR = SCREENSHOT_DIR
+    UPLOAD_DIR = UPLOAD_DIR
+    JOBS_DIR = JOBS_DIR
+    CONSULTAS_DIR = CONSULTAS_DIR
+    REFRESCO_MAX_EDAD_HORAS = REFRESCO_MAX_EDAD_HORAS
+    TRACE_ENABLED = TRACE_ENABLED
+    TRACE_DIR = TRACE_DIR
\ No newline at end of file
@@ -1,3 +1,18 @@
-from .icfes_parser import parse_all
+# parse_all se carga al primer acceso: scraping.registro (el esquema de las
+# filas) se puede importar sin arrastrar BeautifulSoup.
+_EXPORTS = {
+    'parse_all': '.icfes_parser',
+    'RegistroResultado': '.registro',
+}
 
-__all__ = ['parse_all']
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+
+    valor = getattr(import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = valor
+    return valor
@@ -1,6 +1,8 @@
 from bs4 import BeautifulSoup
 import re
 
+from scraping.registro import AREAS_RESULTADO, CAMPOS_PARSEO
+
 
 def _safe_text(element):
     return element.get_text(strip=True) if element else None
@@ -47,15 +49,7 @@ def parse_icfes_results(html: str, percentiles_area: dict | None = None) -> dict
 
     data["percentil_general"] = percentil_general
 
-    areas = {
-        "lectura_critica": "Lectura Crítica",
-        "matematicas": "Matemáticas",
-        "sociales": "Sociales y Ciudadanas",
-        "ciencias_naturales": "Ciencias Naturales",
-        "ingles": "Inglés",
-    }
-
-    for key, label in areas.items():
+    for key, label in AREAS_RESULTADO.items():
 
         puntaje_area = None
         tab = soup.find("span", class_="title-tab",
@@ -85,13 +79,14 @@ def parse_icfes_results(html: str, percentiles_area: dict | None = None) -> dict
 
 
 def parse_all(html: str, percentiles_area: dict | None = None) -> dict:
+    """
+    Devuelve siempre los campos de CAMPOS_PARSEO (ver scraping.registro); si el
+    parsing falla quedan en None y se agrega `error_parsing`.
+    """
     try:
         return parse_icfes_results(html, percentiles_area)
     except Exception as e:
         print(f"Error en parsing: {e}")
-        return {
-            "nombre_estudiante": None,
-            "puntaje_general": None,
-            "percentil_general": None,
-            "error_parsing": str(e),
-        }
+        datos = dict.fromkeys(CAMPOS_PARSEO)
+        datos["error_parsing"] = str(e)
+        return datos
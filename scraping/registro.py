@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, fields
+from typing import Dict, Optional
+
+AREAS_RESULTADO = {
+    "lectura_critica": "Lectura Crítica",
+    "matematicas": "Matemáticas",
+    "sociales": "Sociales y Ciudadanas",
+    "ciencias_naturales": "Ciencias Naturales",
+    "ingles": "Inglés",
+}
+
+
+@dataclass(slots=True)
+class RegistroResultado:
+    """
+    Esquema fijo de una fila de resultados: los datos de entrada, lo que
+    extrae el parser y el error, si lo hubo. Las filas exitosas, las fallidas
+    y las incompletas tienen los mismos campos (los que no aplican quedan en
+    None), de modo que todas se exportan con las mismas columnas y tipos.
+    """
+
+    tipo_documento: str = ""
+    numero_documento: str = ""
+    fecha_nacimiento: str = ""
+    numero_registro: str = ""
+    screenshot_path: Optional[str] = None
+    error: Optional[str] = None
+    nombre_estudiante: Optional[str] = None
+    puntaje_general: Optional[int] = None
+    percentil_general: Optional[int] = None
+    puntaje_lectura_critica: Optional[int] = None
+    percentil_lectura_critica: Optional[int] = None
+    puntaje_matematicas: Optional[int] = None
+    percentil_matematicas: Optional[int] = None
+    puntaje_sociales: Optional[int] = None
+    percentil_sociales: Optional[int] = None
+    puntaje_ciencias_naturales: Optional[int] = None
+    percentil_ciencias_naturales: Optional[int] = None
+    puntaje_ingles: Optional[int] = None
+    percentil_ingles: Optional[int] = None
+    error_parsing: Optional[str] = None
+    # Momento (ISO 8601) en que se consultó el portal para esta fila.
+    consultado: Optional[str] = None
+
+    def a_dict(self) -> Dict:
+        return {campo: getattr(self, campo) for campo in COLUMNAS}
+
+    @classmethod
+    def desde_dict(cls, datos: Dict) -> "RegistroResultado":
+        """
+        Construye el registro ignorando las claves que no son parte del esquema.
+        """
+        registro = cls()
+        for campo in COLUMNAS:
+            valor = datos.get(campo)
+            if valor is not None:
+                setattr(registro, campo, valor)
+        return registro
+
+
+# Orden de las columnas al exportar.
+COLUMNAS = tuple(f.name for f in fields(RegistroResultado))
+CAMPOS_NUMERICOS = tuple(c for c in COLUMNAS if c.startswith(("puntaje_", "percentil_")))
+CAMPOS_TEXTO = tuple(c for c in COLUMNAS if c not in CAMPOS_NUMERICOS)
+
+# Campos que produce scraping.icfes_parser.parse_all.
+CAMPOS_PARSEO = ("nombre_estudiante",) + CAMPOS_NUMERICOS
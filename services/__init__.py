@@ -1,13 +1,21 @@
-from .results_service import (
-    consultar_un_estudiante,
-    consultar_desde_excel,
-    consultar_y_exportar_desde_excel,
-    exportar_resultados,
-)
-
-__all__ = [
-    'consultar_un_estudiante',
-    'consultar_desde_excel',
-    'consultar_y_exportar_desde_excel',
-    'exportar_resultados',
-]
\ No newline at end of file
+# Las funciones se cargan al primer acceso: importar el paquete (o uno de sus
+# módulos livianos) no arrastra pandas, Playwright ni BeautifulSoup.
+_EXPORTS = {
+    'consultar_un_estudiante': '.results_service',
+    'consultar_desde_excel': '.results_service',
+    'consultar_y_exportar_desde_excel': '.results_service',
+    'exportar_resultados': '.results_service',
+    'calcular_estadisticas': '.stats_service',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+
+    valor = getattr(import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = valor
+    return valor
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import Dict, Optional
+
+from automation.deadline import ConsultaTimeoutError, Deadline
+from automation.icfes_client import LoginParams
+from scraping.registro import RegistroResultado
+from services import job_store
+from services.scheduler import PRIORIDAD_INTERACTIVA, obtener_planificador
+
+# Tiempo que se conservan las consultas terminadas para que el navegador las recoja.
+TTL_CONSULTAS_SEGUNDOS = 3600
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _obtener_loop() -> asyncio.AbstractEventLoop:
+    """
+    Arranca (una sola vez) el event loop compartido en un hilo de fondo.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            hilo = threading.Thread(target=loop.run_forever, name="icfes-async", daemon=True)
+            hilo.start()
+            _loop = loop
+    return _loop
+
+
+async def consultar_un_estudiante_async(
+    tipo_documento: str,
+    numero_documento: str,
+    fecha_nacimiento: str = "",
+    numero_registro: str = "",
+    take_screenshot: bool = False,
+) -> Dict:
+    """
+    Equivalente asíncrono de consultar_un_estudiante.
+    """
+    # Importación diferida: pandas y Playwright solo se cargan con la primera
+    # consulta, no al arrancar la app.
+    from automation.icfes_client_async import fetch_results_page_async
+    from config import CONSULTA_TIMEOUT_S
+    from services.results_service import _armar_resultado, _resultado_con_error
+
+    params = LoginParams(
+        tipo_documento=tipo_documento,
+        numero_documento=numero_documento,
+        fecha_nacimiento=fecha_nacimiento,
+        numero_registro=numero_registro,
+    )
+
+    try:
+        print(f"Consultando (async): {tipo_documento} {numero_documento}")
+        # Un solo presupuesto para el navegador y el parseo.
+        deadline = Deadline(CONSULTA_TIMEOUT_S)
+        fetch_result = await fetch_results_page_async(params, take_screenshot=take_screenshot, deadline=deadline)
+        # El parseo (BeautifulSoup) bloquea la CPU: va en un hilo para no
+        # detener las demás consultas del loop, y no se espera más allá del
+        # presupuesto.
+        try:
+            registro = await asyncio.wait_for(
+                asyncio.to_thread(_armar_resultado, params, fetch_result, deadline),
+                timeout=deadline.restante(),
+            )
+        except asyncio.TimeoutError as e:
+            raise ConsultaTimeoutError("parseo", deadline.presupuesto_s) from e
+        return registro.a_dict()
+
+    except Exception as e:
+        return _resultado_con_error(params, e).a_dict()
+
+
+def _resultado_fallido(kwargs: Dict, error: BaseException) -> Dict:
+    # No depende de results_service: sirve aunque sea su importación la que falló.
+    registro = RegistroResultado.desde_dict(kwargs)
+    registro.error = str(error) or type(error).__name__
+    return registro.a_dict()
+
+
+async def _ejecutar_consulta(consulta_id: str, tenant: str, kwargs: Dict) -> None:
+    # El planificador limita cuántos navegadores hay abiertos a la vez y da
+    # prioridad a estas consultas sobre los lotes; mientras tanto se espera
+    # sin ocupar hilos.
+    try:
+        async with obtener_planificador().turno_async(PRIORIDAD_INTERACTIVA, tenant):
+            _actualizar(consulta_id, estado="en_curso")
+            resultado = await consultar_un_estudiante_async(**kwargs)
+    except Exception as e:
+        print(f"Error en la consulta {consulta_id}: {e}")
+        resultado = _resultado_fallido(kwargs, e)
+    _completar(consulta_id, resultado)
+
+
+def _completar(consulta_id: str, resultado: Dict) -> None:
+    _actualizar(consulta_id, estado="completada", resultado=resultado, terminada=time.time())
+
+
+def _al_terminar(consulta_id: str, kwargs: Dict, futuro) -> None:
+    # Red de seguridad: si la corrutina se cancela o algo escapa de
+    # _ejecutar_consulta, la consulta igual termina (con error) y la página de
+    # espera deja de consultar.
+    if futuro.cancelled():
+        error: Optional[BaseException] = RuntimeError("La consulta fue cancelada")
+    else:
+        error = futuro.exception()
+    if error is not None:
+        _completar(consulta_id, _resultado_fallido(kwargs, error))
+
+
+def _actualizar(consulta_id: str, **cambios) -> None:
+    job_store.actualizar_consulta(consulta_id, **cambios)
+
+
+def iniciar_consulta(tenant: str = "", **kwargs) -> str:
+    """
+    Programa una consulta en el loop de fondo y devuelve su id sin esperar.
+    Recibe los mismos argumentos que consultar_un_estudiante; `tenant`
+    identifica a quién se le reparte el cupo (ver services.scheduler).
+    """
+    job_store.purgar_consultas(time.time() - TTL_CONSULTAS_SEGUNDOS)
+    consulta_id = job_store.crear_consulta()["id"]
+    futuro = asyncio.run_coroutine_threadsafe(
+        _ejecutar_consulta(consulta_id, tenant, kwargs), _obtener_loop()
+    )
+    futuro.add_done_callback(lambda f: _al_terminar(consulta_id, kwargs, f))
+    return consulta_id
+
+
+def obtener_consulta(consulta_id: str) -> Optional[Dict]:
+    """
+    Estado de la consulta, aunque la haya iniciado otro proceso de la app.
+    """
+    return job_store.cargar_consulta(consulta_id)
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import gzip
+import os
+import shutil
+import tempfile
+import zipfile
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Optional
+
+from services.job_store import (
+    ARCHIVO_DELTA,
+    ARCHIVO_RESULTADOS,
+    cargar_delta,
+    cargar_resultados,
+    directorio_job,
+)
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# "delta" es el CSV de cambios de una actualización incremental.
+FORMATOS = ("csv", "xlsx", "json", "zip", "delta")
+# Solo vale la pena comprimir en tránsito los formatos de texto; xlsx y zip ya
+# vienen comprimidos.
+FORMATOS_COMPRIMIBLES = ("csv", "json", "delta")
+
+CARPETA_EXPORTS = "exports"
+
+
+def nombre_descarga(job_id: str, formato: str) -> str:
+    if formato == "delta":
+        return f"delta_{job_id}.csv"
+    return f"resultados_{job_id}.{formato}"
+
+
+def ruta_exportacion(job_id: str, formato: str, comprimido: bool = False) -> Path:
+    nombre = nombre_descarga(job_id, formato)
+    if comprimido:
+        nombre += ".gz"
+    return directorio_job(job_id) / CARPETA_EXPORTS / nombre
+
+
+def _vigente(path: Path, origen: Path) -> bool:
+    return path.exists() and path.stat().st_mtime >= origen.stat().st_mtime
+
+
+def _escribir_atomico(path: Path, escribir: Callable[[Path], None]) -> None:
+    # Se escribe en un temporal del mismo directorio y se renombra: una
+    # descarga concurrente nunca ve un archivo a medias.
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), suffix=".part")
+    os.close(fd)
+    try:
+        escribir(Path(tmp))
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def _escribir_zip(job_id: str, df: pd.DataFrame, path: Path) -> None:
+    """
+    Paquete con los resultados en los tres formatos y las capturas de pantalla
+    que sigan en disco.
+    """
+    with zipfile.ZipFile(path, "w") as zf:
+        for formato in ("csv", "json"):
+            zf.write(
+                obtener_exportacion(job_id, formato),
+                f"resultados.{formato}",
+                compress_type=zipfile.ZIP_DEFLATED,
+            )
+        zf.write(obtener_exportacion(job_id, "xlsx"), "resultados.xlsx", compress_type=zipfile.ZIP_STORED)
+
+        if "screenshot_path" not in df.columns:
+            return
+        for valor in df["screenshot_path"].dropna().unique():
+            screenshot = Path(str(valor))
+            if screenshot.is_file():
+                zf.write(screenshot, f"screenshots/{screenshot.name}", compress_type=zipfile.ZIP_STORED)
+
+
+def _escribir_gzip(origen: Path, path: Path) -> None:
+    with open(origen, "rb") as f_in, gzip.open(path, "wb", compresslevel=6) as f_out:
+        shutil.copyfileobj(f_in, f_out)
+
+
+def obtener_exportacion(job_id: str, formato: str, comprimido: bool = False) -> Optional[Path]:
+    """
+    Devuelve el archivo del trabajo en el formato pedido, generándolo a partir
+    de sus filas guardadas solo la primera vez (o si los resultados cambiaron).
+    Con `comprimido=True` devuelve la versión .gz de un formato de texto.
+    Devuelve None si el trabajo no tiene resultados (o no tiene delta, para
+    el formato "delta").
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato}")
+    if comprimido and formato not in FORMATOS_COMPRIMIBLES:
+        raise ValueError(f"El formato {formato} no se sirve comprimido")
+
+    origen = directorio_job(job_id) / (ARCHIVO_DELTA if formato == "delta" else ARCHIVO_RESULTADOS)
+    if not origen.exists():
+        return None
+
+    path = ruta_exportacion(job_id, formato, comprimido)
+    if _vigente(path, origen):
+        return path
+
+    if comprimido:
+        base = obtener_exportacion(job_id, formato)
+        _escribir_atomico(path, lambda tmp: _escribir_gzip(base, tmp))
+        return path
+
+    from services.results_service import escribir_csv, escribir_json, escribir_xlsx
+
+    df = cargar_delta(job_id) if formato == "delta" else cargar_resultados(job_id)
+    print(f"Generando {formato.upper()} del trabajo {job_id}")
+    if formato in ("csv", "delta"):
+        _escribir_atomico(path, lambda tmp: escribir_csv(df, tmp))
+    elif formato == "xlsx":
+        _escribir_atomico(path, lambda tmp: escribir_xlsx(df, tmp))
+    elif formato == "json":
+        _escribir_atomico(path, lambda tmp: escribir_json(df, tmp))
+    else:
+        _escribir_atomico(path, lambda tmp: _escribir_zip(job_id, df, tmp))
+    return path
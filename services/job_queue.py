@@ -0,0 +1,627 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from config import COLA_RETENCION_HORAS, DATA_DIR, JOB_QUEUE_URL
+from services.scheduler import NOMBRES_PRIORIDAD, PRIORIDAD_MASIVA
+
+LEASE_SEGUNDOS = 120
+MAX_INTENTOS = 3
+
+ESTADO_PENDIENTE = "pendiente"
+ESTADO_EN_CURSO = "en_curso"
+ESTADO_COMPLETADA = "completada"
+
+
+@dataclass
+class Tarea:
+    job_id: str
+    indice: int
+    payload: Dict
+    intentos: int = 0
+
+
+MENSAJE_AGOTADA = "Tarea abandonada tras {intentos} intentos (worker caído o sin latido)"
+
+
+def _resultado_fallido(tarea_payload: Dict, error: str) -> Dict:
+    resultado = dict(tarea_payload)
+    resultado.update({"screenshot_path": None, "error": error})
+    return resultado
+
+
+def _resultado_agotado(tarea_payload: Dict, intentos: int) -> Dict:
+    return _resultado_fallido(tarea_payload, MENSAJE_AGOTADA.format(intentos=intentos))
+
+
+class SQLiteJobQueue:
+    """
+    Cola compartida sobre un archivo SQLite. Sirve para varios procesos en la
+    misma máquina (o en un sistema de archivos compartido con bloqueo).
+    """
+
+    def __init__(self, path: str | Path, max_intentos: int = MAX_INTENTOS):
+        self.path = Path(path)
+        self.max_intentos = max_intentos
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._conexion() as conn:
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS trabajos (
+                    id TEXT PRIMARY KEY,
+                    creado REAL NOT NULL,
+                    total INTEGER NOT NULL,
+                    opciones TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS tareas (
+                    job_id TEXT NOT NULL,
+                    indice INTEGER NOT NULL,
+                    payload TEXT NOT NULL,
+                    estado TEXT NOT NULL,
+                    worker TEXT,
+                    lease_hasta REAL,
+                    intentos INTEGER NOT NULL DEFAULT 0,
+                    resultado TEXT,
+                    PRIMARY KEY (job_id, indice)
+                );
+                CREATE INDEX IF NOT EXISTS idx_tareas_estado ON tareas (estado, lease_hasta);
+                """
+            )
+            self._migrar(conn)
+
+    @staticmethod
+    def _migrar(conn: sqlite3.Connection) -> None:
+        # Colas creadas antes de las prioridades: se agregan las columnas.
+        columnas = {row[1] for row in conn.execute("PRAGMA table_info(tareas)")}
+        if "prioridad" not in columnas:
+            conn.execute(
+                f"ALTER TABLE tareas ADD COLUMN prioridad INTEGER NOT NULL DEFAULT {PRIORIDAD_MASIVA}"
+            )
+        if "tenant" not in columnas:
+            conn.execute("ALTER TABLE tareas ADD COLUMN tenant TEXT NOT NULL DEFAULT ''")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_tareas_prioridad ON tareas (estado, prioridad, tenant)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS turnos_tenant (tenant TEXT PRIMARY KEY, ultimo REAL NOT NULL)"
+        )
+
+    @contextmanager
+    def _conexion(self) -> Iterator[sqlite3.Connection]:
+        # Una conexión por operación: el objeto puede compartirse entre hilos.
+        conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            yield conn
+        finally:
+            conn.close()
+
+    def crear_trabajo(
+        self,
+        filas: List[Dict],
+        opciones: Dict | None = None,
+        completadas: Dict[int, Dict] | None = None,
+        prioridad: int = PRIORIDAD_MASIVA,
+        tenant: str = "",
+    ) -> str:
+        """
+        Registra un trabajo con sus filas. Las filas en `completadas` (por índice)
+        se guardan ya resueltas y no se reparten a los workers. `prioridad` y
+        `tenant` deciden el orden de reparto (ver services.scheduler).
+        """
+        job_id = uuid.uuid4().hex
+        completadas = completadas or {}
+        with self._conexion() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO trabajos (id, creado, total, opciones) VALUES (?, ?, ?, ?)",
+                (job_id, time.time(), len(filas), json.dumps(opciones or {})),
+            )
+            conn.executemany(
+                "INSERT INTO tareas (job_id, indice, payload, estado, resultado, prioridad, tenant) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        job_id,
+                        i,
+                        json.dumps(fila, ensure_ascii=False),
+                        ESTADO_COMPLETADA if i in completadas else ESTADO_PENDIENTE,
+                        json.dumps(completadas[i], ensure_ascii=False) if i in completadas else None,
+                        prioridad,
+                        tenant,
+                    )
+                    for i, fila in enumerate(filas)
+                ],
+            )
+            conn.execute("COMMIT")
+        return job_id
+
+    def opciones(self, job_id: str) -> Dict:
+        with self._conexion() as conn:
+            row = conn.execute("SELECT opciones FROM trabajos WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def arrendar(self, worker_id: str, lease_segundos: float = LEASE_SEGUNDOS) -> Optional[Tarea]:
+        """
+        Toma la siguiente tarea pendiente (o con arriendo vencido) para `worker_id`:
+        primero la clase de mayor prioridad y, dentro de ella, el tenant con
+        menos tareas en curso (a igualdad, el atendido hace más tiempo).
+        """
+        ahora = time.time()
+        disponible = "(estado = ? OR (estado = ? AND lease_hasta < ?))"
+        args_disponible = (ESTADO_PENDIENTE, ESTADO_EN_CURSO, ahora)
+        with self._conexion() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._descartar_agotadas(conn, ahora)
+                grupos = conn.execute(
+                    f"SELECT prioridad, tenant, MIN(rowid) FROM tareas WHERE {disponible} "
+                    "GROUP BY prioridad, tenant",
+                    args_disponible,
+                ).fetchall()
+                if not grupos:
+                    conn.execute("COMMIT")
+                    return None
+                en_curso = dict(conn.execute(
+                    "SELECT tenant, COUNT(*) FROM tareas WHERE estado = ? AND lease_hasta >= ? "
+                    "GROUP BY tenant",
+                    (ESTADO_EN_CURSO, ahora),
+                ).fetchall())
+                ultimo_turno = dict(conn.execute("SELECT tenant, ultimo FROM turnos_tenant").fetchall())
+                prioridad, tenant, _ = min(
+                    grupos,
+                    key=lambda g: (g[0], en_curso.get(g[1], 0), ultimo_turno.get(g[1], 0.0), g[2]),
+                )
+                job_id, indice, payload, intentos = conn.execute(
+                    "SELECT job_id, indice, payload, intentos FROM tareas "
+                    f"WHERE {disponible} AND prioridad = ? AND tenant = ? "
+                    "ORDER BY rowid LIMIT 1",
+                    args_disponible + (prioridad, tenant),
+                ).fetchone()
+                conn.execute(
+                    "UPDATE tareas SET estado = ?, worker = ?, lease_hasta = ?, intentos = ? "
+                    "WHERE job_id = ? AND indice = ?",
+                    (ESTADO_EN_CURSO, worker_id, ahora + lease_segundos, intentos + 1, job_id, indice),
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO turnos_tenant (tenant, ultimo) VALUES (?, ?)",
+                    (tenant, ahora),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return Tarea(job_id=job_id, indice=indice, payload=json.loads(payload), intentos=intentos + 1)
+
+    def _descartar_agotadas(self, conn: sqlite3.Connection, ahora: float) -> None:
+        rows = conn.execute(
+            "SELECT job_id, indice, payload, intentos FROM tareas "
+            "WHERE estado = ? AND lease_hasta < ? AND intentos >= ?",
+            (ESTADO_EN_CURSO, ahora, self.max_intentos),
+        ).fetchall()
+        for job_id, indice, payload, intentos in rows:
+            conn.execute(
+                "UPDATE tareas SET estado = ?, worker = NULL, lease_hasta = NULL, resultado = ? "
+                "WHERE job_id = ? AND indice = ?",
+                (
+                    ESTADO_COMPLETADA,
+                    json.dumps(_resultado_agotado(json.loads(payload), intentos), ensure_ascii=False),
+                    job_id,
+                    indice,
+                ),
+            )
+
+    def recuperar_vencidas(self) -> None:
+        """
+        Devuelve a pendientes las tareas con arriendo vencido y da por fallidas
+        las que ya agotaron sus intentos. Lo llama el coordinador mientras
+        espera, para no depender de que algún worker pida trabajo.
+        """
+        ahora = time.time()
+        with self._conexion() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._descartar_agotadas(conn, ahora)
+                conn.execute(
+                    "UPDATE tareas SET estado = ?, worker = NULL, lease_hasta = NULL "
+                    "WHERE estado = ? AND lease_hasta < ?",
+                    (ESTADO_PENDIENTE, ESTADO_EN_CURSO, ahora),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def abandonar_trabajo(self, job_id: str, motivo: str) -> int:
+        """
+        Da por fallidas, con `motivo` como error, las tareas del trabajo que
+        sigan sin resultado. Un worker que aún tenga una de ellas ya no podrá
+        completarla. Devuelve cuántas se abandonaron.
+        """
+        with self._conexion() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    "SELECT indice, payload FROM tareas WHERE job_id = ? AND estado != ?",
+                    (job_id, ESTADO_COMPLETADA),
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE tareas SET estado = ?, worker = NULL, lease_hasta = NULL, resultado = ? "
+                    "WHERE job_id = ? AND indice = ?",
+                    [
+                        (
+                            ESTADO_COMPLETADA,
+                            json.dumps(_resultado_fallido(json.loads(payload), motivo), ensure_ascii=False),
+                            job_id,
+                            indice,
+                        )
+                        for indice, payload in rows
+                    ],
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def latido(self, tarea: Tarea, worker_id: str, lease_segundos: float = LEASE_SEGUNDOS) -> bool:
+        """
+        Extiende el arriendo. Devuelve False si la tarea ya no pertenece al worker.
+        """
+        with self._conexion() as conn:
+            cur = conn.execute(
+                "UPDATE tareas SET lease_hasta = ? "
+                "WHERE job_id = ? AND indice = ? AND worker = ? AND estado = ?",
+                (time.time() + lease_segundos, tarea.job_id, tarea.indice, worker_id, ESTADO_EN_CURSO),
+            )
+            return cur.rowcount == 1
+
+    def completar(self, tarea: Tarea, worker_id: str, resultado: Dict) -> bool:
+        with self._conexion() as conn:
+            cur = conn.execute(
+                "UPDATE tareas SET estado = ?, resultado = ?, lease_hasta = NULL "
+                "WHERE job_id = ? AND indice = ? AND worker = ? AND estado = ?",
+                (
+                    ESTADO_COMPLETADA,
+                    json.dumps(resultado, ensure_ascii=False, default=str),
+                    tarea.job_id,
+                    tarea.indice,
+                    worker_id,
+                    ESTADO_EN_CURSO,
+                ),
+            )
+            return cur.rowcount == 1
+
+    def estado(self, job_id: str) -> Dict[str, int]:
+        with self._conexion() as conn:
+            rows = conn.execute(
+                "SELECT estado, COUNT(*) FROM tareas WHERE job_id = ? GROUP BY estado",
+                (job_id,),
+            ).fetchall()
+        conteos = {ESTADO_PENDIENTE: 0, ESTADO_EN_CURSO: 0, ESTADO_COMPLETADA: 0}
+        conteos.update(dict(rows))
+        conteos["total"] = sum(conteos.values())
+        return conteos
+
+    def resultados(self, job_id: str) -> List[Dict]:
+        with self._conexion() as conn:
+            rows = conn.execute(
+                "SELECT resultado FROM tareas WHERE job_id = ? AND estado = ? ORDER BY indice",
+                (job_id, ESTADO_COMPLETADA),
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def eliminar_trabajo(self, job_id: str) -> None:
+        """
+        Borra el trabajo y sus tareas. Lo llama el coordinador una vez que
+        tiene los resultados; un worker que aún tenga una de sus tareas ya no
+        podrá completarla.
+        """
+        with self._conexion() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM tareas WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM trabajos WHERE id = ?", (job_id,))
+            conn.execute("COMMIT")
+
+    def purgar_trabajos(self, max_horas: float = COLA_RETENCION_HORAS) -> int:
+        """
+        Borra los trabajos creados hace más de `max_horas` (los que ningún
+        coordinador eliminó) y los turnos de tenants sin actividad desde
+        entonces. SQLite reutiliza las páginas liberadas, así que el archivo
+        deja de crecer.
+        """
+        limite = time.time() - max_horas * 3600
+        with self._conexion() as conn:
+            viejos = [r[0] for r in conn.execute("SELECT id FROM trabajos WHERE creado < ?", (limite,))]
+            conn.execute("DELETE FROM turnos_tenant WHERE ultimo < ?", (limite,))
+        for job_id in viejos:
+            self.eliminar_trabajo(job_id)
+        if viejos:
+            print(f"Retención de la cola: {len(viejos)} trabajos eliminados")
+        return len(viejos)
+
+
+# Sacar una fila de pendientes y registrar su arriendo es una sola operación
+# atómica: un worker que muere entre ambos pasos no puede dejar la fila fuera
+# de las dos estructuras. El reparto es el mismo que en SQLite: primero la
+# prioridad y, dentro de ella, el tenant con menos filas arrendadas vigentes (a
+# igualdad, el atendido hace más tiempo). Cada prioridad tiene una lista de
+# pendientes por tenant y el conjunto de tenants con pendientes; cada tenant,
+# un zset con sus arriendos por vencimiento (ZCOUNT desde ahora = en curso).
+# Cada trabajo lleva además el conjunto de sus filas arrendadas, para
+# contarlas sin recorrer todos los arriendos. Las filas de un trabajo ya
+# eliminado se descartan. KEYS: arriendos. ARGV: vencimiento, worker, prefijo,
+# ahora y las prioridades de mayor a menor.
+_LUA_ARRENDAR = """
+local prefijo = ARGV[3]
+local ahora = tonumber(ARGV[4])
+for p = 5, #ARGV do
+    local clave_tenants = prefijo .. ':tenants:' .. ARGV[p]
+    while true do
+        local tenants = redis.call('SMEMBERS', clave_tenants)
+        if #tenants == 0 then
+            break
+        end
+        local mejor, mejor_en_curso, mejor_turno
+        for _, tenant in ipairs(tenants) do
+            local en_curso = redis.call('ZCOUNT', prefijo .. ':arriendos_tenant:' .. tenant, ahora, '+inf')
+            local turno = tonumber(redis.call('HGET', prefijo .. ':turnos', tenant) or '0')
+            if mejor == nil or en_curso < mejor_en_curso
+                or (en_curso == mejor_en_curso and (turno < mejor_turno
+                    or (turno == mejor_turno and tenant < mejor))) then
+                mejor, mejor_en_curso, mejor_turno = tenant, en_curso, turno
+            end
+        end
+        local lista = prefijo .. ':pendientes:' .. ARGV[p] .. ':' .. mejor
+        local clave = redis.call('LPOP', lista)
+        if redis.call('LLEN', lista) == 0 then
+            redis.call('SREM', clave_tenants, mejor)
+        end
+        if clave then
+            local sep = string.find(clave, ':[^:]*$')
+            local job_id = string.sub(clave, 1, sep - 1)
+            local indice = string.sub(clave, sep + 1)
+            local payload = redis.call('HGET', prefijo .. ':payload:' .. job_id, indice)
+            if payload then
+                redis.call('ZADD', KEYS[1], ARGV[1], clave)
+                redis.call('ZADD', prefijo .. ':arriendos_tenant:' .. mejor, ARGV[1], clave)
+                redis.call('SADD', prefijo .. ':arrendadas:' .. job_id, indice)
+                redis.call('HSET', prefijo .. ':workers:' .. job_id, indice, ARGV[2])
+                redis.call('HSET', prefijo .. ':turnos', mejor, ahora)
+                local intentos = redis.call('HINCRBY', prefijo .. ':intentos:' .. job_id, indice, 1)
+                return {clave, intentos, payload}
+            end
+        end
+    end
+end
+return false
+"""
+
+# Reencola (o da por agotadas) las filas con arriendo vencido, también de forma
+# atómica. KEYS: arriendos. ARGV: ahora, max_intentos, prefijo, prioridad por
+# defecto, mensaje de tarea agotada.
+_LUA_REENCOLAR = """
+local prefijo = ARGV[3]
+local vencidos = redis.call('ZRANGEBYSCORE', KEYS[1], 0, ARGV[1])
+for _, clave in ipairs(vencidos) do
+    redis.call('ZREM', KEYS[1], clave)
+    local sep = string.find(clave, ':[^:]*$')
+    local job_id = string.sub(clave, 1, sep - 1)
+    local indice = string.sub(clave, sep + 1)
+    local trabajo = prefijo .. ':trabajo:' .. job_id
+    local tenant = redis.call('HGET', trabajo, 'tenant') or ''
+    redis.call('ZREM', prefijo .. ':arriendos_tenant:' .. tenant, clave)
+    redis.call('SREM', prefijo .. ':arrendadas:' .. job_id, indice)
+    local payload = redis.call('HGET', prefijo .. ':payload:' .. job_id, indice)
+    local intentos = tonumber(redis.call('HGET', prefijo .. ':intentos:' .. job_id, indice) or '0')
+    if not payload then
+        -- Trabajo ya eliminado: no se reencola.
+    elseif intentos >= tonumber(ARGV[2]) then
+        local resultado = cjson.decode(payload)
+        resultado['screenshot_path'] = cjson.null
+        resultado['error'] = string.gsub(ARGV[5], '{intentos}', tostring(intentos))
+        redis.call('HSETNX', prefijo .. ':resultados:' .. job_id, indice, cjson.encode(resultado))
+    else
+        local prioridad = redis.call('HGET', trabajo, 'prioridad') or ARGV[4]
+        redis.call('LPUSH', prefijo .. ':pendientes:' .. prioridad .. ':' .. tenant, clave)
+        redis.call('SADD', prefijo .. ':tenants:' .. prioridad, tenant)
+    end
+end
+return #vencidos
+"""
+
+
+class RedisJobQueue:
+    """
+    Cola compartida sobre Redis, para workers repartidos en varias máquinas.
+    Reparte igual que SQLiteJobQueue: por prioridad y, dentro de ella, entre
+    tenants (ver _LUA_ARRENDAR). Dentro de un tenant el orden es FIFO.
+    """
+
+    def __init__(self, url: str, max_intentos: int = MAX_INTENTOS, prefijo: str = "icfes"):
+        import redis
+
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.max_intentos = max_intentos
+        self.prefijo = prefijo
+        self._arrendar = self.redis.register_script(_LUA_ARRENDAR)
+        self._reencolar = self.redis.register_script(_LUA_REENCOLAR)
+
+    def _k(self, *partes: str) -> str:
+        return ":".join((self.prefijo,) + partes)
+
+    def _tenant(self, job_id: str) -> str:
+        return self.redis.hget(self._k("trabajo", job_id), "tenant") or ""
+
+    def crear_trabajo(
+        self,
+        filas: List[Dict],
+        opciones: Dict | None = None,
+        completadas: Dict[int, Dict] | None = None,
+        prioridad: int = PRIORIDAD_MASIVA,
+        tenant: str = "",
+    ) -> str:
+        job_id = uuid.uuid4().hex
+        completadas = completadas or {}
+        pipe = self.redis.pipeline()
+        pipe.hset(self._k("trabajo", job_id), mapping={
+            "creado": time.time(),
+            "total": len(filas),
+            "opciones": json.dumps(opciones or {}),
+            "prioridad": prioridad,
+            "tenant": tenant,
+        })
+        pipe.zadd(self._k("trabajos"), {job_id: time.time()})
+        for i, fila in enumerate(filas):
+            pipe.hset(self._k("payload", job_id), i, json.dumps(fila, ensure_ascii=False))
+            if i in completadas:
+                pipe.hset(
+                    self._k("resultados", job_id), i,
+                    json.dumps(completadas[i], ensure_ascii=False),
+                )
+            else:
+                pipe.rpush(self._k("pendientes", str(prioridad), tenant), f"{job_id}:{i}")
+        if len(completadas) < len(filas):
+            pipe.sadd(self._k("tenants", str(prioridad)), tenant)
+        pipe.execute()
+        return job_id
+
+    def opciones(self, job_id: str) -> Dict:
+        raw = self.redis.hget(self._k("trabajo", job_id), "opciones")
+        return json.loads(raw) if raw else {}
+
+    def recuperar_vencidas(self) -> None:
+        self._reencolar(
+            keys=[self._k("arriendos")],
+            args=[time.time(), self.max_intentos, self.prefijo, PRIORIDAD_MASIVA, MENSAJE_AGOTADA],
+        )
+
+    def abandonar_trabajo(self, job_id: str, motivo: str) -> int:
+        total = int(self.redis.hget(self._k("trabajo", job_id), "total") or 0)
+        prioridad = self.redis.hget(self._k("trabajo", job_id), "prioridad") or PRIORIDAD_MASIVA
+        tenant = self._tenant(job_id)
+        resueltas = set(self.redis.hkeys(self._k("resultados", job_id)))
+        abandonadas = 0
+        for indice in map(str, range(total)):
+            if indice in resueltas:
+                continue
+            clave = f"{job_id}:{indice}"
+            # Primero se quita el arriendo: un worker que termine después ya no
+            # puede completar la fila (completar exige el arriendo).
+            pipe = self.redis.pipeline()
+            pipe.zrem(self._k("arriendos"), clave)
+            pipe.zrem(self._k("arriendos_tenant", tenant), clave)
+            pipe.srem(self._k("arrendadas", job_id), indice)
+            pipe.lrem(self._k("pendientes", str(prioridad), tenant), 0, clave)
+            pipe.hget(self._k("payload", job_id), indice)
+            *_, payload = pipe.execute()
+            abandonadas += self.redis.hsetnx(
+                self._k("resultados", job_id), indice,
+                json.dumps(_resultado_fallido(json.loads(payload), motivo), ensure_ascii=False),
+            )
+        return abandonadas
+
+    def arrendar(self, worker_id: str, lease_segundos: float = LEASE_SEGUNDOS) -> Optional[Tarea]:
+        self.recuperar_vencidas()
+        ahora = time.time()
+        tomada = self._arrendar(
+            keys=[self._k("arriendos")],
+            args=[ahora + lease_segundos, worker_id, self.prefijo, ahora] + sorted(NOMBRES_PRIORIDAD),
+        )
+        if not tomada:
+            return None
+        clave, intentos, payload = tomada
+        job_id, indice = clave.rsplit(":", 1)
+        return Tarea(job_id=job_id, indice=int(indice), payload=json.loads(payload), intentos=int(intentos))
+
+    def latido(self, tarea: Tarea, worker_id: str, lease_segundos: float = LEASE_SEGUNDOS) -> bool:
+        clave = f"{tarea.job_id}:{tarea.indice}"
+        if self.redis.hget(self._k("workers", tarea.job_id), tarea.indice) != worker_id:
+            return False
+        # XX: solo actualiza si el arriendo sigue vigente (no fue reencolado).
+        vencimiento = time.time() + lease_segundos
+        if not self.redis.zadd(self._k("arriendos"), {clave: vencimiento}, xx=True, ch=True):
+            return False
+        self.redis.zadd(self._k("arriendos_tenant", self._tenant(tarea.job_id)), {clave: vencimiento}, xx=True)
+        return True
+
+    def completar(self, tarea: Tarea, worker_id: str, resultado: Dict) -> bool:
+        clave = f"{tarea.job_id}:{tarea.indice}"
+        if self.redis.hget(self._k("workers", tarea.job_id), tarea.indice) != worker_id:
+            return False
+        if not self.redis.zrem(self._k("arriendos"), clave):
+            return False
+        self.redis.srem(self._k("arrendadas", tarea.job_id), tarea.indice)
+        self.redis.zrem(self._k("arriendos_tenant", self._tenant(tarea.job_id)), clave)
+        self.redis.hset(
+            self._k("resultados", tarea.job_id), tarea.indice,
+            json.dumps(resultado, ensure_ascii=False, default=str),
+        )
+        return True
+
+    def estado(self, job_id: str) -> Dict[str, int]:
+        total = int(self.redis.hget(self._k("trabajo", job_id), "total") or 0)
+        completadas = self.redis.hlen(self._k("resultados", job_id))
+        en_curso = self.redis.scard(self._k("arrendadas", job_id))
+        return {
+            ESTADO_PENDIENTE: total - completadas - en_curso,
+            ESTADO_EN_CURSO: en_curso,
+            ESTADO_COMPLETADA: completadas,
+            "total": total,
+        }
+
+    def resultados(self, job_id: str) -> List[Dict]:
+        raw = self.redis.hgetall(self._k("resultados", job_id))
+        return [json.loads(raw[i]) for i in sorted(raw, key=int)]
+
+    def eliminar_trabajo(self, job_id: str) -> None:
+        tenant = self._tenant(job_id)
+        arrendadas = self.redis.smembers(self._k("arrendadas", job_id))
+        pipe = self.redis.pipeline()
+        if arrendadas:
+            claves = [f"{job_id}:{i}" for i in arrendadas]
+            pipe.zrem(self._k("arriendos"), *claves)
+            pipe.zrem(self._k("arriendos_tenant", tenant), *claves)
+        # Las filas pendientes que queden en la lista se descartan al sacarlas
+        # (ver _LUA_ARRENDAR); borrar el payload basta para invalidarlas.
+        pipe.delete(*[
+            self._k(tipo, job_id)
+            for tipo in ("trabajo", "payload", "resultados", "workers", "intentos", "arrendadas")
+        ])
+        pipe.zrem(self._k("trabajos"), job_id)
+        pipe.execute()
+
+    def purgar_trabajos(self, max_horas: float = COLA_RETENCION_HORAS) -> int:
+        limite = time.time() - max_horas * 3600
+        viejos = self.redis.zrangebyscore(self._k("trabajos"), 0, limite)
+        for job_id in viejos:
+            self.eliminar_trabajo(job_id)
+        if viejos:
+            print(f"Retención de la cola: {len(viejos)} trabajos eliminados")
+        return len(viejos)
+
+
+def crear_cola(url: str | None = None):
+    """
+    Crea la cola indicada por `url` (o JOB_QUEUE_URL). `redis://...` usa Redis
+    si el paquete está instalado; cualquier otro valor es la ruta de un archivo
+    SQLite. Sin URL se usa data/cola_trabajos.sqlite3.
+    """
+    url = url or JOB_QUEUE_URL
+    if url and url.startswith(("redis://", "rediss://")):
+        try:
+            return RedisJobQueue(url)
+        except ImportError:
+            print("Paquete 'redis' no instalado; se usará la cola SQLite local.")
+            url = ""
+    if url.startswith("sqlite:///"):
+        url = url[len("sqlite:///"):]
+    return SQLiteJobQueue(url or DATA_DIR / "cola_trabajos.sqlite3")
@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Optional
+
+from config import CONSULTAS_DIR, JOBS_DIR
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+ESTADO_EN_CURSO = "en_curso"
+ESTADO_COMPLETADO = "completado"
+ESTADO_ERROR = "error"
+
+ARCHIVO_JOB = "job.json"
+ARCHIVO_RESULTADOS = "resultados.json"
+ARCHIVO_DELTA = "delta.json"
+INDICE_UPLOADS = JOBS_DIR / "indice_uploads.json"
+
+_indice_lock = threading.Lock()
+_consultas_lock = threading.Lock()
+
+
+def _escribir_json_atomico(path: Path, datos) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(datos, f, ensure_ascii=False, indent=2, default=str)
+    os.replace(tmp, path)
+
+
+def _clave_indice(upload_sha256: str, opciones: Dict, tenant: str) -> str:
+    # El mismo archivo con otras opciones (p. ej. screenshots) es otro trabajo,
+    # y el de otro tenant también: nunca se le muestran sus resultados.
+    return f"{tenant}:{upload_sha256}:{json.dumps(opciones, sort_keys=True)}"
+
+
+def directorio_job(job_id: str) -> Path:
+    return JOBS_DIR / job_id
+
+
+def crear_job(
+    upload_sha256: str,
+    nombre_original: str,
+    opciones: Dict | None = None,
+    tenant: str = "",
+) -> Dict:
+    """
+    Crea data/jobs/<id>/ con su job.json y devuelve los metadatos. `tenant` es
+    quien lo creó (ver app._tenant_actual).
+    """
+    job = {
+        "id": uuid.uuid4().hex,
+        "creado": datetime.now().isoformat(timespec="seconds"),
+        "estado": ESTADO_EN_CURSO,
+        "upload_sha256": upload_sha256,
+        "nombre_original": nombre_original,
+        "opciones": opciones or {},
+        "tenant": tenant,
+        "num_registros": None,
+        "num_errores": None,
+    }
+    _escribir_json_atomico(directorio_job(job["id"]) / ARCHIVO_JOB, job)
+    return job
+
+
+def cargar_job(job_id: str) -> Optional[Dict]:
+    path = directorio_job(job_id) / ARCHIVO_JOB
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def actualizar_job(job_id: str, **cambios) -> Dict:
+    job = cargar_job(job_id)
+    if job is None:
+        raise KeyError(f"No existe el trabajo {job_id}")
+    job.update(cambios)
+    _escribir_json_atomico(directorio_job(job_id) / ARCHIVO_JOB, job)
+    return job
+
+
+def guardar_resultados(job_id: str, df: pd.DataFrame) -> Dict:
+    """
+    Guarda las filas del trabajo, lo marca como completado y lo registra en el
+    índice de uploads para que un archivo idéntico reutilice estos resultados.
+    """
+    path = directorio_job(job_id) / ARCHIVO_RESULTADOS
+    df.to_json(path, orient="records", force_ascii=False, indent=2)
+
+    num_errores = int(df["error"].notna().sum()) if "error" in df.columns else 0
+    job = actualizar_job(
+        job_id,
+        estado=ESTADO_COMPLETADO,
+        terminado=datetime.now().isoformat(timespec="seconds"),
+        num_registros=len(df),
+        num_errores=num_errores,
+    )
+
+    with _indice_lock:
+        indice = _cargar_indice()
+        indice[_clave_indice(job["upload_sha256"], job["opciones"], job.get("tenant", ""))] = job_id
+        _escribir_json_atomico(INDICE_UPLOADS, indice)
+    return job
+
+
+def cargar_resultados(job_id: str) -> Optional[pd.DataFrame]:
+    import pandas as pd
+
+    from services.result_table import aplicar_esquema
+
+    path = directorio_job(job_id) / ARCHIVO_RESULTADOS
+    if not path.exists():
+        return None
+    return aplicar_esquema(pd.read_json(path, orient="records", dtype=False))
+
+
+def guardar_delta(job_id: str, df: pd.DataFrame) -> None:
+    """
+    Guarda los cambios respecto al trabajo anterior en una actualización
+    incremental (ver services.results_service.calcular_delta).
+    """
+    df.to_json(directorio_job(job_id) / ARCHIVO_DELTA, orient="records", force_ascii=False, indent=2)
+
+
+def cargar_delta(job_id: str) -> Optional[pd.DataFrame]:
+    import pandas as pd
+
+    path = directorio_job(job_id) / ARCHIVO_DELTA
+    if not path.exists():
+        return None
+    return pd.read_json(path, orient="records", dtype=False).astype("string")
+
+
+def _cargar_indice() -> Dict[str, str]:
+    if not INDICE_UPLOADS.exists():
+        return {}
+    return json.loads(INDICE_UPLOADS.read_text(encoding="utf-8"))
+
+
+def buscar_job_por_upload(
+    upload_sha256: str,
+    opciones: Dict | None = None,
+    tenant: str = "",
+) -> Optional[Dict]:
+    """
+    Devuelve el trabajo completado del mismo tenant para el mismo archivo y
+    opciones, si existe.
+    """
+    with _indice_lock:
+        job_id = _cargar_indice().get(_clave_indice(upload_sha256, opciones or {}, tenant))
+    if job_id is None:
+        return None
+    job = cargar_job(job_id)
+    if job is None or job["estado"] != ESTADO_COMPLETADO or job.get("tenant", "") != tenant:
+        return None
+    return job
+
+
+def buscar_job_anterior(nombre_original: str, tenant: str) -> Optional[Dict]:
+    """
+    Último trabajo completado del mismo tenant para un archivo con el mismo
+    nombre: es la base de una actualización incremental cuando el listado se
+    vuelve a subir, aunque su contenido haya cambiado. Nunca se toma el trabajo
+    de otro tenant, aunque el nombre coincida.
+    """
+    candidatos = []
+    for path in JOBS_DIR.glob(f"*/{ARCHIVO_JOB}"):
+        job = json.loads(path.read_text(encoding="utf-8"))
+        if (
+            job.get("nombre_original") == nombre_original
+            and job.get("tenant") == tenant
+            and job.get("estado") == ESTADO_COMPLETADO
+        ):
+            candidatos.append(job)
+    if not candidatos:
+        return None
+    return max(candidatos, key=lambda job: job.get("terminado") or job["creado"])
+
+
+def _path_consulta(consulta_id: str) -> Path:
+    return CONSULTAS_DIR / f"{consulta_id}.json"
+
+
+def crear_consulta() -> Dict:
+    """
+    Registra una consulta manual pendiente en data/consultas/<id>.json. La
+    consulta corre en el proceso que la recibió, pero su estado queda en disco
+    para que cualquier proceso de la app muestre la página de espera y el
+    resultado.
+    """
+    consulta = {
+        "id": uuid.uuid4().hex,
+        "estado": "pendiente",
+        "resultado": None,
+        "creada": time.time(),
+        "terminada": None,
+    }
+    _escribir_json_atomico(_path_consulta(consulta["id"]), consulta)
+    return consulta
+
+
+def cargar_consulta(consulta_id: str) -> Optional[Dict]:
+    path = _path_consulta(consulta_id)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def actualizar_consulta(consulta_id: str, **cambios) -> None:
+    # Una consulta ya purgada no se vuelve a crear.
+    with _consultas_lock:
+        consulta = cargar_consulta(consulta_id)
+        if consulta is not None:
+            consulta.update(cambios)
+            _escribir_json_atomico(_path_consulta(consulta_id), consulta)
+
+
+def purgar_consultas(terminadas_antes_de: float) -> int:
+    """
+    Borra las consultas terminadas antes de `terminadas_antes_de` (epoch) y
+    devuelve cuántas borró.
+    """
+    borradas = 0
+    for path in CONSULTAS_DIR.glob("*.json"):
+        try:
+            terminada = json.loads(path.read_text(encoding="utf-8")).get("terminada")
+        except (OSError, ValueError):
+            continue
+        if terminada and terminada < terminadas_antes_de:
+            path.unlink(missing_ok=True)
+            borradas += 1
+    return borradas
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+from scraping.registro import CAMPOS_NUMERICOS, CAMPOS_TEXTO, COLUMNAS, RegistroResultado
+
+# Puntajes (0-500) y percentiles (0-100) caben en 16 bits.
+DTYPE_NUMERICO = "Int16"
+DTYPE_TEXTO = "string"
+_INFO_INT16 = np.iinfo(np.int16)
+
+
+class TablaResultados:
+    """
+    Buffer columnar de resultados con una fila por estudiante, reservado de
+    antemano: cada campo numérico es un arreglo int16 más su máscara de nulos
+    y cada campo de texto un arreglo de objetos. Las filas se escriben a medida
+    que llegan y `a_dataframe` arma el DataFrame sin copiar los números.
+    """
+
+    def __init__(self, num_filas: int):
+        self.num_filas = num_filas
+        self._numeros: Dict[str, np.ndarray] = {
+            c: np.zeros(num_filas, dtype=np.int16) for c in CAMPOS_NUMERICOS
+        }
+        self._nulos: Dict[str, np.ndarray] = {
+            c: np.ones(num_filas, dtype=bool) for c in CAMPOS_NUMERICOS
+        }
+        self._textos: Dict[str, np.ndarray] = {
+            c: np.full(num_filas, None, dtype=object) for c in CAMPOS_TEXTO
+        }
+
+    def __len__(self) -> int:
+        return self.num_filas
+
+    def __setitem__(self, indice: int, registro: RegistroResultado) -> None:
+        for campo in CAMPOS_NUMERICOS:
+            valor = getattr(registro, campo)
+            if valor is not None and not _INFO_INT16.min <= valor <= _INFO_INT16.max:
+                print(f"Valor fuera de rango en {campo} (fila {indice + 1}): {valor}")
+                valor = None
+            if valor is None:
+                self._nulos[campo][indice] = True
+            else:
+                self._numeros[campo][indice] = valor
+                self._nulos[campo][indice] = False
+        for campo in CAMPOS_TEXTO:
+            self._textos[campo][indice] = getattr(registro, campo)
+
+    @classmethod
+    def desde_registros(cls, registros: List[RegistroResultado]) -> "TablaResultados":
+        tabla = cls(len(registros))
+        for i, registro in enumerate(registros):
+            tabla[i] = registro
+        return tabla
+
+    @classmethod
+    def desde_dicts(cls, filas: Iterable[Dict]) -> "TablaResultados":
+        filas = list(filas)
+        tabla = cls(len(filas))
+        for i, fila in enumerate(filas):
+            tabla[i] = RegistroResultado.desde_dict(fila)
+        return tabla
+
+    def a_dataframe(self) -> pd.DataFrame:
+        columnas = {}
+        for campo in COLUMNAS:
+            if campo in self._numeros:
+                columnas[campo] = pd.arrays.IntegerArray(self._numeros[campo], self._nulos[campo])
+            else:
+                columnas[campo] = pd.array(self._textos[campo], dtype=DTYPE_TEXTO)
+        return pd.DataFrame(columnas, copy=False)
+
+
+def aplicar_esquema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Lleva un DataFrame leído de disco (JSON, CSV) a las columnas y tipos del
+    esquema: así los resultados guardados se exportan igual que los recién
+    consultados.
+    """
+    df = df.reindex(columns=COLUMNAS)
+    tipos = {c: DTYPE_NUMERICO for c in CAMPOS_NUMERICOS}
+    tipos.update({c: DTYPE_TEXTO for c in CAMPOS_TEXTO})
+    for campo in CAMPOS_NUMERICOS:
+        df[campo] = pd.to_numeric(df[campo], errors="coerce")
+    return df.astype(tipos)
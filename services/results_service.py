@@ -1,13 +1,103 @@
 from __future__ import annotations
 
+from datetime import datetime, timedelta
 from pathlib import Path
+import time
 from typing import Dict, List, Tuple
 
 import pandas as pd
 
-from config import EXPORT_DIR
-from automation.icfes_client import LoginParams, fetch_results_page
+from config import (
+    COLA_SIN_PROGRESO_S,
+    COLA_TIMEOUT_TRABAJO_S,
+    CONSULTA_TIMEOUT_S,
+    EXPORT_DIR,
+    REFRESCO_MAX_EDAD_HORAS,
+)
+from automation.deadline import Deadline
+from automation.icfes_client import (
+    FetchResult,
+    LoginParams,
+    NavegadorCompartido,
+    fetch_results_page,
+)
 from scraping.icfes_parser import parse_all
+from scraping.registro import AREAS_RESULTADO, CAMPOS_NUMERICOS, RegistroResultado
+from services.result_table import TablaResultados
+from services.scheduler import obtener_planificador, prioridad_para_lote
+from services.stats_service import (
+    calcular_estadisticas,
+    estadisticas_a_dataframe,
+    histogramas_a_dataframe,
+)
+
+
+def _registro_base(params: LoginParams) -> RegistroResultado:
+    return RegistroResultado(
+        tipo_documento=params.tipo_documento,
+        numero_documento=params.numero_documento,
+        fecha_nacimiento=params.fecha_nacimiento,
+        numero_registro=params.numero_registro,
+        consultado=datetime.now().isoformat(timespec="seconds"),
+    )
+
+
+def _armar_resultado(
+    params: LoginParams,
+    fetch_result: FetchResult,
+    deadline: Deadline | None = None,
+) -> RegistroResultado:
+    """
+    Parsea la página de resultados. Con `deadline` el parseo es la última
+    etapa del presupuesto de la consulta: no se interrumpe a mitad (es CPU
+    pura), pero si termina con el presupuesto agotado la consulta falla con
+    ConsultaTimeoutError en la etapa 'parseo'.
+    """
+    if deadline is None:
+        parsed = parse_all(fetch_result.html)
+    else:
+        with deadline.etapa("parseo"):
+            deadline.verificar()
+            parsed = parse_all(fetch_result.html)
+            deadline.verificar()
+
+    registro = _registro_base(params)
+    registro.screenshot_path = str(fetch_result.screenshot_path) if fetch_result.screenshot_path else None
+    for campo, valor in parsed.items():
+        setattr(registro, campo, valor)
+
+    print(f"Consulta exitosa: {parsed.get('nombre_estudiante', 'N/A')}")
+    return registro
+
+
+def _resultado_con_error(params: LoginParams, error: Exception) -> RegistroResultado:
+    print(f"Error en consulta: {str(error)}")
+    registro = _registro_base(params)
+    registro.error = str(error)
+    return registro
+
+
+def _consultar_registro(
+    params: LoginParams,
+    take_screenshot: bool = False,
+    job_id: str | None = None,
+    navegador: NavegadorCompartido | None = None,
+) -> RegistroResultado:
+    try:
+        print(f"Consultando: {params.tipo_documento} {params.numero_documento}")
+        # Un solo presupuesto para el navegador y el parseo.
+        deadline = Deadline(CONSULTA_TIMEOUT_S)
+        fetch_result = fetch_results_page(
+            params,
+            take_screenshot=take_screenshot,
+            job_id=job_id,
+            navegador=navegador,
+            deadline=deadline,
+        )
+        return _armar_resultado(params, fetch_result, deadline)
+
+    except Exception as e:
+        return _resultado_con_error(params, e)
 
 
 def consultar_un_estudiante(
@@ -16,10 +106,14 @@ def consultar_un_estudiante(
     fecha_nacimiento: str = "",
     numero_registro: str = "",
     take_screenshot: bool = False,
+    job_id: str | None = None,
+    navegador: NavegadorCompartido | None = None,
 ) -> Dict:
     """
     Consulta los resultados de un solo estudiante.
     Ahora soporta número de registro opcional.
+    `job_id` agrupa las trazas de la consulta (ver automation.tracing).
+    `navegador` reutiliza un Chromium ya abierto (ver services.worker).
     """
     params = LoginParams(
         tipo_documento=tipo_documento,
@@ -27,62 +121,29 @@ def consultar_un_estudiante(
         fecha_nacimiento=fecha_nacimiento,
         numero_registro=numero_registro,
     )
+    return _consultar_registro(params, take_screenshot, job_id, navegador).a_dict()
 
-    try:
-        print(f"Consultando: {tipo_documento} {numero_documento}")
-        fetch_result = fetch_results_page(params, take_screenshot=take_screenshot)
-
-        parsed = parse_all(fetch_result.html)
-
-        result: Dict = {
-            "tipo_documento": tipo_documento,
-            "numero_documento": numero_documento,
-            "fecha_nacimiento": fecha_nacimiento,
-            "numero_registro": numero_registro,
-            "screenshot_path": str(fetch_result.screenshot_path) if fetch_result.screenshot_path else None,
-            "error": None,
-        }
 
-        result.update(parsed)
-        print(f"Consulta exitosa: {parsed.get('nombre_estudiante', 'N/A')}")
-        return result
-
-    except Exception as e:
-        print(f"Error en consulta: {str(e)}")
-        return {
-            "tipo_documento": tipo_documento,
-            "numero_documento": numero_documento,
-            "fecha_nacimiento": fecha_nacimiento,
-            "numero_registro": numero_registro,
-            "screenshot_path": None,
-            "nombre_estudiante": None,
-            "puntaje_general": None,
-            "percentil_general": None,
-            "error": str(e),
-        }
-
-
-def consultar_desde_excel(
+def leer_filas_excel(
     excel_path: str | Path,
-    take_screenshot: bool = False,
     sheet_name: str | int | None = 0,
-) -> pd.DataFrame:
+) -> List[Dict]:
     """
-    Lee un archivo Excel y consulta los resultados de cada estudiante.
+    Lee el Excel de entrada y normaliza cada fila a los parámetros de consulta.
     """
     excel_path = Path(excel_path)
-    
+
     if not excel_path.exists():
         raise FileNotFoundError(f"No se encontró el archivo: {excel_path}")
-    
+
     print(f"Leyendo Excel: {excel_path}")
     df_input = pd.read_excel(excel_path, sheet_name=sheet_name)
-    
+
     print(f"Total de registros: {len(df_input)}")
 
-    resultados: List[Dict] = []
+    filas: List[Dict] = []
 
-    for idx, row in df_input.iterrows():
+    for _, row in df_input.iterrows():
         tipo_doc = str(row.get("tipo_documento", "")).strip()
         num_doc = str(row.get("numero_documento", "")).strip()
 
@@ -96,42 +157,300 @@ def consultar_desde_excel(
             else:
                 fecha_nac = str(raw_fecha).strip()
 
+        filas.append(
+            {
+                "tipo_documento": tipo_doc,
+                "numero_documento": num_doc,
+                "fecha_nacimiento": fecha_nac,
+            }
+        )
+
+    return filas
+
+
+def _fila_incompleta(fila: Dict) -> bool:
+    return not fila["tipo_documento"] or not fila["numero_documento"] or not fila["fecha_nacimiento"]
+
 
-        if not tipo_doc or not num_doc or not fecha_nac:
+def _resultado_fila_incompleta(fila: Dict) -> RegistroResultado:
+    registro = RegistroResultado.desde_dict(fila)
+    registro.error = "Datos incompletos en la fila de entrada"
+    return registro
+
+
+def _clave_estudiante(fila: Dict) -> Tuple[str, str]:
+    return (
+        str(fila.get("tipo_documento") or "").strip().upper(),
+        str(fila.get("numero_documento") or "").strip(),
+    )
+
+
+def _registros_por_estudiante(df: pd.DataFrame) -> Dict[Tuple[str, str], RegistroResultado]:
+    filas = df.astype(object).where(df.notna(), None).to_dict("records")
+    return {_clave_estudiante(fila): RegistroResultado.desde_dict(fila) for fila in filas}
+
+
+def _registro_vigente(registro: RegistroResultado, limite: datetime) -> bool:
+    """
+    Un resultado anterior es definitivo si no tuvo error, trae el puntaje
+    global y los de todas las áreas, y se consultó después de `limite`.
+    """
+    if registro.error or registro.error_parsing:
+        return False
+    if registro.puntaje_general is None:
+        return False
+    if any(getattr(registro, f"puntaje_{area}") is None for area in AREAS_RESULTADO):
+        return False
+    try:
+        return datetime.fromisoformat(registro.consultado or "") >= limite
+    except ValueError:
+        return False
+
+
+def registros_reutilizables(
+    filas: List[Dict],
+    previo: pd.DataFrame,
+    max_edad_horas: float = REFRESCO_MAX_EDAD_HORAS,
+) -> Dict[int, RegistroResultado]:
+    """
+    Devuelve, por índice de `filas`, los resultados de una corrida anterior que
+    no hace falta volver a consultar.
+    """
+    limite = datetime.now() - timedelta(hours=max_edad_horas)
+    anteriores = _registros_por_estudiante(previo)
+    reutilizables = {}
+    for i, fila in enumerate(filas):
+        registro = anteriores.get(_clave_estudiante(fila))
+        if registro is not None and _registro_vigente(registro, limite):
+            reutilizables[i] = registro
+    return reutilizables
+
+
+CAMPOS_DELTA = ("nombre_estudiante",) + CAMPOS_NUMERICOS + ("error",)
+COLUMNAS_DELTA = ["tipo_documento", "numero_documento", "nombre_estudiante", "campo", "anterior", "nuevo"]
+
+
+def calcular_delta(previo: pd.DataFrame, actual: pd.DataFrame) -> pd.DataFrame:
+    """
+    Diferencias entre dos corridas del mismo listado, una fila por estudiante y
+    campo que cambió. Los estudiantes que aparecen o desaparecen del listado se
+    reportan con campo "registro".
+    """
+    anteriores = _registros_por_estudiante(previo)
+    actuales = _registros_por_estudiante(actual)
+    cambios: List[Dict] = []
+
+    def _agregar(clave, nombre, campo, antes, despues):
+        cambios.append(
+            {
+                "tipo_documento": clave[0],
+                "numero_documento": clave[1],
+                "nombre_estudiante": nombre,
+                "campo": campo,
+                "anterior": None if antes is None else str(antes),
+                "nuevo": None if despues is None else str(despues),
+            }
+        )
+
+    for clave, registro in actuales.items():
+        anterior = anteriores.get(clave)
+        if anterior is None:
+            _agregar(clave, registro.nombre_estudiante, "registro", None, "nuevo")
+            continue
+        nombre = registro.nombre_estudiante or anterior.nombre_estudiante
+        for campo in CAMPOS_DELTA:
+            antes, despues = getattr(anterior, campo), getattr(registro, campo)
+            if antes != despues:
+                _agregar(clave, nombre, campo, antes, despues)
+
+    for clave, anterior in anteriores.items():
+        if clave not in actuales:
+            _agregar(clave, anterior.nombre_estudiante, "registro", "eliminado", None)
+
+    return pd.DataFrame(cambios, columns=COLUMNAS_DELTA).astype("string")
+
+
+def consultar_desde_excel(
+    excel_path: str | Path,
+    take_screenshot: bool = False,
+    sheet_name: str | int | None = 0,
+    cola=None,
+    job_id: str | None = None,
+    tenant: str = "",
+    previo: pd.DataFrame | None = None,
+    max_edad_horas: float = REFRESCO_MAX_EDAD_HORAS,
+) -> pd.DataFrame:
+    """
+    Lee un archivo Excel y consulta los resultados de cada estudiante.
+    Con `previo` (los resultados de una corrida anterior del mismo listado) se
+    hace una actualización incremental: solo se consultan las filas que antes
+    fallaron, quedaron sin puntajes por área o tienen más de
+    `max_edad_horas`; el resto se copia de `previo`.
+    Si se pasa una `cola` (ver services.job_queue), las filas se reparten
+    entre los workers conectados a ella en lugar de consultarse aquí.
+    Cada fila pide turno al planificador como lote pequeño o masivo según el
+    tamaño del archivo, para no bloquear las consultas manuales.
+    Los resultados se van escribiendo en una TablaResultados (columnas
+    tipadas, ver services.result_table) en lugar de acumular dicts.
+    """
+    filas = leer_filas_excel(excel_path, sheet_name=sheet_name)
+    reutilizados = registros_reutilizables(filas, previo, max_edad_horas) if previo is not None else {}
+    if previo is not None:
+        print(
+            f"Actualización incremental: {len(reutilizados)} filas vigentes, "
+            f"{len(filas) - len(reutilizados)} por consultar"
+        )
+    prioridad = prioridad_para_lote(len(filas) - len(reutilizados))
+    job_id = job_id or f"lote_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+    if cola is not None:
+        resultados = _consultar_con_cola(
+            filas, take_screenshot, cola, prioridad, tenant, reutilizados, job_id=job_id
+        )
+        df_resultados = TablaResultados.desde_dicts(resultados).a_dataframe()
+        print(f"\nProceso completado: {len(df_resultados)} registros procesados")
+        return df_resultados
+
+    tabla = TablaResultados(len(filas))
+
+    for idx, fila in enumerate(filas):
+        if idx in reutilizados:
+            tabla[idx] = reutilizados[idx]
+            continue
+
+        if _fila_incompleta(fila):
             print(f"Fila {idx + 1}: Datos incompletos")
-            resultados.append(
-                {
-                    "tipo_documento": tipo_doc,
-                    "numero_documento": num_doc,
-                    "fecha_nacimiento": fecha_nac,
-                    "screenshot_path": None,
-                    "error": "Datos incompletos en la fila de entrada",
-                }
-            )
+            tabla[idx] = _resultado_fila_incompleta(fila)
             continue
 
-        print(f"\n[{idx + 1}/{len(df_input)}] Procesando: {tipo_doc} - {num_doc}")
-        
-        result = consultar_un_estudiante(
-            tipo_documento=tipo_doc,
-            numero_documento=num_doc,
-            fecha_nacimiento=fecha_nac,
-            take_screenshot=take_screenshot,
+        print(f"\n[{idx + 1}/{len(filas)}] Procesando: {fila['tipo_documento']} - {fila['numero_documento']}")
+
+        params = LoginParams(
+            tipo_documento=fila["tipo_documento"],
+            numero_documento=fila["numero_documento"],
+            fecha_nacimiento=fila["fecha_nacimiento"],
         )
-        resultados.append(result)
+        with obtener_planificador().turno(prioridad, tenant):
+            tabla[idx] = _consultar_registro(params, take_screenshot, job_id)
 
-    df_resultados = pd.DataFrame(resultados)
+    df_resultados = tabla.a_dataframe()
     print(f"\nProceso completado: {len(df_resultados)} registros procesados")
     
     return df_resultados
 
 
+def _consultar_con_cola(
+    filas: List[Dict],
+    take_screenshot: bool,
+    cola,
+    prioridad: int,
+    tenant: str,
+    reutilizados: Dict[int, RegistroResultado] | None = None,
+    job_id: str | None = None,
+    intervalo: float = 2.0,
+    timeout_s: float = COLA_TIMEOUT_TRABAJO_S,
+    sin_progreso_s: float = COLA_SIN_PROGRESO_S,
+) -> List[Dict]:
+    """
+    Coordinador: publica las filas como un trabajo, espera a que los workers
+    lo terminen y devuelve los resultados en el orden original. Las filas
+    incompletas o `reutilizados` se publican ya resueltas. `job_id` (el
+    trabajo de la app) viaja en las opciones para que los workers archiven las
+    trazas bajo ese id y no bajo el id interno de la cola.
+    Mientras espera, recupera los arriendos vencidos. Si el trabajo supera
+    `timeout_s`, o pasa `sin_progreso_s` sin filas terminadas ni en curso, las
+    filas restantes se abandonan con error. Al terminar, el trabajo se borra
+    de la cola, y antes de publicarlo se purgan los trabajos viejos que ningún
+    coordinador borró.
+    """
+    completadas = {
+        i: _resultado_fila_incompleta(fila).a_dict()
+        for i, fila in enumerate(filas)
+        if _fila_incompleta(fila)
+    }
+    completadas.update({i: registro.a_dict() for i, registro in (reutilizados or {}).items()})
+    opciones = {"take_screenshot": take_screenshot}
+    if job_id:
+        opciones["job_id"] = job_id
+    cola.purgar_trabajos()
+    trabajo_id = cola.crear_trabajo(
+        filas,
+        opciones=opciones,
+        completadas=completadas,
+        prioridad=prioridad,
+        tenant=tenant,
+    )
+    print(f"Trabajo {trabajo_id} publicado: {len(filas) - len(completadas)} filas para los workers")
+
+    inicio = ultimo_avance = time.monotonic()
+    ultimo = -1
+    while True:
+        cola.recuperar_vencidas()
+        estado = cola.estado(trabajo_id)
+        ahora = time.monotonic()
+        if estado["completada"] != ultimo:
+            ultimo = estado["completada"]
+            ultimo_avance = ahora
+            print(
+                f"Trabajo {trabajo_id}: {estado['completada']}/{estado['total']} completadas, "
+                f"{estado['en_curso']} en curso"
+            )
+        if estado["completada"] >= estado["total"]:
+            break
+        if estado["en_curso"]:
+            ultimo_avance = ahora
+
+        motivo = None
+        if ahora - inicio > timeout_s:
+            motivo = f"Trabajo sin terminar tras {timeout_s:g} s en la cola"
+        elif ahora - ultimo_avance > sin_progreso_s:
+            motivo = f"Sin workers disponibles: la fila no se tomó en {sin_progreso_s:g} s"
+        if motivo:
+            abandonadas = cola.abandonar_trabajo(trabajo_id, motivo)
+            print(f"⚠ Trabajo {trabajo_id}: {abandonadas} filas abandonadas ({motivo})")
+            break
+        time.sleep(intervalo)
+
+    # Los resultados quedan en el trabajo de la app (job_store); la cola no
+    # los necesita más.
+    resultados = cola.resultados(trabajo_id)
+    cola.eliminar_trabajo(trabajo_id)
+    return resultados
+
+
+def escribir_csv(df: pd.DataFrame, path: Path) -> None:
+    df.to_csv(path, index=False, encoding='utf-8-sig')
+
+
+def escribir_xlsx(df: pd.DataFrame, path: Path, estadisticas: Dict | None = None) -> None:
+    """
+    Escribe el Excel con la hoja de resultados y las hojas de resumen.
+    """
+    if estadisticas is None:
+        estadisticas = calcular_estadisticas(df)
+
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False, sheet_name='Resultados')
+        estadisticas_a_dataframe(estadisticas).to_excel(
+            writer, index=False, sheet_name='Resumen'
+        )
+        histogramas_a_dataframe(estadisticas).to_excel(
+            writer, index=False, sheet_name='Histogramas'
+        )
+
+
+def escribir_json(df: pd.DataFrame, path: Path) -> None:
+    df.to_json(path, orient="records", force_ascii=False, indent=2)
+
+
 def exportar_resultados(
     df: pd.DataFrame,
     base_filename: str = "resultados_icfes",
+    estadisticas: Dict | None = None,
 ) -> Dict[str, Path]:
     """
     Exporta el DataFrame de resultados a CSV, Excel y JSON.
+    El Excel incluye hojas de resumen con las estadísticas ya calculadas.
     """
     EXPORT_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -142,16 +461,15 @@ def exportar_resultados(
     print(f" Exportando resultados...")
     
     # CSV
-    df.to_csv(csv_path, index=False, encoding='utf-8-sig')
+    escribir_csv(df, csv_path)
     print(f"  ✓ CSV: {csv_path}")
 
     # Excel
-    with pd.ExcelWriter(xlsx_path, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Resultados')
+    escribir_xlsx(df, xlsx_path, estadisticas)
     print(f"  ✓ Excel: {xlsx_path}")
 
     # JSON
-    df.to_json(json_path, orient="records", force_ascii=False, indent=2)
+    escribir_json(df, json_path)
     print(f"  ✓ JSON: {json_path}")
 
     return {
@@ -165,13 +483,24 @@ def consultar_y_exportar_desde_excel(
     excel_path: str | Path,
     take_screenshot: bool = False,
     base_filename: str = "resultados_icfes",
+    cola=None,
+    job_id: str | None = None,
+    previo: pd.DataFrame | None = None,
+    max_edad_horas: float = REFRESCO_MAX_EDAD_HORAS,
 ) -> Tuple[pd.DataFrame, Dict[str, Path]]:
     """
     Flujo completo: Lee Excel → Consulta → Exporta
+    Con `previo` se hace la actualización incremental (ver
+    consultar_desde_excel) y se exporta además `<base_filename>_delta.csv`
+    con lo que cambió respecto a la corrida anterior.
     """
     df_resultados = consultar_desde_excel(
         excel_path=excel_path,
         take_screenshot=take_screenshot,
+        cola=cola,
+        job_id=job_id,
+        previo=previo,
+        max_edad_horas=max_edad_horas,
     )
 
     rutas = exportar_resultados(
@@ -179,4 +508,10 @@ def consultar_y_exportar_desde_excel(
         base_filename=base_filename,
     )
 
+    if previo is not None:
+        df_delta = calcular_delta(previo, df_resultados)
+        rutas["delta"] = EXPORT_DIR / f"{base_filename}_delta.csv"
+        escribir_csv(df_delta, rutas["delta"])
+        print(f"  ✓ Delta ({len(df_delta)} cambios): {rutas['delta']}")
+
     return df_resultados, rutas
\ No newline at end of file
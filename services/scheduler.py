@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Deque, Dict, Iterator, List, Optional
+
+from config import (
+    MAX_CONSULTAS_CONCURRENTES,
+    P95_OBJETIVO_INTERACTIVO_S,
+    SLOTS_RESERVADOS_INTERACTIVOS,
+    UMBRAL_LOTE_PEQUENO,
+)
+
+# Clases de prioridad: menor número, mayor prioridad.
+PRIORIDAD_INTERACTIVA = 0
+PRIORIDAD_LOTE_PEQUENO = 1
+PRIORIDAD_MASIVA = 2
+
+NOMBRES_PRIORIDAD = {
+    PRIORIDAD_INTERACTIVA: "interactiva",
+    PRIORIDAD_LOTE_PEQUENO: "lote_pequeno",
+    PRIORIDAD_MASIVA: "masiva",
+}
+
+# Consultas recientes por clase usadas para calcular los percentiles.
+MUESTRAS_METRICAS = 500
+
+
+def prioridad_para_lote(num_filas: int) -> int:
+    return PRIORIDAD_LOTE_PEQUENO if num_filas <= UMBRAL_LOTE_PEQUENO else PRIORIDAD_MASIVA
+
+
+def _percentil(valores: List[float], q: float) -> Optional[float]:
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    posicion = min(len(ordenados) - 1, max(0, round(q * (len(ordenados) - 1))))
+    return round(ordenados[posicion], 3)
+
+
+@dataclass
+class _Solicitud:
+    prioridad: int
+    tenant: str
+    avisar: Callable[[], None]
+    creada: float
+    concedida: Optional[float] = None
+
+
+class Planificador:
+    """
+    Reparte los cupos de navegador del proceso entre consultas de distinta
+    prioridad. Una consulta interactiva siempre tiene `reservados` cupos que
+    los lotes no pueden ocupar; dentro de una misma clase se atiende primero
+    al tenant con menos consultas en curso (y, a igualdad, al que lleva más
+    tiempo esperando).
+
+    Sirve tanto para código síncrono (`turno`) como para el loop asíncrono
+    (`turno_async`): la espera se hace con un Event o un Future según el caso.
+    """
+
+    def __init__(self, capacidad: int, reservados: int = 1):
+        self.capacidad = max(1, capacidad)
+        self.reservados = min(max(0, reservados), self.capacidad - 1)
+        self._lock = threading.Lock()
+        self._esperando: Dict[int, "OrderedDict[str, Deque[_Solicitud]]"] = {
+            p: OrderedDict() for p in NOMBRES_PRIORIDAD
+        }
+        self._activos_por_prioridad: Counter = Counter()
+        self._activos_por_tenant: Counter = Counter()
+        self._esperas: Dict[int, Deque[float]] = {
+            p: deque(maxlen=MUESTRAS_METRICAS) for p in NOMBRES_PRIORIDAD
+        }
+        self._latencias: Dict[int, Deque[float]] = {
+            p: deque(maxlen=MUESTRAS_METRICAS) for p in NOMBRES_PRIORIDAD
+        }
+
+    def _hay_cupo(self, prioridad: int) -> bool:
+        activos = sum(self._activos_por_prioridad.values())
+        if activos >= self.capacidad:
+            return False
+        if prioridad == PRIORIDAD_INTERACTIVA:
+            return True
+        lotes = activos - self._activos_por_prioridad[PRIORIDAD_INTERACTIVA]
+        return lotes < self.capacidad - self.reservados
+
+    def _despachar(self) -> None:
+        # Llamar con self._lock tomado.
+        for prioridad in sorted(self._esperando):
+            colas = self._esperando[prioridad]
+            while colas and self._hay_cupo(prioridad):
+                tenant = min(colas, key=lambda t: self._activos_por_tenant[t])
+                cola = colas[tenant]
+                solicitud = cola.popleft()
+                if cola:
+                    colas.move_to_end(tenant)
+                else:
+                    del colas[tenant]
+                solicitud.concedida = time.monotonic()
+                self._activos_por_prioridad[prioridad] += 1
+                self._activos_por_tenant[tenant] += 1
+                solicitud.avisar()
+
+    def _solicitar(self, prioridad: int, tenant: str, avisar: Callable[[], None]) -> _Solicitud:
+        if prioridad not in NOMBRES_PRIORIDAD:
+            raise ValueError(f"Prioridad desconocida: {prioridad}")
+        solicitud = _Solicitud(prioridad, tenant, avisar, time.monotonic())
+        with self._lock:
+            self._esperando[prioridad].setdefault(tenant, deque()).append(solicitud)
+            self._despachar()
+        return solicitud
+
+    def _liberar(self, solicitud: _Solicitud) -> None:
+        ahora = time.monotonic()
+        with self._lock:
+            self._activos_por_prioridad[solicitud.prioridad] -= 1
+            self._activos_por_tenant[solicitud.tenant] -= 1
+            if self._activos_por_tenant[solicitud.tenant] <= 0:
+                del self._activos_por_tenant[solicitud.tenant]
+            self._esperas[solicitud.prioridad].append(solicitud.concedida - solicitud.creada)
+            self._latencias[solicitud.prioridad].append(ahora - solicitud.creada)
+            self._despachar()
+
+    def _cancelar(self, solicitud: _Solicitud) -> None:
+        with self._lock:
+            if solicitud.concedida is None:
+                cola = self._esperando[solicitud.prioridad].get(solicitud.tenant)
+                if cola is not None and solicitud in cola:
+                    cola.remove(solicitud)
+                    if not cola:
+                        del self._esperando[solicitud.prioridad][solicitud.tenant]
+                return
+        # El cupo se concedió mientras se cancelaba: se devuelve.
+        self._liberar(solicitud)
+
+    @contextmanager
+    def turno(self, prioridad: int = PRIORIDAD_MASIVA, tenant: str = "") -> Iterator[None]:
+        """
+        Bloquea el hilo hasta obtener un cupo y lo libera al salir.
+        """
+        concedido = threading.Event()
+        solicitud = self._solicitar(prioridad, tenant, concedido.set)
+        try:
+            concedido.wait()
+        except BaseException:
+            self._cancelar(solicitud)
+            raise
+        try:
+            yield
+        finally:
+            self._liberar(solicitud)
+
+    @asynccontextmanager
+    async def turno_async(
+        self, prioridad: int = PRIORIDAD_INTERACTIVA, tenant: str = ""
+    ) -> AsyncIterator[None]:
+        """
+        Igual que `turno`, pero espera sin bloquear el event loop.
+        """
+        loop = asyncio.get_running_loop()
+        concedido = loop.create_future()
+
+        def avisar() -> None:
+            # Puede llamarse desde otro hilo (al liberar un turno síncrono).
+            loop.call_soon_threadsafe(
+                lambda: concedido.done() or concedido.set_result(None)
+            )
+
+        solicitud = self._solicitar(prioridad, tenant, avisar)
+        try:
+            await concedido
+        except BaseException:
+            self._cancelar(solicitud)
+            raise
+        try:
+            yield
+        finally:
+            self._liberar(solicitud)
+
+    def estado(self) -> Dict:
+        """
+        Cupos en uso, colas y percentiles de espera/latencia por clase.
+        """
+        with self._lock:
+            clases = {}
+            for prioridad, nombre in NOMBRES_PRIORIDAD.items():
+                esperas = list(self._esperas[prioridad])
+                latencias = list(self._latencias[prioridad])
+                clases[nombre] = {
+                    "en_curso": self._activos_por_prioridad[prioridad],
+                    "en_espera": sum(len(c) for c in self._esperando[prioridad].values()),
+                    "muestras": len(latencias),
+                    "espera_p50_s": _percentil(esperas, 0.50),
+                    "espera_p95_s": _percentil(esperas, 0.95),
+                    "latencia_p50_s": _percentil(latencias, 0.50),
+                    "latencia_p95_s": _percentil(latencias, 0.95),
+                }
+            tenants_en_curso = dict(self._activos_por_tenant)
+
+        p95 = clases["interactiva"]["latencia_p95_s"]
+        return {
+            "capacidad": self.capacidad,
+            "reservados_interactivos": self.reservados,
+            "clases": clases,
+            "tenants_en_curso": tenants_en_curso,
+            "objetivo_p95_interactiva_s": P95_OBJETIVO_INTERACTIVO_S,
+            "cumple_objetivo": None if p95 is None else p95 <= P95_OBJETIVO_INTERACTIVO_S,
+        }
+
+
+_planificador: Optional[Planificador] = None
+_planificador_lock = threading.Lock()
+
+
+def obtener_planificador() -> Planificador:
+    """
+    Planificador compartido por todo el proceso (rutas Flask, loop asíncrono y
+    lotes locales).
+    """
+    global _planificador
+    with _planificador_lock:
+        if _planificador is None:
+            _planificador = Planificador(MAX_CONSULTAS_CONCURRENTES, SLOTS_RESERVADOS_INTERACTIVOS)
+    return _planificador
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import warnings
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+AREAS = {
+    "general": "General",
+    "lectura_critica": "Lectura Crítica",
+    "matematicas": "Matemáticas",
+    "sociales": "Sociales y Ciudadanas",
+    "ciencias_naturales": "Ciencias Naturales",
+    "ingles": "Inglés",
+}
+
+# El puntaje global va de 0 a 500; los puntajes por área y los percentiles, de 0 a 100.
+RANGO_PUNTAJE_GENERAL = 500
+RANGO_PUNTAJE_AREA = 100
+RANGO_PERCENTIL = 100
+
+CUANTILES = (0.25, 0.5, 0.75, 0.9)
+NUM_BINS_HISTOGRAMA = 10
+
+UMBRALES_PUNTAJE_GENERAL = (250, 300, 350)
+UMBRALES_PUNTAJE_AREA = (50, 60, 70)
+UMBRALES_PERCENTIL = (50, 75, 90)
+
+
+def _columnas_estadisticas(df: pd.DataFrame) -> List[str]:
+    columnas = []
+    for prefijo in ("puntaje", "percentil"):
+        for clave in AREAS:
+            col = f"{prefijo}_{clave}"
+            if col in df.columns:
+                columnas.append(col)
+    return columnas
+
+
+def _rango_columna(col: str) -> int:
+    if col == "puntaje_general":
+        return RANGO_PUNTAJE_GENERAL
+    if col.startswith("percentil_"):
+        return RANGO_PERCENTIL
+    return RANGO_PUNTAJE_AREA
+
+
+def _umbrales_columna(col: str) -> Sequence[int]:
+    if col == "puntaje_general":
+        return UMBRALES_PUNTAJE_GENERAL
+    if col.startswith("percentil_"):
+        return UMBRALES_PERCENTIL
+    return UMBRALES_PUNTAJE_AREA
+
+
+def _a_float(valor) -> float | None:
+    return None if np.isnan(valor) else round(float(valor), 2)
+
+
+def calcular_estadisticas(df: pd.DataFrame) -> Dict:
+    """
+    Calcula estadísticas agregadas de las columnas puntaje_*/percentil_*.
+    Todas las columnas se procesan a la vez como una matriz NumPy.
+    """
+    columnas = _columnas_estadisticas(df)
+    total = len(df)
+
+    if not columnas or total == 0:
+        return {"total": total, "columnas": [], "histogramas": {}}
+
+    valores = (
+        df[columnas]
+        .apply(pd.to_numeric, errors="coerce")
+        .to_numpy(dtype=np.float64, na_value=np.nan)
+    )
+    validos = ~np.isnan(valores)
+    conteos = validos.sum(axis=0)
+
+    # Las columnas sin ningún valor producen NaN; se reportan como None.
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        medias = np.nanmean(valores, axis=0)
+        desviaciones = np.nanstd(valores, axis=0)
+        minimos = np.nanmin(valores, axis=0)
+        maximos = np.nanmax(valores, axis=0)
+        cuantiles = np.nanquantile(valores, CUANTILES, axis=0)
+
+    resumen: List[Dict] = []
+    histogramas: Dict[str, Dict] = {}
+
+    for i, col in enumerate(columnas):
+        prefijo, clave = col.split("_", 1)
+        datos_col = valores[validos[:, i], i]
+        n = int(conteos[i])
+
+        umbrales = {}
+        for umbral in _umbrales_columna(col):
+            umbrales[umbral] = (
+                round(float(np.count_nonzero(datos_col >= umbral)) / n, 4) if n else None
+            )
+
+        resumen.append(
+            {
+                "columna": col,
+                "tipo": prefijo,
+                "area": AREAS.get(clave, clave),
+                "n": n,
+                "media": _a_float(medias[i]),
+                "desviacion": _a_float(desviaciones[i]),
+                "minimo": _a_float(minimos[i]),
+                "maximo": _a_float(maximos[i]),
+                "cuantiles": {q: _a_float(v) for q, v in zip(CUANTILES, cuantiles[:, i])},
+                "mediana": _a_float(cuantiles[CUANTILES.index(0.5), i]),
+                "proporcion_sobre_umbral": umbrales,
+            }
+        )
+
+        conteo_bins, bordes = np.histogram(
+            datos_col, bins=NUM_BINS_HISTOGRAMA, range=(0, _rango_columna(col))
+        )
+        histogramas[col] = {
+            "bordes": bordes.astype(int).tolist(),
+            "conteos": conteo_bins.tolist(),
+        }
+
+    return {"total": total, "columnas": resumen, "histogramas": histogramas}
+
+
+def estadisticas_a_dataframe(estadisticas: Dict) -> pd.DataFrame:
+    """
+    Aplana las estadísticas en una tabla (una fila por columna) para exportarla.
+    """
+    filas = []
+    for item in estadisticas.get("columnas", []):
+        fila = {
+            "columna": item["columna"],
+            "area": item["area"],
+            "n": item["n"],
+            "media": item["media"],
+            "mediana": item["mediana"],
+            "desviacion": item["desviacion"],
+            "minimo": item["minimo"],
+            "maximo": item["maximo"],
+        }
+        for q, v in item["cuantiles"].items():
+            fila[f"p{int(q * 100)}"] = v
+        for umbral, proporcion in item["proporcion_sobre_umbral"].items():
+            fila[f">= {umbral}"] = proporcion
+        filas.append(fila)
+    return pd.DataFrame(filas)
+
+
+def histogramas_a_dataframe(estadisticas: Dict) -> pd.DataFrame:
+    """
+    Convierte los histogramas en formato largo: columna, rango del bin y conteo.
+    """
+    filas = []
+    for col, hist in estadisticas.get("histogramas", {}).items():
+        bordes = hist["bordes"]
+        for desde, hasta, conteo in zip(bordes[:-1], bordes[1:], hist["conteos"]):
+            filas.append(
+                {"columna": col, "desde": desde, "hasta": hasta, "conteo": conteo}
+            )
+    return pd.DataFrame(filas, columns=["columna", "desde", "hasta", "conteo"])
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import BinaryIO, Tuple
+
+from config import UPLOAD_DIR, UPLOAD_RETENCION_DIAS
+
+TAMANO_BLOQUE = 64 * 1024
+
+# La retención puede borrar la carpeta del shard (o el archivo) justo entre el
+# mkdir y el os.replace de otra petición: se reintenta esa parte.
+INTENTOS_MOVER = 3
+
+
+def ruta_por_contenido(sha256: str, extension: str) -> Path:
+    return UPLOAD_DIR / sha256[:2] / f"{sha256}{extension}"
+
+
+def guardar_upload(stream: BinaryIO, extension: str) -> Tuple[str, Path]:
+    """
+    Copia el archivo subido a disco por bloques calculando su SHA-256 al mismo
+    tiempo, y lo deja en uploads/<2 primeros>/<sha256><extension>. Si ya había
+    un archivo con el mismo contenido, se conserva ese y se descarta la copia.
+    """
+    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    sha = hashlib.sha256()
+
+    fd, tmp = tempfile.mkstemp(dir=str(UPLOAD_DIR), suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as destino:
+            while True:
+                bloque = stream.read(TAMANO_BLOQUE)
+                if not bloque:
+                    break
+                sha.update(bloque)
+                destino.write(bloque)
+
+        digest = sha.hexdigest()
+        path = ruta_por_contenido(digest, extension)
+        _mover_a_destino(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+    return digest, path
+
+
+def _mover_a_destino(tmp: str, path: Path) -> None:
+    for intento in range(1, INTENTOS_MOVER + 1):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            if path.exists():
+                # Refresca la fecha para que la retención cuente desde el último uso.
+                os.utime(path)
+                os.unlink(tmp)
+            else:
+                os.replace(tmp, path)
+            return
+        except FileNotFoundError:
+            if intento == INTENTOS_MOVER:
+                raise
+
+
+def limpiar_uploads(max_dias: float = UPLOAD_RETENCION_DIAS) -> int:
+    """
+    Elimina los uploads (y copias parciales) sin uso en los últimos `max_dias`.
+    """
+    if not UPLOAD_DIR.exists():
+        return 0
+    limite = time.time() - max_dias * 86400
+    eliminados = 0
+    for path in UPLOAD_DIR.rglob("*"):
+        try:
+            if path.is_file() and path.stat().st_mtime < limite:
+                path.unlink(missing_ok=True)
+                eliminados += 1
+        except FileNotFoundError:
+            continue
+    for carpeta in UPLOAD_DIR.iterdir():
+        # Otra petición puede estar guardando en la carpeta: si ya no está
+        # vacía (o ya no existe) se deja para la próxima limpieza.
+        try:
+            if carpeta.is_dir() and not any(carpeta.iterdir()):
+                carpeta.rmdir()
+        except OSError:
+            continue
+    if eliminados:
+        print(f"Retención de uploads: {eliminados} archivos eliminados")
+    return eliminados
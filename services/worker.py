@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import multiprocessing.connection
+import os
+import socket
+import threading
+import time
+from typing import Dict, Optional
+
+from config import asegurar_directorios
+from automation.icfes_client import NavegadorCompartido
+from services.job_queue import LEASE_SEGUNDOS, Tarea, crear_cola
+from services.results_service import consultar_un_estudiante
+
+# Módulos pesados que el proceso padre carga una sola vez en el forkserver; cada
+# worker nuevo nace de un fork con todo ya importado.
+MODULOS_PRECARGA = [
+    "services.results_service",
+    "playwright.sync_api",
+    "requests",
+]
+
+
+class _Latido(threading.Thread):
+    """
+    Renueva el arriendo de la tarea mientras el worker la procesa.
+    """
+
+    def __init__(self, cola, tarea: Tarea, worker_id: str, lease_segundos: float):
+        super().__init__(daemon=True)
+        self.cola = cola
+        self.tarea = tarea
+        self.worker_id = worker_id
+        self.lease_segundos = lease_segundos
+        self._parar = threading.Event()
+
+    def run(self) -> None:
+        while not self._parar.wait(self.lease_segundos / 3):
+            if not self.cola.latido(self.tarea, self.worker_id, self.lease_segundos):
+                print(f"⚠ Arriendo perdido: {self.tarea.job_id}:{self.tarea.indice}")
+                return
+
+    def detener(self) -> None:
+        self._parar.set()
+        self.join()
+
+
+def _worker_id_por_defecto() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def ejecutar_worker(
+    cola=None,
+    worker_id: str | None = None,
+    lease_segundos: float = LEASE_SEGUNDOS,
+    espera_vacia: float = 2.0,
+    salir_si_vacia: bool = False,
+    max_tareas: Optional[int] = None,
+    navegador: NavegadorCompartido | None = None,
+) -> int:
+    """
+    Bucle de un worker sin estado: toma filas de la cola, las consulta y
+    devuelve el resultado. Retorna el número de tareas completadas.
+    Con `navegador` todas las consultas del worker reutilizan el mismo Chromium.
+    """
+    cola = cola or crear_cola()
+    worker_id = worker_id or _worker_id_por_defecto()
+    opciones_por_job: Dict[str, Dict] = {}
+    completadas = 0
+
+    print(f"Worker {worker_id} iniciado")
+
+    while max_tareas is None or completadas < max_tareas:
+        tarea = cola.arrendar(worker_id, lease_segundos)
+        if tarea is None:
+            if salir_si_vacia:
+                break
+            time.sleep(espera_vacia)
+            continue
+
+        if tarea.job_id not in opciones_por_job:
+            opciones_por_job[tarea.job_id] = cola.opciones(tarea.job_id)
+        opciones = opciones_por_job[tarea.job_id]
+
+        print(
+            f"[{worker_id}] {tarea.job_id}:{tarea.indice} "
+            f"(intento {tarea.intentos}) → {tarea.payload.get('numero_documento')}"
+        )
+
+        latido = _Latido(cola, tarea, worker_id, lease_segundos)
+        latido.start()
+        try:
+            resultado = consultar_un_estudiante(
+                tipo_documento=tarea.payload.get("tipo_documento", ""),
+                numero_documento=tarea.payload.get("numero_documento", ""),
+                fecha_nacimiento=tarea.payload.get("fecha_nacimiento", ""),
+                numero_registro=tarea.payload.get("numero_registro", ""),
+                take_screenshot=bool(opciones.get("take_screenshot")),
+                # Las trazas van bajo el id del trabajo de la app, el que
+                # muestra /jobs/<id>.
+                job_id=opciones.get("job_id") or tarea.job_id,
+                navegador=navegador,
+            )
+        finally:
+            latido.detener()
+
+        if cola.completar(tarea, worker_id, resultado):
+            completadas += 1
+        else:
+            print(f"⚠ Resultado descartado: la tarea {tarea.job_id}:{tarea.indice} fue reasignada")
+
+    print(f"Worker {worker_id} finalizado: {completadas} tareas completadas")
+    return completadas
+
+
+def _proceso_worker(url_cola: str, lease_segundos: float, salir_si_vacia: bool) -> None:
+    asegurar_directorios()
+    navegador = NavegadorCompartido()
+    try:
+        # El navegador se lanza antes de pedir la primera tarea: el arriendo
+        # no se gasta esperando a que arranque Chromium. Si falla, se vuelve a
+        # intentar con cada consulta y el error queda en la fila.
+        try:
+            navegador.calentar()
+        except Exception as e:
+            print(f"⚠ No se pudo precalentar el navegador: {e}")
+        ejecutar_worker(
+            cola=crear_cola(url_cola),
+            lease_segundos=lease_segundos,
+            salir_si_vacia=salir_si_vacia,
+            navegador=navegador,
+        )
+    finally:
+        navegador.cerrar()
+
+
+def _contexto_procesos():
+    """
+    forkserver (POSIX) con los módulos pesados precargados; spawn en Windows.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        contexto = multiprocessing.get_context("forkserver")
+        contexto.set_forkserver_preload(MODULOS_PRECARGA)
+        return contexto
+    return multiprocessing.get_context("spawn")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Worker de consultas ICFES conectado a una cola compartida."
+    )
+    parser.add_argument("--cola", default="", help="Ruta SQLite o URL redis:// (por defecto JOB_QUEUE_URL)")
+    parser.add_argument("--procesos", type=int, default=1, help="Número de workers en esta máquina")
+    parser.add_argument("--lease", type=float, default=LEASE_SEGUNDOS, help="Segundos de arriendo por tarea")
+    parser.add_argument("--salir-si-vacia", action="store_true", help="Terminar cuando no queden tareas")
+    args = parser.parse_args(argv)
+
+    if args.procesos <= 1:
+        _proceso_worker(args.cola, args.lease, args.salir_si_vacia)
+        return
+
+    contexto = _contexto_procesos()
+
+    def lanzar():
+        proceso = contexto.Process(
+            target=_proceso_worker,
+            args=(args.cola, args.lease, args.salir_si_vacia),
+        )
+        proceso.start()
+        return proceso
+
+    vivos = {}
+    for _ in range(args.procesos):
+        proceso = lanzar()
+        vivos[proceso.sentinel] = proceso
+
+    # Un worker que muere se reemplaza; el nuevo sale del forkserver ya
+    # precargado, así que reponerlo bajo carga es rápido.
+    while vivos:
+        for sentinel in multiprocessing.connection.wait(list(vivos)):
+            proceso = vivos.pop(sentinel)
+            if proceso.exitcode != 0 and not args.salir_si_vacia:
+                print(f"⚠ Worker {proceso.pid} terminó con código {proceso.exitcode}; lanzando reemplazo")
+                nuevo = lanzar()
+                vivos[nuevo.sentinel] = nuevo
+
+
+if __name__ == "__main__":
+    main()
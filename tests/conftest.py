@@ -0,0 +1,53 @@
+import sys
+
+import pytest
+
+from services import job_store, uploads_service
+from tests.fixtures.corpus import casos, cargar_golden, generar_html
+
+
+@pytest.fixture(scope="session")
+def corpus():
+    """Páginas sintéticas por nombre de caso: (html, esperado)."""
+    golden = cargar_golden()
+    return {caso["caso"]: (generar_html(caso), golden[caso["caso"]]) for caso in casos()}
+
+
+@pytest.fixture
+def directorios(tmp_path, monkeypatch):
+    """Uploads, trabajos, consultas manuales e índice de uploads dentro de tmp_path."""
+    monkeypatch.setattr(uploads_service, "UPLOAD_DIR", tmp_path / "uploads")
+    monkeypatch.setattr(job_store, "JOBS_DIR", tmp_path / "jobs")
+    monkeypatch.setattr(job_store, "CONSULTAS_DIR", tmp_path / "consultas")
+    monkeypatch.setattr(job_store, "INDICE_UPLOADS", tmp_path / "jobs" / "indice_uploads.json")
+    return tmp_path
+
+
+@pytest.fixture
+def app_flask(directorios, monkeypatch):
+    """
+    La app Flask con todas sus carpetas en tmp_path. Importar `app` llama a
+    asegurar_directorios(), así que se importa de nuevo con config apuntando a
+    tmp_path para no crear carpetas en el checkout.
+    """
+    import config
+    from automation import tracing
+
+    carpetas = {
+        "DATA_DIR": directorios / "data",
+        "EXPORT_DIR": directorios / "exports",
+        "SCREENSHOT_DIR": directorios / "screenshots",
+        "UPLOAD_DIR": uploads_service.UPLOAD_DIR,
+        "JOBS_DIR": job_store.JOBS_DIR,
+        "CONSULTAS_DIR": job_store.CONSULTAS_DIR,
+        "TRACE_DIR": directorios / "trazas",
+    }
+    for nombre, ruta in carpetas.items():
+        monkeypatch.setattr(config, nombre, ruta)
+    monkeypatch.setattr(tracing, "TRACE_DIR", carpetas["TRACE_DIR"])
+
+    monkeypatch.delitem(sys.modules, "app", raising=False)
+    import app as modulo_app
+
+    yield modulo_app.app
+    sys.modules.pop("app", None)
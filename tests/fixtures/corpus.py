@@ -0,0 +1,229 @@
+"""
+Corpus sintético de páginas de resultados del ICFES para probar
+scraping.icfes_parser.
+
+Cada caso se describe con un dict (nombre, puntajes, percentiles y variante de
+layout); `generar_html` construye la página imitando la estructura del portal
+real y `esperado` devuelve el dict que debe producir el parser. Los valores
+esperados se guardan en golden.json; para regenerarlo tras cambiar el corpus:
+
+    python -m tests.fixtures.corpus --actualizar [--html DIRECTORIO]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+from pathlib import Path
+from typing import Dict, List
+
+GOLDEN_PATH = Path(__file__).resolve().parent / "golden.json"
+
+AREAS = {
+    "lectura_critica": "Lectura Crítica",
+    "matematicas": "Matemáticas",
+    "sociales": "Sociales y Ciudadanas",
+    "ciencias_naturales": "Ciencias Naturales",
+    "ingles": "Inglés",
+}
+
+NOMBRES = ["ANA", "LUIS", "MARÍA", "JOSÉ", "VALENTINA", "SANTIAGO", "ISABELLA", "ANDRÉS"]
+APELLIDOS = ["GÓMEZ", "RODRÍGUEZ", "PÉREZ", "MARTÍNEZ", "NARVÁEZ", "PAYARES", "PUELLO", "TORRES"]
+
+# Bloques repetidos para que el tamaño de la página se parezca al del portal.
+_NUM_BLOQUES_RELLENO = 40
+
+
+def _caso_aleatorio(nombre_caso: str, semilla: int, **variante) -> Dict:
+    rnd = random.Random(semilla)
+    caso = {
+        "caso": nombre_caso,
+        "nombre": f"{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)} {rnd.choice(APELLIDOS)}",
+        "puntaje_general": rnd.randint(150, 480),
+        "percentil_general": rnd.randint(1, 100),
+        "puntajes": {clave: rnd.randint(20, 100) for clave in AREAS},
+        "percentiles": {clave: rnd.randint(1, 100) for clave in AREAS},
+        "layout": "resultados",
+    }
+    caso.update(variante)
+    return caso
+
+
+def casos() -> List[Dict]:
+    lista = [_caso_aleatorio(f"completo_{i}", semilla=i) for i in range(1, 6)]
+
+    sin_ingles = _caso_aleatorio("sin_ingles", semilla=10)
+    del sin_ingles["puntajes"]["ingles"]
+    del sin_ingles["percentiles"]["ingles"]
+    lista.append(sin_ingles)
+
+    sin_percentiles = _caso_aleatorio("sin_percentiles_area", semilla=11)
+    sin_percentiles["percentiles"] = {}
+    lista.append(sin_percentiles)
+
+    parcial = _caso_aleatorio("sin_percentil_matematicas_sociales", semilla=12)
+    del parcial["percentiles"]["matematicas"]
+    del parcial["percentiles"]["sociales"]
+    lista.append(parcial)
+
+    sin_pg = _caso_aleatorio("sin_percentil_general", semilla=13)
+    sin_pg["percentil_general"] = None
+    lista.append(sin_pg)
+
+    lista.append(_caso_aleatorio("puntaje_general_sin_componente", semilla=14, layout="sin_componente"))
+    lista.append(_caso_aleatorio("puntajes_con_texto", semilla=15, layout="con_texto"))
+
+    sin_nombre = _caso_aleatorio("sin_nombre", semilla=16)
+    sin_nombre["nombre"] = None
+    lista.append(sin_nombre)
+
+    lista.append({"caso": "error_sin_resultados", "layout": "error_sin_resultados"})
+    lista.append({"caso": "error_login", "layout": "error_login"})
+    lista.append({"caso": "error_pagina_vacia", "layout": "error_vacia"})
+    return lista
+
+
+def _relleno() -> str:
+    bloque = (
+        '<div class="row mb-2"><div class="col-md-6"><p class="texto-ayuda">'
+        "Consulta la guía de interpretación de resultados para conocer el "
+        "significado de cada nivel de desempeño.</p></div>"
+        '<div class="col-md-6"><ul class="lista-enlaces"><li><a href="#">Guía</a></li>'
+        '<li><a href="#">Preguntas frecuentes</a></li></ul></div></div>'
+    )
+    return bloque * _NUM_BLOQUES_RELLENO
+
+
+def _envolver(cuerpo: str) -> str:
+    return (
+        '<!DOCTYPE html><html lang="es"><head><meta charset="utf-8">'
+        "<title>Resultados Saber 11</title>"
+        '<script src="runtime.js"></script><script src="main.js"></script>'
+        "</head><body><app-root>"
+        f"{cuerpo}"
+        "</app-root></body></html>"
+    )
+
+
+def generar_html(caso: Dict) -> str:
+    layout = caso["layout"]
+
+    if layout == "error_sin_resultados":
+        return _envolver(
+            '<icfes-navbar><button></button></icfes-navbar>'
+            '<div class="alert alert-danger">No se encontraron resultados para los '
+            "datos ingresados.</div>" + _relleno()
+        )
+    if layout == "error_login":
+        return _envolver(
+            '<form><icfes-selector-reactivo formcontrolname="tipoIdentificacion">'
+            '<div class="ng-select-container"></div></icfes-selector-reactivo>'
+            '<input id="identificacion"><input id="fechaNacimiento">'
+            '<iframe title="reCAPTCHA" src="https://www.google.com/recaptcha/api2/anchor?k=abc"></iframe>'
+            '<button type="submit" disabled>Ingresar</button></form>'
+        )
+    if layout == "error_vacia":
+        return _envolver("")
+
+    sufijo = " pts" if layout == "con_texto" else ""
+    partes = ['<icfes-navbar><button>']
+    if caso["nombre"] is not None:
+        partes.append(f'<span class="nombreCompleto">{caso["nombre"]}</span>')
+    partes.append("</button></icfes-navbar>")
+    partes.append(_relleno())
+
+    span_general = f'<span class="texto-puntaje-principal">{caso["puntaje_general"]}{sufijo}</span>'
+    if layout == "sin_componente":
+        partes.append(f'<div class="puntaje-global">{span_general}</div>')
+    else:
+        partes.append(
+            "<icfes-puntaje-general><div class=\"card\">"
+            f'<span class="titulo">Puntaje global</span>{span_general}'
+            "</div></icfes-puntaje-general>"
+        )
+
+    if caso["percentil_general"] is not None:
+        partes.append(
+            '<div class="percentil-general">'
+            '<div><span class="texto">Estudiantes a nivel nacional</span></div>'
+            '<div><span class="texto-secundario">Su puntaje es superior al</span></div>'
+            f'<div><span class="texto-puntaje-principal">{caso["percentil_general"]}{sufijo}</span>'
+            "<span>%</span></div></div>"
+        )
+
+    partes.append('<ul class="nav nav-tabs">')
+    for clave, etiqueta in AREAS.items():
+        if clave not in caso["puntajes"]:
+            continue
+        partes.append(
+            '<li class="nav-item"><a class="nav-link">'
+            f'<span class="title-tab">{etiqueta}</span>'
+            f'<span class="superior">{caso["puntajes"][clave]}{sufijo}</span>'
+            '<span class="inferior">/100</span></a></li>'
+        )
+    partes.append("</ul>")
+
+    for clave, etiqueta in AREAS.items():
+        if clave not in caso["percentiles"]:
+            continue
+        partes.append(
+            '<div class="detalle-area">'
+            f'<p class="text-color-black">{etiqueta}</p>'
+            '<div class="grafica"><span class="etiqueta">Percentil</span>'
+            f'<span class="escalar">{caso["percentiles"][clave]}{sufijo}</span></div>'
+            "</div>"
+        )
+
+    partes.append(_relleno())
+    return _envolver("".join(partes))
+
+
+def esperado(caso: Dict) -> Dict:
+    if caso["layout"].startswith("error_"):
+        datos = {
+            "nombre_estudiante": None,
+            "puntaje_general": None,
+            "percentil_general": None,
+        }
+        for clave in AREAS:
+            datos[f"puntaje_{clave}"] = None
+            datos[f"percentil_{clave}"] = None
+        return datos
+
+    datos = {
+        "nombre_estudiante": caso["nombre"],
+        "puntaje_general": caso["puntaje_general"],
+        "percentil_general": caso["percentil_general"],
+    }
+    for clave in AREAS:
+        datos[f"puntaje_{clave}"] = caso["puntajes"].get(clave)
+        datos[f"percentil_{clave}"] = caso["percentiles"].get(clave)
+    return datos
+
+
+def cargar_golden() -> Dict[str, Dict]:
+    return json.loads(GOLDEN_PATH.read_text(encoding="utf-8"))
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Genera el corpus sintético del parser.")
+    parser.add_argument("--actualizar", action="store_true", help="Reescribe golden.json")
+    parser.add_argument("--html", type=Path, help="Directorio donde escribir las páginas")
+    args = parser.parse_args(argv)
+
+    if args.actualizar:
+        golden = {caso["caso"]: esperado(caso) for caso in casos()}
+        GOLDEN_PATH.write_text(
+            json.dumps(golden, ensure_ascii=False, indent=2) + "\n", encoding="utf-8"
+        )
+        print(f"golden.json actualizado ({len(golden)} casos)")
+
+    if args.html:
+        args.html.mkdir(parents=True, exist_ok=True)
+        for caso in casos():
+            (args.html / f"{caso['caso']}.html").write_text(generar_html(caso), encoding="utf-8")
+        print(f"Páginas escritas en {args.html}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import io
+
+import pandas as pd
+import pytest
+
+from automation import tracing
+from services import job_store
+
+
+@pytest.fixture
+def job_colegio_a(app_flask):
+    df = pd.DataFrame([{"numero_documento": "1", "nombre_estudiante": "Estudiante A", "puntaje_general": 350, "error": None}])
+    job = job_store.crear_job("aaa", "estudiantes.xlsx", {"take_screenshot": False}, tenant="colegio_a")
+    job_store.guardar_resultados(job["id"], df)
+
+    traza = tracing.TRACE_DIR / job["id"] / "20260101_000000_1"
+    traza.mkdir(parents=True)
+    (traza / tracing.ARCHIVO_TRAZA).write_bytes(b"zip")
+    (traza / tracing.ARCHIVO_META).write_text('{"duracion_s": 90}', encoding="utf-8")
+    return job["id"]
+
+
+@pytest.mark.parametrize(
+    "ruta",
+    ["/jobs/{id}", "/jobs/{id}/download/csv", "/jobs/{id}/download/zip", "/trazas/{id}/20260101_000000_1/trace.zip"],
+)
+def test_rutas_de_un_trabajo_solo_para_su_tenant(app_flask, job_colegio_a, ruta):
+    cliente = app_flask.test_client()
+    url = ruta.format(id=job_colegio_a)
+
+    assert cliente.get(url, headers={"X-Tenant": "colegio_a"}).status_code == 200
+
+    respuesta = cliente.get(url, headers={"X-Tenant": "colegio_b"})
+    assert respuesta.status_code == 302
+    assert job_colegio_a not in respuesta.headers["Location"]
+
+
+def test_trazas_listan_solo_trabajos_del_tenant(app_flask, job_colegio_a):
+    cliente = app_flask.test_client()
+    propio = cliente.get("/trazas", headers={"X-Tenant": "colegio_a"}).get_data(as_text=True)
+    ajeno = cliente.get(f"/trazas?job={job_colegio_a}", headers={"X-Tenant": "colegio_b"}).get_data(as_text=True)
+
+    assert job_colegio_a in propio
+    assert job_colegio_a not in ajeno
+
+
+def test_mismo_archivo_de_dos_tenants_crea_trabajos_separados(app_flask, monkeypatch):
+    from services import results_service
+
+    consultas = []
+
+    def consultar(**kwargs):
+        consultas.append(kwargs["tenant"])
+        return pd.DataFrame([{"numero_documento": "1", "puntaje_general": 350, "error": None}])
+
+    monkeypatch.setattr(results_service, "consultar_desde_excel", consultar)
+    cliente = app_flask.test_client()
+
+    def subir(tenant):
+        respuesta = cliente.post(
+            "/consulta-excel",
+            data={"archivo": (io.BytesIO(b"mismo excel"), "estudiantes.xlsx")},
+            headers={"X-Tenant": tenant},
+        )
+        return respuesta.headers["Location"].rsplit("/", 1)[-1]
+
+    primero_a = subir("colegio_a")
+    primero_b = subir("colegio_b")
+    segundo_a = subir("colegio_a")
+
+    assert primero_b != primero_a
+    assert job_store.cargar_job(primero_b)["tenant"] == "colegio_b"
+    # El mismo tenant sí reutiliza su trabajo sin volver a consultar.
+    assert segundo_a == primero_a
+    assert consultas == ["colegio_a", "colegio_b"]
@@ -0,0 +1,140 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import automation.icfes_client_async as cliente_async
+import services.results_service as results_service
+from automation import icfes_client
+from automation.deadline import Deadline
+from automation.icfes_client import FetchResult
+from services import async_service, job_store
+
+CONSULTA = {"tipo_documento": "TI", "numero_documento": "123", "fecha_nacimiento": "2007-05-01"}
+
+pytestmark = pytest.mark.usefixtures("directorios")
+
+
+def _esperar(consulta_id, limite_s=5):
+    limite = time.monotonic() + limite_s
+    while time.monotonic() < limite:
+        consulta = async_service.obtener_consulta(consulta_id)
+        if consulta["estado"] == "completada":
+            return consulta["resultado"]
+        time.sleep(0.01)
+    raise AssertionError("la consulta nunca terminó")
+
+
+def test_parseo_corre_fuera_del_loop(corpus, monkeypatch):
+    html, golden = corpus["completo_1"]
+    hilos = []
+    armar_original = results_service._armar_resultado
+
+    async def fetch_falso(params, take_screenshot=False, deadline=None):
+        hilos.append(threading.current_thread().name)
+        return FetchResult(html=html)
+
+    def armar(params, fetch_result, deadline=None):
+        hilos.append(threading.current_thread().name)
+        return armar_original(params, fetch_result, deadline)
+
+    monkeypatch.setattr(cliente_async, "fetch_results_page_async", fetch_falso)
+    monkeypatch.setattr(results_service, "_armar_resultado", armar)
+
+    resultado = _esperar(async_service.iniciar_consulta(**CONSULTA))
+
+    assert resultado["puntaje_general"] == golden["puntaje_general"]
+    assert resultado["error"] is None
+    assert hilos[0] == "icfes-async"
+    assert hilos[1] != "icfes-async"
+
+
+def test_error_en_la_consulta_queda_en_el_resultado(monkeypatch):
+    async def fetch_falso(params, take_screenshot=False, deadline=None):
+        raise RuntimeError("Portal caído")
+
+    monkeypatch.setattr(cliente_async, "fetch_results_page_async", fetch_falso)
+
+    resultado = _esperar(async_service.iniciar_consulta(**CONSULTA))
+    assert resultado["error"] == "Portal caído"
+    assert resultado["numero_documento"] == "123"
+
+
+@pytest.mark.parametrize("falla", ["planificador", "importacion"])
+def test_error_fuera_de_la_consulta_no_la_deja_pendiente(falla, monkeypatch):
+    if falla == "planificador":
+        def planificador_roto():
+            raise RuntimeError("planificador roto")
+
+        monkeypatch.setattr(async_service, "obtener_planificador", planificador_roto)
+        mensaje = "planificador roto"
+    else:
+        monkeypatch.delattr(cliente_async, "fetch_results_page_async")
+        mensaje = "fetch_results_page_async"
+
+    resultado = _esperar(async_service.iniciar_consulta(**CONSULTA))
+    assert mensaje in resultado["error"]
+    assert resultado["numero_documento"] == "123"
+
+
+def test_estado_de_la_consulta_queda_en_disco(monkeypatch):
+    async def fetch_falso(params, take_screenshot=False, deadline=None):
+        raise RuntimeError("Portal caído")
+
+    monkeypatch.setattr(cliente_async, "fetch_results_page_async", fetch_falso)
+
+    consulta_id = async_service.iniciar_consulta(**CONSULTA)
+    _esperar(consulta_id)
+
+    # Otro proceso de la app solo ve lo que quedó en data/consultas/.
+    guardada = job_store.cargar_consulta(consulta_id)
+    assert guardada["estado"] == "completada"
+    assert guardada["resultado"]["error"] == "Portal caído"
+
+    assert job_store.purgar_consultas(time.time() - 60) == 0
+    assert job_store.purgar_consultas(time.time() + 1) == 1
+    assert async_service.obtener_consulta(consulta_id) is None
+
+
+class _LocalizadorAsync:
+    def __init__(self, visible):
+        self.visible = visible
+        self.first = self
+
+    async def count(self):
+        return 1 if self.visible else 0
+
+    async def is_visible(self):
+        return self.visible
+
+    async def click(self, timeout=None):
+        raise AssertionError("no había desafío que cerrar")
+
+
+class _PaginaAsync:
+    def locator(self, selector):
+        return _LocalizadorAsync(visible=False)
+
+
+def test_pasos_compartidos_corren_sobre_la_api_asincrona(monkeypatch):
+    pausas = []
+
+    async def sleep_async(self, segundos):
+        pausas.append(segundos)
+
+    monkeypatch.setattr(Deadline, "sleep_async", sleep_async)
+    deadline = Deadline(60)
+    pasos = icfes_client._handle_recaptcha_challenge(_PaginaAsync(), deadline)
+    asyncio.run(cliente_async._conducir_async(pasos, deadline))
+    assert pausas == [2]
+
+
+def test_un_navegador_por_event_loop():
+    async def navegadores():
+        return cliente_async.navegador_del_loop(), cliente_async.navegador_del_loop()
+
+    primero, mismo = asyncio.run(navegadores())
+    otro, _ = asyncio.run(navegadores())
+    assert primero is mismo
+    assert otro is not primero
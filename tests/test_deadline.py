@@ -0,0 +1,231 @@
+import asyncio
+
+import pytest
+
+import automation.deadline as modulo_deadline
+from automation import icfes_client
+from automation.deadline import ConsultaTimeoutError, Deadline
+
+
+class _RelojFalso:
+    """
+    Reemplaza al módulo time dentro de automation.deadline: sleep avanza el
+    reloj en vez de esperar.
+    """
+
+    def __init__(self):
+        self.ahora = 1000.0
+        self.esperas = []
+
+    def monotonic(self):
+        return self.ahora
+
+    def sleep(self, segundos):
+        self.esperas.append(segundos)
+        self.ahora += segundos
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = _RelojFalso()
+    monkeypatch.setattr(modulo_deadline, "time", reloj)
+    return reloj
+
+
+class _PaginaFalsa:
+    """
+    Página síncrona mínima para _handle_recaptcha_challenge: el desafío sigue
+    visible (o no) según `desafio_visible`, y registra los timeouts por defecto.
+    """
+
+    def __init__(self, desafio_visible):
+        self.desafio_visible = desafio_visible
+        self.timeouts = []
+        self.clics = 0
+
+    def locator(self, selector):
+        return _LocalizadorFalso(self, selector)
+
+    def set_default_timeout(self, timeout):
+        self.timeouts.append(timeout)
+
+    def set_default_navigation_timeout(self, timeout):
+        pass
+
+
+class _LocalizadorFalso:
+    def __init__(self, page, selector):
+        self.page = page
+        self.selector = selector
+        self.first = self
+
+    def _visible(self):
+        if self.selector == icfes_client._SELECTOR_FRAME_DESAFIO:
+            return self.page.desafio_visible
+        return self.selector == icfes_client._SELECTOR_BTN_VERIFICAR and self.page.desafio_visible
+
+    def count(self):
+        return 1 if self._visible() else 0
+
+    def is_visible(self):
+        return self._visible()
+
+    def click(self, timeout=None):
+        assert timeout is not None
+        self.page.clics += 1
+
+
+def test_timeout_ms_se_recorta_al_restante(reloj):
+    deadline = Deadline(10)
+    assert deadline.timeout_ms(30000) == 10000
+    assert deadline.timeout_ms(2000) == 2000
+
+    reloj.ahora += 9.5
+    assert deadline.restante() == pytest.approx(0.5)
+    assert deadline.timeout_ms(30000) == pytest.approx(500)
+
+    reloj.ahora += 1
+    assert deadline.vencido()
+    with pytest.raises(ConsultaTimeoutError):
+        deadline.timeout_ms(30000)
+
+
+def test_sleep_no_excede_el_presupuesto(reloj):
+    deadline = Deadline(5)
+    deadline.sleep(2)
+    with pytest.raises(ConsultaTimeoutError) as exc:
+        deadline.sleep(10)
+    assert reloj.esperas == [2, 3]
+    assert exc.value.presupuesto_s == 5
+
+
+def test_sleep_async_no_excede_el_presupuesto():
+    deadline = Deadline(0.05)
+    with pytest.raises(ConsultaTimeoutError):
+        asyncio.run(deadline.sleep_async(10))
+
+
+def test_etapa_convierte_errores_al_vencer(reloj):
+    deadline = Deadline(5)
+    with pytest.raises(ValueError):
+        with deadline.etapa("formulario"):
+            raise ValueError("falla normal")
+
+    with pytest.raises(ConsultaTimeoutError) as exc:
+        with deadline.etapa("captcha"):
+            reloj.ahora += 6
+            raise TimeoutError("timeout de Playwright")
+    assert exc.value.etapa == "captcha"
+    assert deadline.etapa_actual == "inicio"
+
+
+def test_pagina_vinculada_recorta_su_timeout_por_defecto(reloj):
+    page = _PaginaFalsa(desafio_visible=False)
+    deadline = Deadline(40)
+    deadline.vincular(page)
+    assert page.timeouts == [30000]
+
+    reloj.ahora += 25
+    with deadline.etapa("envio_y_resultados"):
+        assert page.timeouts[-1] == pytest.approx(15000)
+        deadline.sleep(5)
+    assert page.timeouts[-1] == pytest.approx(10000)
+
+
+def test_desafio_se_cierra_sin_reintentos(reloj):
+    page = _PaginaFalsa(desafio_visible=False)
+    deadline = Deadline(60)
+    icfes_client._conducir(icfes_client._handle_recaptcha_challenge(page, deadline), deadline)
+    assert page.clics == 0
+
+
+def test_desafio_persistente_agota_los_intentos(reloj):
+    page = _PaginaFalsa(desafio_visible=True)
+    deadline = Deadline(600)
+    with pytest.raises(RuntimeError, match="sigue abierto"):
+        icfes_client._conducir(icfes_client._handle_recaptcha_challenge(page, deadline), deadline)
+    assert page.clics == icfes_client.MAX_INTENTOS_DESAFIO
+
+
+def test_desafio_persistente_respeta_el_presupuesto(reloj):
+    page = _PaginaFalsa(desafio_visible=True)
+    deadline = Deadline(8)
+    with pytest.raises(ConsultaTimeoutError):
+        icfes_client._conducir(icfes_client._handle_recaptcha_challenge(page, deadline), deadline)
+    assert sum(reloj.esperas) == pytest.approx(8)
+
+
+class _RespuestaFalsa:
+    def __init__(self, datos):
+        self.datos = datos
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.datos
+
+
+def test_anticaptcha_en_proceso_se_corta_por_reloj(reloj, monkeypatch):
+    requests = pytest.importorskip("requests")
+    llamadas = []
+
+    def post(url, json, timeout):
+        llamadas.append((url.rsplit("/", 1)[-1], timeout))
+        reloj.ahora += 1
+        if url.endswith("createTask"):
+            return _RespuestaFalsa({"errorId": 0, "taskId": 7})
+        return _RespuestaFalsa({"errorId": 0, "status": "processing"})
+
+    monkeypatch.setattr(requests, "post", post)
+    deadline = Deadline(20)
+    with pytest.raises(ConsultaTimeoutError):
+        icfes_client._resolver_token_anticaptcha("https://x", "clave", deadline)
+
+    assert llamadas[0][0] == "createTask"
+    assert all(timeout <= 20 for _, timeout in llamadas)
+    # Cada sondeo toma 1 s + 2 s de espera: el reloj, no el número de
+    # sondeos, decide cuándo parar.
+    assert reloj.ahora - 1000 == pytest.approx(20)
+
+
+def test_anticaptcha_devuelve_el_token(reloj, monkeypatch):
+    requests = pytest.importorskip("requests")
+    respuestas = iter([
+        {"errorId": 0, "taskId": 7},
+        {"errorId": 0, "status": "processing"},
+        {"errorId": 0, "status": "ready", "solution": {"gRecaptchaResponse": "tok"}},
+    ])
+    monkeypatch.setattr(requests, "post", lambda url, json, timeout: _RespuestaFalsa(next(respuestas)))
+    assert icfes_client._resolver_token_anticaptcha("https://x", "clave", Deadline(60)) == "tok"
+
+
+def test_anticaptcha_error_de_red_sin_vencer(reloj, monkeypatch):
+    requests = pytest.importorskip("requests")
+
+    def post(url, json, timeout):
+        raise requests.ConnectionError("sin red")
+
+    monkeypatch.setattr(requests, "post", post)
+    with pytest.raises(RuntimeError, match="Error Anti-Captcha"):
+        icfes_client._resolver_token_anticaptcha("https://x", "clave", Deadline(60))
+
+
+def test_parseo_cuenta_dentro_del_presupuesto(corpus, reloj, monkeypatch):
+    from automation.icfes_client import FetchResult, LoginParams
+    from services import results_service
+
+    html, golden = corpus["completo_1"]
+    params = LoginParams(tipo_documento="TI", numero_documento="1")
+    assert results_service._armar_resultado(params, FetchResult(html=html), Deadline(5)).puntaje_general == golden["puntaje_general"]
+
+    parse_all = results_service.parse_all
+
+    def parseo_lento(html):
+        reloj.ahora += 10
+        return parse_all(html)
+
+    monkeypatch.setattr(results_service, "parse_all", parseo_lento)
+    with pytest.raises(ConsultaTimeoutError) as exc:
+        results_service._armar_resultado(params, FetchResult(html=html), Deadline(5))
+    assert exc.value.etapa == "parseo"
@@ -0,0 +1,62 @@
+import gzip
+import io
+import json
+import zipfile
+
+import pandas as pd
+import pytest
+
+from services import export_service, job_store
+
+
+@pytest.fixture
+def job(directorios):
+    screenshot = directorios / "resultado_1.png"
+    screenshot.write_bytes(b"\x89PNG falso")
+    df = pd.DataFrame(
+        [
+            {"numero_documento": "1", "puntaje_general": 350, "screenshot_path": str(screenshot), "error": None},
+            {"numero_documento": "2", "puntaje_general": None, "screenshot_path": None, "error": "x"},
+        ]
+    )
+    job = job_store.crear_job("abc123", "estudiantes.xlsx")
+    job_store.guardar_resultados(job["id"], df)
+    return job["id"]
+
+
+def test_exportacion_se_genera_al_pedirla_y_se_reutiliza(job):
+    assert not export_service.ruta_exportacion(job, "xlsx").exists()
+
+    path = export_service.obtener_exportacion(job, "csv")
+    assert path.exists()
+    assert not export_service.ruta_exportacion(job, "xlsx").exists()
+
+    mtime = path.stat().st_mtime_ns
+    assert export_service.obtener_exportacion(job, "csv") == path
+    assert path.stat().st_mtime_ns == mtime
+
+
+def test_exportacion_comprimida(job):
+    path = export_service.obtener_exportacion(job, "json", comprimido=True)
+    filas = json.loads(gzip.decompress(path.read_bytes()))
+    assert [f["numero_documento"] for f in filas] == ["1", "2"]
+
+    with pytest.raises(ValueError):
+        export_service.obtener_exportacion(job, "xlsx", comprimido=True)
+
+
+def test_zip_incluye_resultados_y_screenshots(job):
+    path = export_service.obtener_exportacion(job, "zip")
+    with zipfile.ZipFile(path) as zf:
+        assert sorted(zf.namelist()) == [
+            "resultados.csv",
+            "resultados.json",
+            "resultados.xlsx",
+            "screenshots/resultado_1.png",
+        ]
+        hoja = pd.read_excel(io.BytesIO(zf.read("resultados.xlsx")), sheet_name="Resultados")
+    assert len(hoja) == 2
+
+
+def test_job_sin_resultados(job):
+    assert export_service.obtener_exportacion("no_existe", "csv") is None
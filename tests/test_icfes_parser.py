@@ -0,0 +1,40 @@
+import pytest
+
+from scraping import icfes_parser
+from scraping.icfes_parser import parse_all
+from scraping.registro import CAMPOS_PARSEO
+from tests.fixtures.corpus import casos, cargar_golden, esperado
+
+NOMBRES_CASOS = [caso["caso"] for caso in casos()]
+
+
+@pytest.mark.parametrize("nombre", NOMBRES_CASOS)
+def test_parse_all_coincide_con_golden(corpus, nombre):
+    html, golden = corpus[nombre]
+    datos = parse_all(html)
+    assert datos == golden
+    assert tuple(datos) == CAMPOS_PARSEO
+
+
+def test_golden_cubre_todo_el_corpus():
+    golden = cargar_golden()
+    assert sorted(golden) == sorted(NOMBRES_CASOS)
+    for caso in casos():
+        assert golden[caso["caso"]] == esperado(caso), caso["caso"]
+
+
+def test_percentiles_area_externos_tienen_prioridad(corpus):
+    html, golden = corpus["completo_1"]
+    datos = parse_all(html, {"percentil_matematicas": 99})
+    assert datos["percentil_matematicas"] == 99
+    assert datos["percentil_lectura_critica"] == golden["percentil_lectura_critica"]
+
+
+def test_parse_all_reporta_error_de_parsing(monkeypatch):
+    def _falla(html, percentiles_area=None):
+        raise ValueError("html corrupto")
+
+    monkeypatch.setattr(icfes_parser, "parse_icfes_results", _falla)
+    datos = parse_all("<html></html>")
+    assert datos["error_parsing"] == "html corrupto"
+    assert all(datos[campo] is None for campo in CAMPOS_PARSEO)
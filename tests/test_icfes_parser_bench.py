@@ -0,0 +1,41 @@
+import tracemalloc
+
+import pytest
+
+from scraping.icfes_parser import parse_all
+
+CASOS_BENCHMARK = ["completo_1", "sin_percentiles_area", "sin_ingles", "error_sin_resultados"]
+
+# Pico de memoria aceptable al parsear una página (~30 KB de HTML).
+LIMITE_MEMORIA_KB = 8 * 1024
+
+
+def _memoria_pico_kb(html: str) -> float:
+    tracemalloc.start()
+    try:
+        parse_all(html)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return pico / 1024
+
+
+@pytest.mark.parametrize("nombre", CASOS_BENCHMARK)
+def test_tiempo_parseo_por_pagina(corpus, nombre, request):
+    # Solo esta prueba usa pytest-benchmark; la de memoria corre sin él.
+    pytest.importorskip("pytest_benchmark")
+    benchmark = request.getfixturevalue("benchmark")
+    html, golden = corpus[nombre]
+    benchmark.group = "parse_all"
+    benchmark.extra_info["tamano_html_kb"] = round(len(html.encode("utf-8")) / 1024, 1)
+    resultado = benchmark(parse_all, html)
+    assert resultado == golden
+
+
+@pytest.mark.parametrize("nombre", CASOS_BENCHMARK)
+def test_memoria_parseo_por_pagina(corpus, nombre):
+    # Prueba simple, no benchmark: tracemalloc frena el parseo, así que su
+    # tiempo no sirve como medida; lo que se mide es el pico de memoria.
+    html, _ = corpus[nombre]
+    pico_kb = _memoria_pico_kb(html)
+    assert pico_kb < LIMITE_MEMORIA_KB, f"pico de {pico_kb:.1f} KB al parsear '{nombre}'"
@@ -0,0 +1,161 @@
+import multiprocessing
+import os
+import time
+
+from services.job_queue import SQLiteJobQueue
+from services.results_service import _consultar_con_cola
+from services.scheduler import PRIORIDAD_MASIVA
+
+FILA = {"tipo_documento": "TI", "numero_documento": "1", "fecha_nacimiento": "2007-05-01"}
+
+
+def _filas(n):
+    return [dict(FILA, numero_documento=str(i)) for i in range(n)]
+
+
+def test_arriendo_vencido_se_reasigna(tmp_path):
+    cola = SQLiteJobQueue(tmp_path / "cola.sqlite3")
+    job_id = cola.crear_trabajo(_filas(1))
+
+    primera = cola.arrendar("w1", lease_segundos=0.05)
+    assert cola.arrendar("w2") is None
+    time.sleep(0.1)
+
+    segunda = cola.arrendar("w2")
+    assert (segunda.indice, segunda.intentos) == (primera.indice, 2)
+    # El worker que perdió el arriendo ya no puede renovarlo ni completarlo.
+    assert not cola.latido(primera, "w1")
+    assert not cola.completar(primera, "w1", {"worker": "w1"})
+    assert cola.completar(segunda, "w2", {"worker": "w2"})
+    assert cola.resultados(job_id) == [{"worker": "w2"}]
+
+
+def test_recuperar_vencidas_sin_workers(tmp_path):
+    cola = SQLiteJobQueue(tmp_path / "cola.sqlite3", max_intentos=2)
+    job_id = cola.crear_trabajo(_filas(2))
+    cola.arrendar("w1", lease_segundos=0.01)
+    time.sleep(0.05)
+
+    cola.recuperar_vencidas()
+    assert cola.estado(job_id)["pendiente"] == 2
+
+    # Segundo intento de la fila 0 también vencido: agota MAX_INTENTOS.
+    assert cola.arrendar("w1", lease_segundos=0.01).indice == 0
+    time.sleep(0.05)
+    cola.recuperar_vencidas()
+
+    estado = cola.estado(job_id)
+    assert (estado["completada"], estado["pendiente"]) == (1, 1)
+    agotada = cola.resultados(job_id)[0]
+    assert agotada["numero_documento"] == "0"
+    assert "abandonada tras 2 intentos" in agotada["error"]
+
+
+def test_resultados_combinan_completadas_y_workers_en_orden(tmp_path):
+    cola = SQLiteJobQueue(tmp_path / "cola.sqlite3")
+    job_id = cola.crear_trabajo(_filas(4), completadas={1: {"n": 1, "previa": True}})
+
+    tareas = [cola.arrendar("w1"), cola.arrendar("w1"), cola.arrendar("w1")]
+    assert [t.indice for t in tareas] == [0, 2, 3]
+    for tarea in reversed(tareas):
+        assert cola.completar(tarea, "w1", {"n": tarea.indice})
+
+    assert cola.resultados(job_id) == [{"n": 0}, {"n": 1, "previa": True}, {"n": 2}, {"n": 3}]
+
+
+def test_coordinador_abandona_si_no_hay_workers(tmp_path):
+    cola = SQLiteJobQueue(tmp_path / "cola.sqlite3")
+    filas = _filas(2) + [{"tipo_documento": "TI", "numero_documento": "", "fecha_nacimiento": ""}]
+
+    inicio = time.monotonic()
+    resultados = _consultar_con_cola(
+        filas, False, cola, PRIORIDAD_MASIVA, "", intervalo=0.02, sin_progreso_s=0.2
+    )
+
+    assert time.monotonic() - inicio < 5
+    assert [r["numero_documento"] for r in resultados] == ["0", "1", ""]
+    assert all("Sin workers" in r["error"] for r in resultados[:2])
+    assert resultados[2]["error"] == "Datos incompletos en la fila de entrada"
+
+
+def test_coordinador_respeta_timeout_total(tmp_path):
+    cola = SQLiteJobQueue(tmp_path / "cola.sqlite3")
+    resultados = _consultar_con_cola(
+        _filas(1), False, cola, PRIORIDAD_MASIVA, "", intervalo=0.02, timeout_s=0.1
+    )
+    assert "sin terminar" in resultados[0]["error"]
+
+
+def _worker_falso(ruta, job_id, worker_id, morir):
+    """
+    Worker sin navegador: completa cada fila con su número. Con `morir` toma
+    una fila y termina el proceso sin completarla ni soltar el arriendo.
+    """
+    cola = SQLiteJobQueue(ruta)
+    while cola.estado(job_id)["completada"] < cola.estado(job_id)["total"]:
+        tarea = cola.arrendar(worker_id, lease_segundos=0.5)
+        if tarea is None:
+            time.sleep(0.02)
+            continue
+        if morir:
+            os._exit(1)
+        time.sleep(0.01)
+        cola.completar(tarea, worker_id, {"n": tarea.indice, "worker": worker_id, "intentos": tarea.intentos})
+
+
+def test_varios_procesos_con_un_worker_caido(tmp_path):
+    ruta = tmp_path / "cola.sqlite3"
+    cola = SQLiteJobQueue(ruta)
+    job_id = cola.crear_trabajo(_filas(30))
+
+    contexto = multiprocessing.get_context("spawn")
+    caido = contexto.Process(target=_worker_falso, args=(ruta, job_id, "caido", True))
+    caido.start()
+    caido.join(30)
+    assert caido.exitcode == 1
+
+    workers = [
+        contexto.Process(target=_worker_falso, args=(ruta, job_id, f"w{i}", False))
+        for i in range(3)
+    ]
+    for proceso in workers:
+        proceso.start()
+    for proceso in workers:
+        proceso.join(60)
+        assert proceso.exitcode == 0
+
+    resultados = cola.resultados(job_id)
+    assert [r["n"] for r in resultados] == list(range(30))
+    assert {r["worker"] for r in resultados} <= {"w0", "w1", "w2"}
+    # La fila que tenía el worker caído se reintentó al vencer su arriendo.
+    assert resultados[0]["intentos"] == 2
+
+
+def test_coordinador_borra_el_trabajo_de_la_cola(tmp_path):
+    cola = SQLiteJobQueue(tmp_path / "cola.sqlite3")
+    filas = [{"tipo_documento": "TI", "numero_documento": "", "fecha_nacimiento": ""}]
+
+    resultados = _consultar_con_cola(filas, False, cola, PRIORIDAD_MASIVA, "", intervalo=0.02)
+
+    assert resultados[0]["error"] == "Datos incompletos en la fila de entrada"
+    with cola._conexion() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM trabajos").fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM tareas").fetchone()[0] == 0
+
+
+def test_purgar_trabajos_viejos_y_tareas_huerfanas(tmp_path):
+    cola = SQLiteJobQueue(tmp_path / "cola.sqlite3")
+    viejo = cola.crear_trabajo(_filas(2), tenant="colegio_a")
+    tarea = cola.arrendar("w1")
+    nuevo = cola.crear_trabajo(_filas(1))
+    with cola._conexion() as conn:
+        conn.execute("UPDATE trabajos SET creado = creado - 48 * 3600 WHERE id = ?", (viejo,))
+        conn.execute("UPDATE turnos_tenant SET ultimo = ultimo - 48 * 3600")
+
+    assert cola.purgar_trabajos(max_horas=24) == 1
+    assert cola.estado(viejo)["total"] == 0
+    assert cola.estado(nuevo)["total"] == 1
+    # El worker que tenía una tarea del trabajo purgado ya no puede completarla.
+    assert not cola.completar(tarea, "w1", {"n": 0})
+    with cola._conexion() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM turnos_tenant").fetchone()[0] == 0
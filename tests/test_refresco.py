@@ -0,0 +1,112 @@
+import io
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from scraping.registro import AREAS_RESULTADO, RegistroResultado
+from services import export_service, job_store, results_service, uploads_service
+from services.result_table import TablaResultados
+from services.results_service import calcular_delta, registros_reutilizables
+
+
+def _completo(numero, puntaje, horas=1):
+    registro = RegistroResultado(
+        tipo_documento="TI",
+        numero_documento=numero,
+        nombre_estudiante=f"Estudiante {numero}",
+        puntaje_general=puntaje,
+        consultado=(datetime.now() - timedelta(hours=horas)).isoformat(timespec="seconds"),
+    )
+    for area in AREAS_RESULTADO:
+        setattr(registro, f"puntaje_{area}", 60)
+    return registro
+
+
+def _df(registros):
+    return TablaResultados.desde_registros(registros).a_dataframe()
+
+
+def test_solo_se_reconsultan_filas_pendientes():
+    sin_area = _completo("3", 300)
+    sin_area.puntaje_ingles = None
+    con_error = RegistroResultado(tipo_documento="TI", numero_documento="4", error="Tiempo agotado")
+    previo = _df([_completo("1", 350), _completo("2", 320, horas=48), sin_area, con_error])
+
+    filas = [
+        {"tipo_documento": "ti", "numero_documento": n, "fecha_nacimiento": "2007-05-01"}
+        for n in ("1", "2", "3", "4", "5")
+    ]
+    reutilizables = registros_reutilizables(filas, previo, max_edad_horas=24)
+
+    assert list(reutilizables) == [0]
+    assert reutilizables[0].puntaje_general == 350
+
+
+def test_delta_reporta_cambios_altas_y_bajas():
+    previo = _df([_completo("1", 350), _completo("2", 300), _completo("3", 280)])
+    actual = _df([_completo("1", 350), _completo("2", 310), _completo("4", 400)])
+
+    delta = calcular_delta(previo, actual)
+
+    cambios = {(f["numero_documento"], f["campo"]): (f["anterior"], f["nuevo"]) for f in delta.to_dict("records")}
+    assert cambios == {
+        ("2", "puntaje_general"): ("300", "310"),
+        ("4", "registro"): (None, "nuevo"),
+        ("3", "registro"): ("eliminado", None),
+    }
+
+
+def test_delta_se_descarga_como_csv(directorios):
+    previo = _df([_completo("1", 300)])
+    actual = _df([_completo("1", 310)])
+
+    anterior = job_store.crear_job("abc", "estudiantes.xlsx", tenant="colegio_a")
+    job_store.guardar_resultados(anterior["id"], previo)
+    assert job_store.buscar_job_anterior("estudiantes.xlsx", "colegio_a")["id"] == anterior["id"]
+    assert job_store.buscar_job_anterior("otro.xlsx", "colegio_a") is None
+
+    job = job_store.crear_job("def", "estudiantes.xlsx")
+    assert export_service.obtener_exportacion(job["id"], "delta") is None
+    job_store.guardar_delta(job["id"], calcular_delta(previo, actual))
+    job_store.guardar_resultados(job["id"], actual)
+
+    path = export_service.obtener_exportacion(job["id"], "delta")
+    assert path.name == f"delta_{job['id']}.csv"
+    assert pd.read_csv(path, dtype=str)["nuevo"].tolist() == ["310"]
+
+
+def _job_de(tenant, sha, registros):
+    job = job_store.crear_job(sha, "estudiantes.xlsx", {"take_screenshot": False}, tenant=tenant)
+    job_store.guardar_resultados(job["id"], _df(registros))
+    return job
+
+
+def test_refresco_no_mezcla_tenants_con_el_mismo_archivo(app_flask, monkeypatch):
+    job_a = _job_de("colegio_a", "aaa", [_completo("1", 350)])
+    job_b = _job_de("colegio_b", "bbb", [_completo("2", 300)])
+    assert job_store.buscar_job_anterior("estudiantes.xlsx", "colegio_a")["id"] == job_a["id"]
+    assert job_store.buscar_job_anterior("estudiantes.xlsx", "colegio_b")["id"] == job_b["id"]
+    assert job_store.buscar_job_anterior("estudiantes.xlsx", "colegio_c") is None
+
+    _, upload_b = uploads_service.guardar_upload(io.BytesIO(b"excel b"), ".xlsx")
+    job_store.actualizar_job(job_b["id"], upload_sha256=upload_b.stem)
+    monkeypatch.setattr(
+        results_service,
+        "consultar_desde_excel",
+        lambda **kwargs: _df([_completo("2", 310)]),
+    )
+    cliente = app_flask.test_client()
+
+    # El trabajo de otro tenant no sirve de base, ni siquiera por su id.
+    respuesta = cliente.post(f"/jobs/{job_a['id']}/refrescar", headers={"X-Tenant": "colegio_b"})
+    assert respuesta.status_code == 302
+    assert len(list(job_store.JOBS_DIR.glob("*/job.json"))) == 2
+
+    respuesta = cliente.post(f"/jobs/{job_b['id']}/refrescar", headers={"X-Tenant": "colegio_b"})
+    nuevo_id = respuesta.headers["Location"].rsplit("/", 1)[-1]
+    nuevo = job_store.cargar_job(nuevo_id)
+    assert (nuevo["tenant"], nuevo["refresco_de"]) == ("colegio_b", job_b["id"])
+
+    delta = job_store.cargar_delta(nuevo_id)
+    assert delta["numero_documento"].tolist() == ["2"]
+    assert "Estudiante 1" not in delta["nombre_estudiante"].tolist()
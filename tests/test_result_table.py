@@ -0,0 +1,63 @@
+import pandas as pd
+
+from automation.icfes_client import FetchResult, LoginParams
+from scraping.registro import CAMPOS_NUMERICOS, COLUMNAS, RegistroResultado
+from services import job_store
+from services.result_table import TablaResultados, aplicar_esquema
+from services.results_service import (
+    _armar_resultado,
+    _resultado_con_error,
+    _resultado_fila_incompleta,
+)
+
+PARAMS = LoginParams(tipo_documento="TI", numero_documento="123", fecha_nacimiento="2007-05-01")
+
+
+def _tabla_mixta(corpus):
+    html, _ = corpus["completo_1"]
+    html_error, _ = corpus["error_sin_resultados"]
+    registros = [
+        _armar_resultado(PARAMS, FetchResult(html=html)),
+        _armar_resultado(PARAMS, FetchResult(html=html_error)),
+        _resultado_con_error(PARAMS, RuntimeError("Tiempo agotado")),
+        _resultado_fila_incompleta({"tipo_documento": "CC", "numero_documento": "", "fecha_nacimiento": ""}),
+    ]
+    return registros, TablaResultados.desde_registros(registros).a_dataframe()
+
+
+def test_todas_las_filas_tienen_el_mismo_esquema(corpus):
+    registros, df = _tabla_mixta(corpus)
+
+    assert tuple(df.columns) == COLUMNAS
+    assert all(str(df[c].dtype) == "Int16" for c in CAMPOS_NUMERICOS)
+    assert all(str(df[c].dtype) == "string" for c in COLUMNAS if c not in CAMPOS_NUMERICOS)
+
+    _, golden = corpus["completo_1"]
+    assert df.loc[0, "puntaje_general"] == golden["puntaje_general"]
+    assert df["puntaje_general"].isna().tolist() == [False, True, True, True]
+    assert df["error"].tolist()[2:] == ["Tiempo agotado", "Datos incompletos en la fila de entrada"]
+    assert df.loc[0, "nombre_estudiante"] == registros[0].nombre_estudiante
+    assert df.loc[3, "tipo_documento"] == "CC"
+
+
+def test_valor_fuera_de_rango_queda_nulo():
+    df = TablaResultados.desde_registros([RegistroResultado(puntaje_general=10**6)]).a_dataframe()
+    assert df["puntaje_general"].isna().all()
+
+
+def test_resultados_guardados_conservan_tipos(corpus, directorios):
+    _, df = _tabla_mixta(corpus)
+
+    job = job_store.crear_job("abc", "estudiantes.xlsx")
+    job_store.guardar_resultados(job["id"], df)
+    leido = job_store.cargar_resultados(job["id"])
+
+    pd.testing.assert_frame_equal(leido, df)
+
+
+def test_aplicar_esquema_completa_columnas_faltantes():
+    df = aplicar_esquema(pd.DataFrame([{"numero_documento": 123, "puntaje_general": "350", "otra": 1}]))
+    assert tuple(df.columns) == COLUMNAS
+    assert df.loc[0, "numero_documento"] == "123"
+    assert df.loc[0, "puntaje_general"] == 350
+    assert df["percentil_ingles"].isna().all()
@@ -0,0 +1,176 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from services.job_queue import SQLiteJobQueue
+from services.scheduler import (
+    PRIORIDAD_INTERACTIVA,
+    PRIORIDAD_LOTE_PEQUENO,
+    PRIORIDAD_MASIVA,
+    Planificador,
+)
+
+
+class _Ocupante(threading.Thread):
+    """
+    Hilo que toma un turno, anota el orden en que lo obtuvo y lo retiene hasta
+    que se le pide soltarlo.
+    """
+
+    def __init__(self, planificador, prioridad, tenant, orden):
+        super().__init__(daemon=True)
+        self.planificador = planificador
+        self.prioridad = prioridad
+        self.tenant = tenant
+        self.orden = orden
+        self.dentro = threading.Event()
+        self.soltar = threading.Event()
+
+    def run(self):
+        with self.planificador.turno(self.prioridad, self.tenant):
+            self.orden.append((self.prioridad, self.tenant))
+            self.dentro.set()
+            self.soltar.wait(5)
+
+
+def _ocupar(planificador, prioridad, tenant, orden):
+    hilo = _Ocupante(planificador, prioridad, tenant, orden)
+    hilo.start()
+    return hilo
+
+
+def _esperar_en_cola(planificador, n):
+    limite = time.monotonic() + 2
+    while time.monotonic() < limite:
+        clases = planificador.estado()["clases"].values()
+        if sum(c["en_espera"] for c in clases) >= n:
+            return
+        time.sleep(0.01)
+    raise AssertionError("las solicitudes no llegaron a la cola")
+
+
+def _siguiente_dentro(hilos):
+    limite = time.monotonic() + 2
+    while time.monotonic() < limite:
+        for hilo in hilos:
+            if hilo.dentro.is_set() and not hilo.soltar.is_set():
+                return hilo
+        time.sleep(0.01)
+    raise AssertionError("ningún hilo obtuvo el turno")
+
+
+def test_lotes_no_ocupan_el_cupo_reservado():
+    planificador = Planificador(capacidad=2, reservados=1)
+    orden = []
+    lote = _ocupar(planificador, PRIORIDAD_MASIVA, "a", orden)
+    assert lote.dentro.wait(1)
+
+    segundo_lote = _ocupar(planificador, PRIORIDAD_MASIVA, "b", orden)
+    assert not segundo_lote.dentro.wait(0.1)
+
+    interactiva = _ocupar(planificador, PRIORIDAD_INTERACTIVA, "c", orden)
+    assert interactiva.dentro.wait(1)
+
+    for hilo in (lote, interactiva):
+        hilo.soltar.set()
+    assert segundo_lote.dentro.wait(1)
+    segundo_lote.soltar.set()
+
+
+def test_prioridad_y_reparto_entre_tenants():
+    planificador = Planificador(capacidad=1, reservados=0)
+    orden = []
+    bloqueo = _ocupar(planificador, PRIORIDAD_MASIVA, "x", orden)
+    assert bloqueo.dentro.wait(1)
+
+    hilos = []
+    for prioridad, tenant in [
+        (PRIORIDAD_MASIVA, "a"),
+        (PRIORIDAD_MASIVA, "a"),
+        (PRIORIDAD_MASIVA, "b"),
+        (PRIORIDAD_LOTE_PEQUENO, "c"),
+        (PRIORIDAD_INTERACTIVA, "d"),
+    ]:
+        hilos.append(_ocupar(planificador, prioridad, tenant, orden))
+        _esperar_en_cola(planificador, len(hilos))
+
+    bloqueo.soltar.set()
+    for _ in hilos:
+        siguiente = _siguiente_dentro(hilos)
+        siguiente.soltar.set()
+        siguiente.join(1)
+
+    assert orden[1:] == [
+        (PRIORIDAD_INTERACTIVA, "d"),
+        (PRIORIDAD_LOTE_PEQUENO, "c"),
+        (PRIORIDAD_MASIVA, "a"),
+        (PRIORIDAD_MASIVA, "b"),
+        (PRIORIDAD_MASIVA, "a"),
+    ]
+
+
+def test_turno_async_comparte_cupos_con_hilos():
+    planificador = Planificador(capacidad=1, reservados=0)
+    lote = _ocupar(planificador, PRIORIDAD_MASIVA, "a", [])
+    assert lote.dentro.wait(1)
+
+    async def consulta():
+        async with planificador.turno_async(PRIORIDAD_INTERACTIVA, "b"):
+            return planificador.estado()["clases"]["interactiva"]["en_curso"]
+
+    async def principal():
+        tarea = asyncio.create_task(consulta())
+        await asyncio.sleep(0.05)
+        assert not tarea.done()
+        lote.soltar.set()
+        return await asyncio.wait_for(tarea, 1)
+
+    assert asyncio.run(principal()) == 1
+    estado = planificador.estado()
+    assert estado["clases"]["interactiva"]["muestras"] == 1
+    assert estado["clases"]["interactiva"]["espera_p95_s"] > 0
+    assert estado["cumple_objetivo"] is True
+
+
+def test_turno_async_cancelado_no_pierde_el_cupo():
+    planificador = Planificador(capacidad=1, reservados=0)
+    lote = _ocupar(planificador, PRIORIDAD_MASIVA, "a", [])
+    assert lote.dentro.wait(1)
+
+    async def principal():
+        tarea = asyncio.create_task(_turno_vacio(planificador))
+        await asyncio.sleep(0.05)
+        tarea.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await tarea
+
+    asyncio.run(principal())
+    lote.soltar.set()
+    lote.join(1)
+    siguiente = _ocupar(planificador, PRIORIDAD_MASIVA, "b", [])
+    assert siguiente.dentro.wait(1)
+    siguiente.soltar.set()
+
+
+async def _turno_vacio(planificador):
+    async with planificador.turno_async(PRIORIDAD_INTERACTIVA, "b"):
+        pass
+
+
+def test_cola_sqlite_reparte_por_prioridad_y_tenant(tmp_path):
+    cola = SQLiteJobQueue(tmp_path / "cola.sqlite3")
+    masivo_a = cola.crear_trabajo([{"n": i} for i in range(3)], prioridad=PRIORIDAD_MASIVA, tenant="a")
+    masivo_b = cola.crear_trabajo([{"n": i} for i in range(2)], prioridad=PRIORIDAD_MASIVA, tenant="b")
+    pequeno = cola.crear_trabajo([{"n": 0}], prioridad=PRIORIDAD_LOTE_PEQUENO, tenant="c")
+
+    orden = []
+    while True:
+        tarea = cola.arrendar("w1")
+        if tarea is None:
+            break
+        orden.append(tarea.job_id)
+        assert cola.completar(tarea, "w1", {"ok": True})
+
+    assert orden == [pequeno, masivo_a, masivo_b, masivo_a, masivo_b, masivo_a]
@@ -0,0 +1,58 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+MODULOS_PESADOS = ["pandas", "numpy", "playwright", "bs4", "requests", "openpyxl"]
+
+# Módulos que importa un proceso nuevo al arrancar: la app web, el paquete de
+# servicios y los módulos livianos que usa un worker antes de su primera tarea.
+PUNTOS_DE_ENTRADA = ["app", "services", "services.job_queue", "services.job_store"]
+
+
+@pytest.fixture(scope="module")
+def entorno(tmp_path_factory):
+    # Importar la app crea sus carpetas de datos: van a un directorio temporal,
+    # no al checkout.
+    return dict(os.environ, ICFES_DATA_DIR=str(tmp_path_factory.mktemp("data")))
+
+
+def _importar_en_proceso_nuevo(modulo: str, entorno: dict) -> list:
+    codigo = (
+        f"import json, sys; import {modulo}; "
+        f"print(json.dumps([m for m in {MODULOS_PESADOS!r} if m in sys.modules]))"
+    )
+    salida = subprocess.run(
+        [sys.executable, "-c", codigo],
+        cwd=RAIZ,
+        env=entorno,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("modulo", PUNTOS_DE_ENTRADA)
+def test_arranque_no_carga_modulos_pesados(modulo, entorno):
+    assert _importar_en_proceso_nuevo(modulo, entorno) == []
+
+
+@pytest.mark.parametrize("modulo", ["app", "services.worker"])
+def test_tiempo_arranque(benchmark, modulo, entorno):
+    benchmark.group = "arranque"
+    benchmark.pedantic(
+        subprocess.run,
+        args=([sys.executable, "-c", f"import {modulo}"],),
+        kwargs={"cwd": RAIZ, "env": entorno, "check": True, "capture_output": True},
+        rounds=5,
+        iterations=1,
+        warmup_rounds=1,
+    )
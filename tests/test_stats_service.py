@@ -0,0 +1,103 @@
+import pandas as pd
+
+from scraping.registro import RegistroResultado
+from services.result_table import TablaResultados
+from services.stats_service import (
+    calcular_estadisticas,
+    estadisticas_a_dataframe,
+    histogramas_a_dataframe,
+)
+
+
+def _df():
+    return pd.DataFrame(
+        {
+            "puntaje_general": [200, 300, 400, None],
+            "percentil_general": [10, 50, 90, 100],
+            "puntaje_ingles": [None, None, None, None],
+            "nombre_estudiante": ["a", "b", "c", "d"],
+        }
+    )
+
+
+def _columna(estadisticas, col):
+    return next(item for item in estadisticas["columnas"] if item["columna"] == col)
+
+
+def test_media_cuantiles_y_umbrales():
+    estadisticas = calcular_estadisticas(_df())
+    general = _columna(estadisticas, "puntaje_general")
+
+    assert estadisticas["total"] == 4
+    assert [item["columna"] for item in estadisticas["columnas"]] == [
+        "puntaje_general",
+        "puntaje_ingles",
+        "percentil_general",
+    ]
+    assert general["n"] == 3
+    assert general["media"] == 300.0
+    assert general["desviacion"] == 81.65
+    assert (general["minimo"], general["maximo"]) == (200.0, 400.0)
+    # Interpolación lineal sobre [200, 300, 400].
+    assert general["cuantiles"] == {0.25: 250.0, 0.5: 300.0, 0.75: 350.0, 0.9: 380.0}
+    assert general["mediana"] == 300.0
+    assert general["proporcion_sobre_umbral"] == {250: 0.6667, 300: 0.6667, 350: 0.3333}
+
+    percentil = _columna(estadisticas, "percentil_general")
+    assert percentil["media"] == 62.5
+    assert percentil["proporcion_sobre_umbral"] == {50: 0.75, 75: 0.5, 90: 0.5}
+
+
+def test_columna_sin_valores_queda_en_none():
+    ingles = _columna(calcular_estadisticas(_df()), "puntaje_ingles")
+
+    assert ingles["n"] == 0
+    assert ingles["media"] is None
+    assert ingles["mediana"] is None
+    assert set(ingles["cuantiles"].values()) == {None}
+    assert set(ingles["proporcion_sobre_umbral"].values()) == {None}
+
+
+def test_histogramas_bordes_y_conteos():
+    estadisticas = calcular_estadisticas(_df())
+    general = estadisticas["histogramas"]["puntaje_general"]
+
+    assert general["bordes"] == list(range(0, 501, 50))
+    assert general["conteos"] == [0, 0, 0, 0, 1, 0, 1, 0, 1, 0]
+    assert estadisticas["histogramas"]["puntaje_ingles"]["conteos"] == [0] * 10
+    # El máximo del rango cae en el último bin.
+    assert estadisticas["histogramas"]["percentil_general"]["conteos"] == [0, 1, 0, 0, 0, 1, 0, 0, 0, 2]
+
+    largo = histogramas_a_dataframe(estadisticas)
+    assert len(largo) == 30
+    assert largo[largo["columna"] == "puntaje_general"]["conteo"].sum() == 3
+
+
+def test_acepta_int16_con_nulos_de_tabla_resultados():
+    tabla = TablaResultados.desde_registros(
+        [
+            RegistroResultado(puntaje_general=200, puntaje_ingles=None),
+            RegistroResultado(puntaje_general=300),
+            RegistroResultado(puntaje_general=400),
+            RegistroResultado(error="Tiempo agotado"),
+        ]
+    )
+    df = tabla.a_dataframe()
+    assert str(df["puntaje_general"].dtype) == "Int16"
+
+    estadisticas = calcular_estadisticas(df)
+    esperado = calcular_estadisticas(_df())
+    assert _columna(estadisticas, "puntaje_general") == _columna(esperado, "puntaje_general")
+    assert _columna(estadisticas, "puntaje_ingles")["n"] == 0
+
+    tabla_resumen = estadisticas_a_dataframe(estadisticas)
+    fila = tabla_resumen.set_index("columna").loc["puntaje_general"]
+    assert (fila["p25"], fila["p90"], fila[">= 350"]) == (250.0, 380.0, 0.3333)
+
+
+def test_sin_columnas_de_puntaje():
+    assert calcular_estadisticas(pd.DataFrame({"nombre_estudiante": ["a"]})) == {
+        "total": 1,
+        "columnas": [],
+        "histogramas": {},
+    }
@@ -0,0 +1,141 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from automation import tracing
+from automation.tracing import ARCHIVO_META, ARCHIVO_TRAZA, RegistroTraza
+from services import worker
+from services.job_queue import SQLiteJobQueue
+from services.results_service import _consultar_con_cola
+from services.scheduler import PRIORIDAD_MASIVA
+
+
+@pytest.fixture
+def dir_trazas(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_DIR", tmp_path / "trazas")
+    monkeypatch.setattr(tracing, "TRACE_UMBRAL_LENTO_S", 60)
+    monkeypatch.setattr(tracing, "TRACE_MUESTREO", 0)
+    return tmp_path / "trazas"
+
+
+class _TracingFalso:
+    def __init__(self):
+        self.iniciado = False
+
+    def start(self, **kwargs):
+        self.iniciado = True
+
+    def stop(self, path=None):
+        if path:
+            with open(path, "wb") as f:
+                f.write(b"zip")
+
+
+class _ContextoFalso:
+    def __init__(self):
+        self.tracing = _TracingFalso()
+
+
+def _registro(job_id="job1", activo=True):
+    registro = RegistroTraza("123", job_id=job_id)
+    registro.activo = activo
+    return registro
+
+
+def test_decision_de_guardar(dir_trazas, monkeypatch):
+    assert not _registro(activo=False).debe_guardar(RuntimeError("x"))
+    assert _registro().debe_guardar(RuntimeError("x"))
+    assert not _registro().debe_guardar(None)
+
+    monkeypatch.setattr(tracing, "TRACE_UMBRAL_LENTO_S", 0)
+    assert _registro().debe_guardar(None)
+
+    monkeypatch.setattr(tracing, "TRACE_UMBRAL_LENTO_S", 60)
+    monkeypatch.setattr(tracing, "TRACE_MUESTREO", 1)
+    assert _registro().debe_guardar(None)
+
+
+def test_consulta_fallida_guarda_traza_y_meta(dir_trazas):
+    registro = _registro()
+    contexto = _ContextoFalso()
+    registro.iniciar(contexto)
+    error = None
+    try:
+        with registro.etapa("formulario"):
+            pass
+        with registro.etapa("captcha"):
+            raise RuntimeError("Sin token")
+    except RuntimeError as e:
+        error = e
+
+    destino = registro.finalizar(contexto, error)
+
+    assert contexto.tracing.iniciado
+    assert destino.parent == dir_trazas / "job1"
+    assert (destino / ARCHIVO_TRAZA).read_bytes() == b"zip"
+    meta = json.loads((destino / ARCHIVO_META).read_text(encoding="utf-8"))
+    assert meta["etapa_fallida"] == "captcha"
+    assert meta["tipo_error"] == "RuntimeError"
+    assert [(e["etapa"], e["ok"]) for e in meta["etapas"]] == [("formulario", True), ("captcha", False)]
+
+    assert _registro().finalizar(_ContextoFalso(), None) is None
+
+
+def _traza(dir_trazas, job_id, nombre, duracion_s, edad_s=0):
+    directorio = dir_trazas / job_id / nombre
+    directorio.mkdir(parents=True)
+    (directorio / ARCHIVO_META).write_text(json.dumps({"job_id": job_id, "duracion_s": duracion_s}))
+    (directorio / ARCHIVO_TRAZA).write_bytes(b"zip")
+    momento = time.time() - edad_s
+    os.utime(directorio, (momento, momento))
+    return directorio
+
+
+def test_retencion_por_antiguedad_y_cantidad(dir_trazas):
+    vieja = _traza(dir_trazas, "viejo", "a", 10, edad_s=3 * 86400)
+    recientes = [_traza(dir_trazas, "job1", f"r{i}", 10, edad_s=i * 60) for i in range(3)]
+
+    assert tracing.aplicar_retencion(max_archivos=2, max_dias=1) == 2
+
+    assert not vieja.exists()
+    assert not (dir_trazas / "viejo").exists()
+    assert [d.exists() for d in recientes] == [True, True, False]
+
+
+def test_listar_trazas_mas_lentas_por_job(dir_trazas):
+    _traza(dir_trazas, "job1", "a", 5)
+    _traza(dir_trazas, "job1", "b", 50)
+    _traza(dir_trazas, "job1", "c", 20)
+    _traza(dir_trazas, "job2", "d", 99)
+
+    assert [t["ruta"] for t in tracing.listar_trazas(limite=2)] == ["job2/d", "job1/b"]
+    assert [t["ruta"] for t in tracing.listar_trazas(job_id="job1")] == ["job1/b", "job1/c", "job1/a"]
+    assert all(t["tiene_traza"] for t in tracing.listar_trazas())
+    assert tracing.listar_jobs_trazados() == ["job1", "job2"]
+
+
+def test_worker_traza_con_el_id_del_trabajo_de_la_app(tmp_path, monkeypatch):
+    cola = SQLiteJobQueue(tmp_path / "cola.sqlite3")
+    ids_traza = []
+
+    def consulta_falsa(**kwargs):
+        ids_traza.append(kwargs["job_id"])
+        return {"numero_documento": kwargs["numero_documento"], "error": None}
+
+    monkeypatch.setattr(worker, "consultar_un_estudiante", consulta_falsa)
+    filas = [{"tipo_documento": "TI", "numero_documento": "1", "fecha_nacimiento": "2007-05-01"}]
+    resultados = []
+    coordinador = threading.Thread(
+        target=lambda: resultados.extend(
+            _consultar_con_cola(filas, False, cola, PRIORIDAD_MASIVA, "", job_id="app123", intervalo=0.02)
+        )
+    )
+    coordinador.start()
+    worker.ejecutar_worker(cola, worker_id="w1", espera_vacia=0.02, max_tareas=1)
+    coordinador.join(5)
+
+    assert ids_traza == ["app123"]
+    assert resultados == [{"numero_documento": "1", "error": None}]
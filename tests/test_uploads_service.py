@@ -0,0 +1,95 @@
+import hashlib
+import io
+import os
+import time
+
+import pandas as pd
+
+from services import job_store, uploads_service
+
+
+def test_guardar_upload_usa_hash_del_contenido(directorios):
+    contenido = b"x" * (uploads_service.TAMANO_BLOQUE * 3 + 17)
+    sha, path = uploads_service.guardar_upload(io.BytesIO(contenido), ".xlsx")
+
+    assert sha == hashlib.sha256(contenido).hexdigest()
+    assert path.name == f"{sha}.xlsx"
+    assert path.read_bytes() == contenido
+    assert not list(path.parent.parent.glob("*.part"))
+
+
+def test_uploads_identicos_comparten_archivo(directorios):
+    sha1, path1 = uploads_service.guardar_upload(io.BytesIO(b"mismo"), ".xlsx")
+    sha2, path2 = uploads_service.guardar_upload(io.BytesIO(b"mismo"), ".xlsx")
+    sha3, _ = uploads_service.guardar_upload(io.BytesIO(b"otro"), ".xlsx")
+
+    assert (sha1, path1) == (sha2, path2)
+    assert sha3 != sha1
+    assert len([p for p in uploads_service.UPLOAD_DIR.rglob("*") if p.is_file()]) == 2
+
+
+def test_limpiar_uploads_elimina_solo_los_viejos(directorios):
+    _, viejo = uploads_service.guardar_upload(io.BytesIO(b"viejo"), ".xlsx")
+    _, nuevo = uploads_service.guardar_upload(io.BytesIO(b"nuevo"), ".xlsx")
+    hace_un_anio = time.time() - 365 * 86400
+    os.utime(viejo, (hace_un_anio, hace_un_anio))
+
+    assert uploads_service.limpiar_uploads(max_dias=30) == 1
+    assert not viejo.exists()
+    assert nuevo.exists()
+
+
+def test_job_completado_se_encuentra_por_upload(directorios):
+    job = job_store.crear_job("abc123", "estudiantes.xlsx", {"take_screenshot": False})
+    assert job_store.buscar_job_por_upload("abc123", {"take_screenshot": False}) is None
+
+    df = pd.DataFrame([{"numero_documento": "1", "error": None}, {"numero_documento": "2", "error": "x"}])
+    job_store.guardar_resultados(job["id"], df)
+
+    encontrado = job_store.buscar_job_por_upload("abc123", {"take_screenshot": False})
+    assert encontrado["id"] == job["id"]
+    assert encontrado["num_registros"] == 2
+    assert encontrado["num_errores"] == 1
+    assert job_store.buscar_job_por_upload("abc123", {"take_screenshot": True}) is None
+    assert job_store.cargar_resultados(job["id"])["numero_documento"].tolist() == ["1", "2"]
+
+
+def test_guardar_upload_reintenta_si_la_retencion_borra_la_carpeta(directorios, monkeypatch):
+    reemplazar = os.replace
+    llamadas = []
+
+    def replace_con_carrera(origen, destino):
+        # La primera vez, la limpieza borra la carpeta del shard justo antes.
+        llamadas.append(destino)
+        if len(llamadas) == 1:
+            os.rmdir(os.path.dirname(destino))
+        return reemplazar(origen, destino)
+
+    monkeypatch.setattr(uploads_service.os, "replace", replace_con_carrera)
+    sha, path = uploads_service.guardar_upload(io.BytesIO(b"carrera"), ".xlsx")
+
+    assert len(llamadas) == 2
+    assert path.read_bytes() == b"carrera"
+
+
+def test_limpiar_uploads_tolera_carpetas_que_se_llenan(directorios, monkeypatch):
+    _, viejo = uploads_service.guardar_upload(io.BytesIO(b"viejo"), ".xlsx")
+    hace_un_anio = time.time() - 365 * 86400
+    os.utime(viejo, (hace_un_anio, hace_un_anio))
+
+    def rmdir_ocupada(self):
+        raise OSError(39, "Directory not empty", str(self))
+
+    monkeypatch.setattr(type(viejo), "rmdir", rmdir_ocupada)
+    assert uploads_service.limpiar_uploads(max_dias=30) == 1
+    assert viejo.parent.exists()
+
+
+def test_dedup_no_comparte_trabajos_entre_tenants(directorios):
+    opciones = {"take_screenshot": False}
+    df = pd.DataFrame([{"numero_documento": "1", "error": None}])
+    job_a = job_store.crear_job("abc123", "estudiantes.xlsx", opciones, tenant="colegio_a")
+    job_store.guardar_resultados(job_a["id"], df)
+
+    assert job_store.buscar_job_por_upload("abc123", opciones, "colegio_a")["id"] == job_a["id"]
+    assert job_store.buscar_job_por_upload("abc123", opciones, "colegio_b") is None
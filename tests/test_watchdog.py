@@ -0,0 +1,207 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from automation.watchdog import PREFIJO_MARCA, VigilanteNavegadores, marca_propietario
+
+pytestmark = pytest.mark.skipif(not VigilanteNavegadores.disponible(), reason="requiere /proc")
+
+# Página que imita la de resultados, con algo de DOM y JS para que cada
+# contexto haga trabajo real.
+PAGINA_MOCK = (
+    "<html><body><icfes-puntaje-general><span>350</span></icfes-puntaje-general>"
+    + "".join(f"<div class='fila'>{i}</div>" for i in range(500))
+    + "<script>window.datos = Array.from({length: 10000}, (_, i) => ({i}));</script>"
+    + "</body></html>"
+).encode()
+
+
+# Muestras de memoria mínimas del soak: dos de calentamiento, la base y tres
+# para el promedio final.
+MIN_MUESTRAS_SOAK = 6
+
+
+def _falso_navegador(marca, reservar_mb=0):
+    """
+    Proceso que se hace pasar por Chromium: lleva la marca en su línea de
+    comandos y opcionalmente retiene memoria.
+    """
+    codigo = f"import time; x = bytearray({reservar_mb} * 2**20); x[::4096] = b'1' * len(x[::4096]); time.sleep(60)"
+    proceso = subprocess.Popen([sys.executable, "-c", codigo, marca])
+    limite = time.monotonic() + 5
+    while time.monotonic() < limite:
+        with open(f"/proc/{proceso.pid}/cmdline", "rb") as f:
+            if marca.encode() in f.read():
+                return proceso
+        time.sleep(0.01)
+    proceso.kill()
+    raise AssertionError("el proceso de prueba no arrancó")
+
+
+def _detalle(reporte, proceso):
+    return next(n for n in reporte["detalle"] if n["pid"] == proceso.pid)
+
+
+def test_termina_huerfanos_y_no_los_del_propio_proceso():
+    # El pid existe pero con otro momento de inicio: el dueño ya murió y su
+    # pid fue reutilizado.
+    huerfano = _falso_navegador(f"{PREFIJO_MARCA}{os.getpid()}-1")
+    propio = _falso_navegador(marca_propietario())
+    try:
+        vigilante = VigilanteNavegadores(max_rss_mb=0, max_cpu_pct=0)
+
+        inspeccion = vigilante.revisar(terminar=False)
+        assert _detalle(inspeccion, huerfano)["huerfano"]
+        assert _detalle(inspeccion, propio)["propio"]
+        assert huerfano.poll() is None
+
+        reporte = vigilante.revisar()
+        assert _detalle(reporte, huerfano)["terminado"] == "huerfano"
+        assert _detalle(reporte, propio)["terminado"] is None
+        assert huerfano.wait(5) == -9
+        assert propio.poll() is None
+        assert vigilante.estado()["terminados"]["huerfano"] == 1
+    finally:
+        for proceso in (huerfano, propio):
+            proceso.kill()
+            proceso.wait()
+
+
+def test_termina_navegador_propio_sobre_presupuesto_de_memoria():
+    pesado = _falso_navegador(marca_propietario(), reservar_mb=64)
+    try:
+        vigilante = VigilanteNavegadores(max_rss_mb=32, max_cpu_pct=0)
+        limite = time.monotonic() + 5
+        while _detalle(vigilante.revisar(terminar=False), pesado)["rss_mb"] < 64:
+            assert time.monotonic() < limite, "el proceso de prueba no reservó la memoria"
+            time.sleep(0.05)
+
+        # Una sola revisión sobre el presupuesto anota el exceso sin terminarlo.
+        vigilante = VigilanteNavegadores(max_rss_mb=32, max_cpu_pct=0)
+        assert _detalle(vigilante.revisar(), pesado)["terminado"] is None
+        assert _detalle(vigilante.revisar(), pesado)["terminado"] == "memoria"
+        assert pesado.wait(5) == -9
+    finally:
+        pesado.kill()
+        pesado.wait()
+
+
+class _PaginaMock(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(PAGINA_MOCK)))
+        self.end_headers()
+        self.wfile.write(PAGINA_MOCK)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def servidor_mock():
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), _PaginaMock)
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    yield f"http://127.0.0.1:{servidor.server_address[1]}"
+    servidor.shutdown()
+
+
+@pytest.mark.skipif(not os.getenv("SOAK_CONSULTAS"), reason="soak opcional: definir SOAK_CONSULTAS")
+def test_memoria_estable_en_consultas_repetidas(servidor_mock, tmp_path, monkeypatch):
+    """
+    Soak: SOAK_CONSULTAS consultas completas con fetch_results_page contra una
+    página local, sobre el mismo NavegadorCompartido que usan los workers. Solo
+    se reemplazan el formulario, el CAPTCHA y el envío; el contexto, la traza y
+    el cierre son los reales. Algunas consultas fallan y en otras falla el
+    cierre de la traza, para recorrer también esos caminos de limpieza. La
+    memoria del árbol de Chromium al final no debe crecer respecto a la del
+    inicio, y al cerrar no debe quedar ningún navegador del proceso.
+    """
+    pytest.importorskip("playwright.sync_api")
+    from automation import icfes_client, tracing
+    from automation.deadline import Deadline
+    from automation.icfes_client import LoginParams, NavegadorCompartido, fetch_results_page
+
+    navegador = NavegadorCompartido()
+    try:
+        navegador.calentar()
+    except Exception as e:
+        pytest.skip(f"Chromium no disponible: {e}")
+
+    consultas = int(os.environ["SOAK_CONSULTAS"])
+    if consultas < MIN_MUESTRAS_SOAK:
+        pytest.skip(f"SOAK_CONSULTAS debe ser al menos {MIN_MUESTRAS_SOAK} para comparar la memoria")
+    # Al menos MIN_MUESTRAS_SOAK muestras: se descartan las primeras y se
+    # compara el inicio con el final.
+    cada = max(1, consultas // max(20, MIN_MUESTRAS_SOAK))
+    actual = {"i": 0}
+
+    class _DeadlineSinEsperas(Deadline):
+        # Las pausas fijas entre pasos (varios segundos por consulta) harían
+        # el soak interminable sin cambiar lo que se mide.
+        def sleep(self, segundos):
+            self.verificar()
+
+    def _sin_pasos(*args):
+        yield from ()
+
+    def _enviar(page, deadline):
+        if actual["i"] % 7 == 3:
+            raise RuntimeError("fallo simulado de la consulta")
+        yield page.goto(f"{servidor_mock}/resultados", timeout=deadline.timeout_ms(10000))
+        yield page.wait_for_selector("icfes-puntaje-general", timeout=deadline.timeout_ms(10000))
+
+    finalizar = tracing.RegistroTraza.finalizar
+
+    def _finalizar(self, context, error):
+        if actual["i"] % 5 == 1:
+            raise RuntimeError("fallo simulado al cerrar la traza")
+        return finalizar(self, context, error)
+
+    monkeypatch.setattr(icfes_client, "ICFES_LOGIN_URL", f"{servidor_mock}/login")
+    monkeypatch.setattr(icfes_client, "SCREENSHOT_DIR", tmp_path)
+    monkeypatch.setattr(icfes_client, "Deadline", _DeadlineSinEsperas)
+    monkeypatch.setattr(icfes_client, "_fill_login_form", _sin_pasos)
+    monkeypatch.setattr(icfes_client, "_solve_captcha_with_anticaptcha", _sin_pasos)
+    monkeypatch.setattr(icfes_client, "_submit_form_and_wait_results", _enviar)
+    monkeypatch.setattr(tracing.RegistroTraza, "finalizar", _finalizar)
+
+    vigilante = VigilanteNavegadores(max_rss_mb=0, max_cpu_pct=0)
+    muestras = []
+    fallidas = 0
+    try:
+        for i in range(consultas):
+            actual["i"] = i
+            params = LoginParams(tipo_documento="TI", numero_documento=str(i), fecha_nacimiento="2007-05-01")
+            try:
+                resultado = fetch_results_page(params, navegador=navegador, timeout_s=30)
+                assert "350" in resultado.html
+            except RuntimeError as e:
+                assert "fallo simulado de la consulta" in str(e)
+                fallidas += 1
+            if i % cada == cada - 1:
+                muestras.append(vigilante.revisar(terminar=False)["rss_total_mb"])
+        # Cada consulta cerró su contexto, también las fallidas y aquellas en
+        # que falló el cierre de la traza.
+        assert navegador.browser().contexts == []
+    finally:
+        navegador.cerrar()
+
+    assert fallidas == len([i for i in range(consultas) if i % 7 == 3])
+
+    # Se descartan las primeras muestras (calentamiento del navegador).
+    assert len(muestras) >= MIN_MUESTRAS_SOAK, f"solo {len(muestras)} muestras de memoria: {muestras}"
+    base = max(muestras[1:3])
+    final = sum(muestras[-3:]) / 3
+    assert final <= base * 1.25, f"la memoria creció de {base} MB a {final} MB: {muestras}"
+
+    limite = time.monotonic() + 10
+    while vigilante.revisar(terminar=False)["propios"]:
+        assert time.monotonic() < limite, "quedaron navegadores vivos tras cerrar"
+        time.sleep(0.1)